@@ -16,7 +16,6 @@ import asyncio
 import ssl
 import logging
 import argparse
-import queue
 import threading
 import time
 import fractions
@@ -25,6 +24,7 @@ import sounddevice as sd
 import aiohttp
 import av
 from aiortc import RTCPeerConnection, RTCSessionDescription, MediaStreamTrack
+from sampleRing import JitterBuffer
 
 # ── Monkey-patch: Opus bitrate ────────────────────────────────
 # aiortc hardcodes bit_rate=96000 and ignores SDP fmtp / setParameters()
@@ -54,14 +54,12 @@ SD_RATE     = 48000
 SAMPLE_TIME = 20
 BLOCK_SIZE  = SD_RATE * SAMPLE_TIME // 1000
 
-# RX queue size
-RX_QUEUE_SIZE = 24
+# RX jitter buffer: depth follows the measured jitter, clamped to these (ms).
+RX_MIN_DEPTH_MS = 20
+RX_MAX_DEPTH_MS = 300
 
-# How many blocks to prefill before starting playback (1 block = 20 ms).
-RX_PREFILL = 2
-
-# Adaptive drain threshold — above this, we skip the oldest frames
-RX_DRAIN_THRESHOLD = 30
+# Received frames between RX buffer log lines
+RX_STATS_FRAMES = 500
 
 # ─────────────────────────────────────────────────────────────
 # RECEIVING: WebRTC track → sounddevice output
@@ -71,9 +69,8 @@ class RadioPlayer:
 
     def __init__(self, device):
         self._device    = device
-        self._sync_q    = queue.Queue(maxsize=RX_QUEUE_SIZE)
+        self._jb        = JitterBuffer(SD_RATE, BLOCK_SIZE, RX_MIN_DEPTH_MS, RX_MAX_DEPTH_MS)
         self._resampler = av.AudioResampler(format="s16", layout="mono", rate=SD_RATE)
-        self._prefilled = False
 
     def start(self, loop):
         t = threading.Thread(target=self._sd_thread, daemon=True)
@@ -82,30 +79,8 @@ class RadioPlayer:
     def _sd_thread(self):
 
         def callback(outdata, frames, time_info, status):
-            if not self._prefilled:
-                if self._sync_q.qsize() >= RX_PREFILL:
-                    self._prefilled = True
-                else:
-                    outdata[:, 0] = 0.0
-                    return
-
-            # Drain excess — max 2 per callback to avoid large audio jumps
-            drained = 0
-            while self._sync_q.qsize() > RX_DRAIN_THRESHOLD and drained < 2:
-                try:
-                    self._sync_q.get_nowait()
-                    drained += 1
-                except queue.Empty:
-                    break
-
-            try:
-                chunk = self._sync_q.get_nowait()
-                n = min(len(chunk), frames)
-                outdata[:n, 0] = chunk[:n]
-                if n < frames:
-                    outdata[n:, 0] = 0.0
-            except queue.Empty:
-                outdata[:, 0] = 0.0
+            # exactly `frames` samples, rate adjusted to hold the target depth
+            self._jb.read_into(outdata[:, 0])
 
         kwargs = dict(samplerate=SD_RATE, channels=1, dtype="float32",
                       blocksize=BLOCK_SIZE, latency='low', callback=callback)
@@ -122,16 +97,18 @@ class RadioPlayer:
 
     async def _run(self, track):
         log.debug("RadioPlayer: start receiving")
+        cnt = 0
         while True:
             try:
                 frame = await track.recv()
+                cnt += 1
                 for f in self._resampler.resample(frame):
-                    raw     = np.frombuffer(bytes(f.planes[0]), dtype=np.int16)
-                    samples = raw.astype(np.float32) / 32768.0
-                    try:
-                        self._sync_q.put_nowait(samples)
-                    except queue.Full:
-                        pass  # drop new frame — callback drain keeps latency bounded
+                    # plane memory viewed in place (it is padded, hence count),
+                    # scaled to float32 while copied into the ring
+                    raw = np.frombuffer(f.planes[0], dtype=np.int16, count=f.samples)
+                    self._jb.push(raw, scale=1.0 / 32768.0)
+                if cnt % RX_STATS_FRAMES == 1:
+                    log.debug("RX buffer: %s", self._jb.stats())
             except Exception as e:
                 log.warning("RadioPlayer ended: %s", e)
                 break
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+IMA-ADPCM decoder used for OpenWebRX waterfall (FFT) frames.
+
+Decoding is a sequential state machine, so it cannot be vectorized with numpy.
+Instead there are several interchangeable backends, the fastest available one
+is selected at import:
+
+    cython    - compiled loop from imaAdpcmFast.pyx (needs Cython + C compiler)
+    table     - pure Python, driven by precomputed (state, nibble) tables
+    reference - original straightforward implementation, kept for verification
+
+Usage:
+    python imaAdpcm.py                 # bit-exact check + rows/s benchmark
+    python imaAdpcm.py --rows 2000     # longer benchmark
+"""
+
+import os
+import numpy as np
+
+INDEX_TABLE = [-1, -1, -1, -1, 2, 4, 6, 8,
+               -1, -1, -1, -1, 2, 4, 6, 8]
+STEP_TABLE = [7,8,9,10,11,12,13,14,16,17,19,21,23,25,28,31,34,37,41,45,
+              50,55,60,66,73,80,88,97,107,118,130,143,157,173,190,209,230,253,279,307,
+              337,371,408,449,494,544,598,658,724,796,876,963,1060,1166,1282,1411,1552,1707,1878,2066,
+              2272,2499,2749,3024,3327,3660,4026,4428,4871,5358,5894,6484,7132,7845,8630,9493,10442,11487,12635,13899,
+              15289,16818,18500,20350,22385,24623,27086,29794,32767]
+
+MAX_STEP_INDEX = len(STEP_TABLE) - 1
+
+# Extra state used right after reset(): the decoder starts with step = 0
+# (OpenWebRX behaviour), which is not any entry of STEP_TABLE.
+ZERO_STEP_STATE = MAX_STEP_INDEX + 1
+
+
+def _nibble_diff(step, nib):
+    diff = step >> 3
+    if nib & 1: diff += step >> 2
+    if nib & 2: diff += step >> 1
+    if nib & 4: diff += step
+    if nib & 8: diff = -diff
+    return diff
+
+
+def _build_tables():
+    """Returns (DIFF, NEXT) flat lists indexed by state * 16 + nibble.
+
+    State is the step index (0..88) or ZERO_STEP_STATE, NEXT already holds the
+    following state multiplied by 16 so the decode loop needs a single add.
+    """
+    diff_table = []
+    next_table = []
+    for state in range(ZERO_STEP_STATE + 1):
+        if state == ZERO_STEP_STATE:
+            step, step_index = 0, 0
+        else:
+            step, step_index = STEP_TABLE[state], state
+        for nib in range(16):
+            diff_table.append(_nibble_diff(step, nib))
+            new_index = max(0, min(MAX_STEP_INDEX, step_index + INDEX_TABLE[nib]))
+            next_table.append(new_index * 16)
+    return diff_table, next_table
+
+DIFF_TABLE, NEXT_TABLE = _build_tables()
+
+
+def _to_nibbles(data):
+    arr = np.frombuffer(data, dtype=np.uint8)
+    nibbles = np.empty(len(arr) * 2, dtype=np.uint8)
+    nibbles[0::2] = arr & 0x0F
+    nibbles[1::2] = arr >> 4
+    return nibbles
+
+
+def _state_from(step_index, step):
+    return ZERO_STEP_STATE if step == 0 else step_index
+
+
+def decode_reference(data, step_index, predictor, step):
+    """Original per-nibble implementation. Returns (samples, step_index, predictor, step)."""
+    nibbles = _to_nibbles(data).astype(np.int32)
+    idx_table = INDEX_TABLE
+    step_table = STEP_TABLE
+    output = np.empty(len(nibbles), dtype=np.int16)
+    for i in range(len(nibbles)):
+        nib = nibbles[i]
+        step_index += idx_table[nib]
+        if step_index < 0: step_index = 0
+        elif step_index > 88: step_index = 88
+        diff = step >> 3
+        if nib & 1: diff += step >> 2
+        if nib & 2: diff += step >> 1
+        if nib & 4: diff += step
+        if nib & 8: diff = -diff
+        predictor += diff
+        if predictor > 32767: predictor = 32767
+        elif predictor < -32768: predictor = -32768
+        output[i] = predictor
+        step = step_table[step_index]
+    return output, step_index, predictor, step
+
+
+def decode_table(data, step_index, predictor, step):
+    """Table driven implementation. Returns (samples, step_index, predictor, step)."""
+    diff_table = DIFF_TABLE
+    next_table = NEXT_TABLE
+    state = _state_from(step_index, step) * 16
+    out = []
+    append = out.append
+    for nib in _to_nibbles(data).tolist():
+        k = state + nib
+        predictor += diff_table[k]
+        if predictor > 32767: predictor = 32767
+        elif predictor < -32768: predictor = -32768
+        append(predictor)
+        state = next_table[k]
+    if out:
+        step_index = state >> 4
+        step = STEP_TABLE[step_index]
+    return np.array(out, dtype=np.int16), step_index, predictor, step
+
+
+BACKENDS = {
+    'reference': decode_reference,
+    'table': decode_table,
+}
+
+try:
+    import pyximport
+    pyximport.install(language_level=3, setup_args={'include_dirs': np.get_include()})
+    import imaAdpcmFast
+    imaAdpcmFast.set_tables(DIFF_TABLE, NEXT_TABLE, STEP_TABLE)
+    _decode_cython = imaAdpcmFast.decode
+
+    def decode_cython(data, step_index, predictor, step):
+        """Compiled implementation. Returns (samples, step_index, predictor, step)."""
+        return _decode_cython(data, _state_from(step_index, step), predictor)
+
+    BACKENDS['cython'] = decode_cython
+except Exception:
+    # No Cython or no C compiler - pure Python backends only
+    pass
+
+# Can be forced with RRC_ADPCM_BACKEND=reference|table|cython
+DEFAULT_BACKEND = os.environ.get('RRC_ADPCM_BACKEND', '')
+if DEFAULT_BACKEND not in BACKENDS:
+    DEFAULT_BACKEND = 'cython' if 'cython' in BACKENDS else 'table'
+
+
+class ImaAdpcmCodec:
+    ima_index_table = INDEX_TABLE
+    ima_step_table = STEP_TABLE
+
+    def __init__(self, backend=None):
+        self.backend = backend or DEFAULT_BACKEND
+        self._decode = BACKENDS[self.backend]
+        self.reset()
+
+    def reset(self):
+        self.step_index = 0
+        self.predictor = 0
+        self.step = 0
+        self.synchronized = 0
+        self.sync_word = b"SYNC"
+        self.sync_counter = 0
+        self.phase = 0
+        self.sync_buffer = np.zeros(4, dtype=np.uint8)
+        self.sync_buffer_index = 0
+
+    def decode(self, data):
+        output, self.step_index, self.predictor, self.step = self._decode(
+            data, self.step_index, self.predictor, self.step)
+        return output
+
+
+def _benchmark(rows, fft_size):
+    import time
+
+    rng = np.random.default_rng(1)
+    # Header + padding + fft_size samples, 2 samples per byte
+    frames = [rng.integers(0, 256, (fft_size + 14) // 2 + 1, dtype=np.uint8).tobytes()
+              for _ in range(16)]
+
+    reference = ImaAdpcmCodec('reference')
+    for name in BACKENDS:
+        codec = ImaAdpcmCodec(name)
+        for frame in frames:
+            reference.reset()
+            codec.reset()
+            expected = reference.decode(frame)
+            got = codec.decode(frame)
+            if not np.array_equal(expected, got) or \
+                    (codec.step_index, codec.predictor, codec.step) != \
+                    (reference.step_index, reference.predictor, reference.step):
+                raise SystemExit(f"{name}: output differs from reference")
+        # continuing without reset must also match
+        reference.reset()
+        codec.reset()
+        for frame in frames:
+            if not np.array_equal(reference.decode(frame), codec.decode(frame)):
+                raise SystemExit(f"{name}: stream output differs from reference")
+
+    print(f"All backends bit-exact ({', '.join(BACKENDS)}), default: {DEFAULT_BACKEND}")
+
+    for name in BACKENDS:
+        codec = ImaAdpcmCodec(name)
+        n = rows if name != 'reference' else max(1, rows // 10)
+        start = time.perf_counter()
+        for i in range(n):
+            codec.reset()
+            codec.decode(frames[i % len(frames)])
+        elapsed = time.perf_counter() - start
+        print(f"{name:>10}: {n / elapsed:10.1f} rows/s ({elapsed / n * 1e3:.3f} ms/row, fft_size={fft_size})")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="IMA-ADPCM decoder check and benchmark")
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--fft-size", type=int, default=2048)
+    args = parser.parse_args()
+    _benchmark(args.rows, args.fft_size)
@@ -0,0 +1,56 @@
+# cython: boundscheck=False, wraparound=False, cdivision=True
+"""
+Compiled IMA-ADPCM decode loop, built on the fly by pyximport from imaAdpcm.py.
+Uses the same (state, nibble) tables as the pure Python 'table' backend,
+they are handed over by imaAdpcm via set_tables().
+"""
+
+import numpy as np
+cimport numpy as cnp
+
+cdef int _diff[90 * 16]
+cdef int _next[90 * 16]
+cdef int _step[89]
+
+
+def set_tables(diff_table, next_table, step_table):
+    """Copies the lookup tables built by imaAdpcm into C arrays."""
+    cdef int i
+    for i in range(90 * 16):
+        _diff[i] = diff_table[i]
+        _next[i] = next_table[i]
+    for i in range(89):
+        _step[i] = step_table[i]
+
+
+def decode(const unsigned char[:] data, int state, int predictor):
+    """Returns (samples, step_index, predictor, step)."""
+    cdef Py_ssize_t n = data.shape[0]
+    cdef cnp.ndarray[cnp.int16_t, ndim=1] out = np.empty(n * 2, dtype=np.int16)
+    cdef cnp.int16_t[:] o = out
+    cdef Py_ssize_t i
+    cdef int k, byte
+    cdef int s = state * 16
+
+    for i in range(n):
+        byte = data[i]
+
+        k = s + (byte & 0x0F)
+        predictor += _diff[k]
+        if predictor > 32767: predictor = 32767
+        elif predictor < -32768: predictor = -32768
+        o[2 * i] = <cnp.int16_t>predictor
+        s = _next[k]
+
+        k = s + (byte >> 4)
+        predictor += _diff[k]
+        if predictor > 32767: predictor = 32767
+        elif predictor < -32768: predictor = -32768
+        o[2 * i + 1] = <cnp.int16_t>predictor
+        s = _next[k]
+
+    if n == 0:
+        if state == 89:
+            return out, 0, predictor, 0
+        return out, state, predictor, _step[state]
+    return out, s >> 4, predictor, _step[s >> 4]
@@ -7,14 +7,22 @@ import threading
 import asyncio
 import os 
 import numpy as np
-import websocket
+import aiohttp
+import collections
+import concurrent.futures
 import json
+import time
 
 from soundPlayer import playSound, stopSound
+from imaAdpcm import ImaAdpcmCodec
+from waterfallPipeline import (FRAME_TYPE_FFT, FRAME_TYPE_ROW, FRAME_TYPE_ROW_ZLIB, build_colormap, decode_fft_frame,
+                               decode_row_frame, link_view, view_covers, level_palette, ColumnMap, HistoryFile,
+                               RowRenderer)
+from rigctl import RigctlClient, CoalescingCommandQueue, PollScheduler, RigState, count_extended_cmds
 from audioClient import run as audioClientRun
 from pynput import keyboard
 from PyQt5.QtCore import QTimer
-from PyQt5 import QtCore, QtGui, QtWidgets
+from PyQt5 import QtCore, QtGui, QtWidgets, sip
 from PyQt5.QtGui import QIcon
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
@@ -43,6 +51,8 @@ class Config:
             'host': "192.168.152.12",
             'port': 4532,
             'poll_ms': 500,
+            'poll_meter_ms': 200,
+            'poll_budget': 30,
             
             # Radio Settings
             'freq_step_slow': 100,
@@ -67,6 +77,10 @@ class Config:
             'waterfall_initial_zoom': 0.25,
             'waterfall_dynamic_range': 25,
             'waterfall_min_db_default': -90,
+            'waterfall_reduce_mode': 'max',
+            'waterfall_fps': 30,
+            'waterfall_proxy_enabled': False,
+            'waterfall_history_rows': 20000,
             
             # DX Cluster
             'dx_cluster_enabled': False,
@@ -204,9 +218,27 @@ HOST = config.get('host')
 PORT = config.get('port')
 TCP_TIMEOUT = 0.1
 POLL_MS = config.get('poll_ms')
+POLL_METER_MS = config.get('poll_meter_ms')
+POLL_BUDGET = config.get('poll_budget')     # max polled commands per second
+POLL_TICK_MS = 50
 SLOWER_POLL_MS = 2000
 MAX_RETRY_CNT = 3
 
+# Rig command priorities - lower value is sent first
+PRIORITY_PTT  = 0
+PRIORITY_SET  = 1
+PRIORITY_POLL = 2
+
+# Minimal spacing of coalesced set-commands per target [s] - faster knob
+# movement is merged and only the latest value is sent
+SET_CMD_MIN_INTERVAL = {
+    'F': 0.05,
+    'L AF': 0.1,
+    'L SQL': 0.1,
+}
+SET_CMD_DEFAULT_INTERVAL = 0.1
+ELIDED_REPORT_INTERVAL = 10
+
 # Functional
 PLAYER_ACTIVE = False
 FREQ_STEP_SLOW = config.get('freq_step_slow')
@@ -305,12 +337,21 @@ GET_ANTENNA_CMD = 'get'
 
 # Waterfall
 WATERFALL_ENABLED = config.get('waterfall_enabled')
-WS_URL = "ws://" + HOST + ":8073/ws/"
+WATERFALL_PROXY_ENABLED = config.get('waterfall_proxy_enabled')
+# waterfallProxy.py (remoteControlNode) sends rows already reduced to the view
+WS_URL = "ws://" + HOST + (":8074/ws/" if WATERFALL_PROXY_ENABLED else ":8073/ws/")
 DEFAULT_FFT_SIZE = 2048
 
 INITIAL_ZOOM = config.get('waterfall_initial_zoom')
 WATERFALL_MIN_DB_DEFAULT = config.get('waterfall_min_db_default')
 WATERFALL_DYNAMIC_RANGE = config.get('waterfall_dynamic_range')
+WATERFALL_REDUCE_MODE = config.get('waterfall_reduce_mode')
+WATERFALL_FPS = config.get('waterfall_fps')
+WATERFALL_STATS_REPORT_INTERVAL = 10
+# scroll-back history (Shift + mouse wheel), rows kept in a memory-mapped file
+WATERFALL_HISTORY_ROWS = config.get('waterfall_history_rows')
+WATERFALL_HISTORY_FILE = os.path.join(dir_path, 'waterfall_history.bin')
+WATERFALL_HISTORY_STEP = 10     # rows per wheel step
 
 MOUSE_WHEEL_FREQ_STEP = config.get('mouse_wheel_freq_step')
 MOUSE_WHEEL_FAST_FREQ_STEP = config.get('mouse_wheel_fast_freq_step')
@@ -347,31 +388,34 @@ WF_THEME = [
 ]
 ### --- End of configuration --- ###
 
+# tier: 'meter' (POLL_METER_MS), 'level' (POLL_MS) or 'slow' (SLOWER_POLL_MS)
+# state: meter is only fast in 'rx' or 'tx'
 cyclicRefreshParams = [
-    {'cmd': 'l AF', 'respLines': 1, 'parser': 'parse_af_gain'},
-    {'cmd': 'l SQL', 'respLines': 1, 'parser': 'parse_sql_lvl'},
-    {'cmd': 'l STRENGTH', 'respLines': 1, 'parser': 'parse_strength'},
-    {'cmd': 'l RFPOWER_METER', 'respLines': 1, 'parser': 'parse_rf_power_meter'},
-    {'cmd': 'l ALC', 'respLines': 1, 'parser': 'parse_alc'},
-    {'cmd': 'l SWR', 'respLines': 1, 'parser': 'parse_swr'},
-    {'cmd': '\\get_powerstat', 'respLines': 1, 'parser': 'parse_powerstat'},
-    {'cmd': 'f', 'respLines': 1, 'parser': 'parse_freq'},
-    {'cmd': 'm', 'respLines': 1, 'parser': 'parse_freq'},
-    {'cmd': '\\get_vfo_info VFOA', 'expectedResp': 'get_vfo_info', 'parser': 'parse_vfoa', 'oneTime': True},
-    {'cmd': '\\get_vfo_info VFOB', 'expectedResp': 'get_vfo_info', 'parser': 'parse_vfob', 'oneTime': True},
-    {'cmd': 'l RFPOWER', 'respLines': 1, 'parser': 'parse_rf_power'},
+    {'cmd': 'l AF', 'respLines': 1, 'parser': 'parse_af_gain', 'tier': 'level'},
+    {'cmd': 'l SQL', 'respLines': 1, 'parser': 'parse_sql_lvl', 'tier': 'level'},
+    {'cmd': 'l STRENGTH', 'respLines': 1, 'parser': 'parse_strength', 'tier': 'meter', 'state': 'rx', 'type': int},
+    {'cmd': 'l RFPOWER_METER', 'respLines': 1, 'parser': 'parse_rf_power_meter', 'tier': 'meter', 'state': 'tx'},
+    {'cmd': 'l ALC', 'respLines': 1, 'parser': 'parse_alc', 'tier': 'meter', 'state': 'tx'},
+    {'cmd': 'l SWR', 'respLines': 1, 'parser': 'parse_swr', 'tier': 'meter', 'state': 'tx'},
+    {'cmd': '\\get_powerstat', 'respLines': 1, 'parser': 'parse_powerstat', 'tier': 'slow'},
+    {'cmd': 'f', 'respLines': 1, 'parser': 'parse_get_freq', 'tier': 'level'},
+    {'cmd': 'm', 'respLines': 1, 'parser': 'parse_get_mode', 'tier': 'level'},
+    {'cmd': '\\get_vfo_info VFOA', 'expectedResp': 'get_vfo_info', 'parser': 'parse_get_vfo_info', 'oneTime': True},
+    {'cmd': '\\get_vfo_info VFOB', 'expectedResp': 'get_vfo_info', 'parser': 'parse_get_vfo_info', 'oneTime': True},
+    {'cmd': 'l RFPOWER', 'respLines': 1, 'parser': 'parse_rf_power', 'tier': 'slow'},
     {'cmd': 'u TUNER', 'expectedResp': 'get_func', 'parser': 'parse_tuner', 'oneTime': True},
-    {'cmd': 't', 'respLines': 1, 'parser': 'parse_tx'},
-    {'cmd': 'l PREAMP', 'expectedResp': 'get_level', 'parser': 'parse_preamp', 'oneTime': True},
-    {'cmd': 'v', 'respLines': 1, 'parser': 'parse_vfo'},
+    # reported on every poll, TX watchdog counts the answers
+    {'cmd': 't', 'respLines': 1, 'parser': 'parse_tx', 'tier': 'meter', 'alwaysEmit': True},
+    {'cmd': 'l PREAMP', 'expectedResp': 'get_level', 'parser': 'parse_preamp', 'oneTime': True, 'type': int},
+    {'cmd': 'v', 'respLines': 1, 'parser': 'parse_vfo', 'tier': 'level'},
     {'cmd': 'u NB', 'expectedResp': 'get_func', 'parser': 'parse_nb', 'oneTime': True},
     {'cmd': 'u MON', 'expectedResp': 'get_func', 'parser': 'parse_mon', 'oneTime': True},
-    {'cmd': 'l IF', 'expectedResp': 'get_level', 'parser': 'parse_if', 'oneTime': True},
+    {'cmd': 'l IF', 'expectedResp': 'get_level', 'parser': 'parse_if', 'oneTime': True, 'type': int},
     {'cmd': 'u MN', 'expectedResp': 'get_func', 'parser': 'parse_mn', 'oneTime': True},
-    {'cmd': 'l NOTCHF', 'expectedResp': 'get_level', 'parser': 'parse_notchf', 'oneTime': True},
+    {'cmd': 'l NOTCHF', 'expectedResp': 'get_level', 'parser': 'parse_notchf', 'oneTime': True, 'type': int},
     {'cmd': 'u NR', 'expectedResp': 'get_func', 'parser': 'parse_u_nr', 'oneTime': True},
     {'cmd': 'l NR', 'expectedResp': 'get_level', 'parser': 'parse_l_nr', 'oneTime': True},
-    {'cmd': 'l ATT', 'expectedResp': 'get_level', 'parser': 'parse_att', 'oneTime': True},
+    {'cmd': 'l ATT', 'expectedResp': 'get_level', 'parser': 'parse_att', 'oneTime': True, 'type': int},
     # {'cmd': 'wRA0;', 'respLines': 1, 'parser': 'parse_att'},
     # {'cmd': 'wRA0;', 'respLines': 1, 'parser': 'parse_att'},
 ]
@@ -385,49 +429,6 @@ def findIndexOfString(element, matrix):
             return i
     return None
 
-class RigctlClient:
-    def __init__(self, host: str, port: int, timeout: float = TCP_TIMEOUT):
-        self.host = host
-        self.port = port
-        self.timeout = timeout
-        self.trx_power_status = 0
-        self.s = None
-        try:
-            self.s = socket.create_connection((self.host, self.port), timeout=self.timeout)
-            self.connected = 1
-        except:
-            self.connected = 0
-
-    def send(self, cmd: str):
-        if not cmd.endswith("\n"):
-            cmd = cmd + "\n"
-        try:
-            if self.s is not None:
-                self.s.settimeout(self.timeout)
-                self.s.sendall(cmd.encode("ascii", errors="ignore"))
-                chunks = []
-                while True:
-                    try:
-                        data = self.s.recv(1024)
-                        if not data:
-                            break
-                        chunks.append(data)
-                        if b"\n" in data or b"\0" in data:
-                            break
-                    except socket.timeout:
-                        # print('timeout')
-                        break
-                resp = b"".join(chunks).decode("utf-8", errors="ignore").strip()
-                # print(resp)
-            else:
-                resp = None
-            return resp or None
-        except (OSError, ConnectionError):
-            self.connected = 0
-            self.s = None
-            return None
-
-
 def parse_level_from_response(resp):
     if resp is None:
         return None
@@ -770,10 +771,15 @@ class SettingsDialog(QtWidgets.QDialog):
         self.edit_poll_ms.setRange(100, 5000)
         self.edit_poll_ms.setSuffix(" ms")
         self.edit_poll_ms.setValue(self.temp_settings['poll_ms'])
+        self.edit_poll_budget = QtWidgets.QSpinBox()
+        self.edit_poll_budget.setRange(5, 200)
+        self.edit_poll_budget.setSuffix(" cmd/s")
+        self.edit_poll_budget.setValue(self.temp_settings['poll_budget'])
         
         layout_conn.addRow("Host IP:", self.edit_host)
         layout_conn.addRow("Rigctl Port:", self.edit_port)
         layout_conn.addRow("Poll Interval:", self.edit_poll_ms)
+        layout_conn.addRow("CAT Poll Budget:", self.edit_poll_budget)
 
         layout_conn.addRow("", QtWidgets.QLabel(""))  # Separator
 
@@ -898,6 +904,9 @@ class SettingsDialog(QtWidgets.QDialog):
         self.check_waterfall_enabled = QtWidgets.QCheckBox("Enable Waterfall")
         self.check_waterfall_enabled.setChecked(self.temp_settings['waterfall_enabled'])
         
+        self.check_waterfall_proxy = QtWidgets.QCheckBox("Use Waterfall Proxy (port 8074)")
+        self.check_waterfall_proxy.setChecked(self.temp_settings['waterfall_proxy_enabled'])
+        
         self.edit_initial_zoom = QtWidgets.QDoubleSpinBox()
         self.edit_initial_zoom.setRange(0.05, 1.0)
         self.edit_initial_zoom.setSingleStep(0.05)
@@ -909,9 +918,30 @@ class SettingsDialog(QtWidgets.QDialog):
         self.edit_dynamic_range.setSuffix(" dB")
         self.edit_dynamic_range.setValue(self.temp_settings['waterfall_dynamic_range'])
         
+        self.edit_history_rows = QtWidgets.QSpinBox()
+        self.edit_history_rows.setRange(0, 1000000)
+        self.edit_history_rows.setSingleStep(5000)
+        self.edit_history_rows.setSpecialValueText("Off")
+        self.edit_history_rows.setValue(self.temp_settings['waterfall_history_rows'])
+        
+        self.edit_waterfall_fps = QtWidgets.QSpinBox()
+        self.edit_waterfall_fps.setRange(5, 120)
+        self.edit_waterfall_fps.setSuffix(" FPS")
+        self.edit_waterfall_fps.setValue(self.temp_settings['waterfall_fps'])
+        
+        self.combo_reduce_mode = QtWidgets.QComboBox()
+        self.combo_reduce_mode.addItem("Peak (max)", 'max')
+        self.combo_reduce_mode.addItem("Mean", 'mean')
+        self.combo_reduce_mode.addItem("Power average", 'power')
+        self.combo_reduce_mode.setCurrentIndex(max(0, self.combo_reduce_mode.findData(self.temp_settings['waterfall_reduce_mode'])))
+        
         layout_waterfall.addRow("", self.check_waterfall_enabled)
+        layout_waterfall.addRow("", self.check_waterfall_proxy)
         layout_waterfall.addRow("Initial Zoom:", self.edit_initial_zoom)
         layout_waterfall.addRow("Dynamic Range:", self.edit_dynamic_range)
+        layout_waterfall.addRow("Zoomed-out Bins:", self.combo_reduce_mode)
+        layout_waterfall.addRow("Repaint Rate:", self.edit_waterfall_fps)
+        layout_waterfall.addRow("History Rows:", self.edit_history_rows)
         
         # DX Cluster settings
         dx_separator = QtWidgets.QFrame()
@@ -1119,6 +1149,7 @@ class SettingsDialog(QtWidgets.QDialog):
         self.temp_settings['host'] = self.edit_host.text().strip()
         self.temp_settings['port'] = self.edit_port.value()
         self.temp_settings['poll_ms'] = self.edit_poll_ms.value()
+        self.temp_settings['poll_budget'] = self.edit_poll_budget.value()
         
         # Radio
         self.temp_settings['freq_step_slow'] = self.edit_freq_step_slow.value()
@@ -1139,8 +1170,12 @@ class SettingsDialog(QtWidgets.QDialog):
         
         # Waterfall
         self.temp_settings['waterfall_enabled'] = self.check_waterfall_enabled.isChecked()
+        self.temp_settings['waterfall_proxy_enabled'] = self.check_waterfall_proxy.isChecked()
         self.temp_settings['waterfall_initial_zoom'] = self.edit_initial_zoom.value()
         self.temp_settings['waterfall_dynamic_range'] = self.edit_dynamic_range.value()
+        self.temp_settings['waterfall_reduce_mode'] = self.combo_reduce_mode.currentData()
+        self.temp_settings['waterfall_fps'] = self.edit_waterfall_fps.value()
+        self.temp_settings['waterfall_history_rows'] = self.edit_history_rows.value()
         
         # DX Cluster
         self.temp_settings['dx_cluster_enabled'] = self.check_dx_cluster_enabled.isChecked()
@@ -1166,6 +1201,7 @@ class SettingsDialog(QtWidgets.QDialog):
         self.edit_host.setText(str(self.temp_settings['host']))
         self.edit_port.setValue(self.temp_settings['port'])
         self.edit_poll_ms.setValue(self.temp_settings['poll_ms'])
+        self.edit_poll_budget.setValue(self.temp_settings['poll_budget'])
         
         # Radio
         self.edit_freq_step_slow.setValue(self.temp_settings['freq_step_slow'])
@@ -1186,8 +1222,12 @@ class SettingsDialog(QtWidgets.QDialog):
         
         # Waterfall
         self.check_waterfall_enabled.setChecked(self.temp_settings['waterfall_enabled'])
+        self.check_waterfall_proxy.setChecked(self.temp_settings['waterfall_proxy_enabled'])
         self.edit_initial_zoom.setValue(self.temp_settings['waterfall_initial_zoom'])
         self.edit_dynamic_range.setValue(self.temp_settings['waterfall_dynamic_range'])
+        self.combo_reduce_mode.setCurrentIndex(max(0, self.combo_reduce_mode.findData(self.temp_settings['waterfall_reduce_mode'])))
+        self.edit_waterfall_fps.setValue(self.temp_settings['waterfall_fps'])
+        self.edit_history_rows.setValue(self.temp_settings['waterfall_history_rows'])
         
         # DX Cluster
         self.check_dx_cluster_enabled.setChecked(self.temp_settings.get('dx_cluster_enabled', False))
@@ -1216,26 +1256,117 @@ class SettingsDialog(QtWidgets.QDialog):
         combo.setCurrentIndex(0)  # fallback: Default
 
 
+class CommandDispatcher(threading.Thread, QtCore.QObject):
+    """Sends rigctld commands from a prioritized queue on its own thread.
+
+    PTT commands go first, then set-commands, then polls; commands with the
+    same priority keep their order. The GUI thread never waits for rigctld.
+    Knob-like writes are submitted with coalesce=True (last value wins).
+    """
+    result = QtCore.pyqtSignal(object, object)   # on_result, response
+
+    def __init__(self, host: str, port: int):
+        threading.Thread.__init__(self, daemon=True)
+        QtCore.QObject.__init__(self)
+        self.host = host
+        self.port = port
+        self.client = RigctlClient(host, port, timeout=TCP_TIMEOUT)
+        self._queue = CoalescingCommandQueue(SET_CMD_MIN_INTERVAL, SET_CMD_DEFAULT_INTERVAL)
+        self._reported_elided = 0
+        self._last_report = time.monotonic()
+        self.result.connect(self._deliver_result)
+
+    def submit(self, cmd, priority=PRIORITY_SET, callback=None, on_result=None, coalesce=False):
+        """Queues command (thread safe).
+
+        callback(resp) is called on the dispatcher thread,
+        on_result(resp) is delivered on the GUI thread.
+        """
+        self._queue.put(cmd, priority, callback, on_result, coalesce)
+
+    def stop(self):
+        self._queue.close()
+
+    def run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            # PTT must not get lost - reconnect and retry once
+            resp = self._send(item.cmd, retry=(item.priority == PRIORITY_PTT))
+            try:
+                if item.callback is not None:
+                    item.callback(resp)
+                if item.on_result is not None:
+                    self.result.emit(item.on_result, resp)
+            except Exception as e:
+                print(f"Command '{item.cmd.strip()}' handler failed: {e}")
+            self._report_elided()
+
+    def _report_elided(self):
+        now = time.monotonic()
+        if now - self._last_report < ELIDED_REPORT_INTERVAL:
+            return
+        self._last_report = now
+        total = self._queue.elided_total()
+        if total != self._reported_elided:
+            self._reported_elided = total
+            print(f"CAT: {total} set-commands merged so far {self._queue.elided}")
+
+    def _send(self, cmd, retry=False):
+        """Returns list of records for '+' command lines, response string otherwise."""
+        resp = None
+        for attempt in range(2 if retry else 1):
+            if attempt or not self.client.connected or self.client.s is None:
+                self.client = RigctlClient(self.host, self.port, timeout=TCP_TIMEOUT)
+            if count_extended_cmds(cmd):
+                resp = self.client.send_records(cmd)
+            else:
+                resp = self.client.send(cmd)
+            if resp is not None:
+                break
+        return resp
+
+    @QtCore.pyqtSlot(object, object)
+    def _deliver_result(self, on_result, resp):
+        on_result(resp)
+
+
 class PollWorker(QtCore.QObject):
-    result = QtCore.pyqtSignal(object)  # key, value
+    result = QtCore.pyqtSignal(object)  # {cmd: value} of changed parameters
     status = QtCore.pyqtSignal(str)
     reset_one_time = QtCore.pyqtSignal(str)   # argument: cmd
+    poll_done = QtCore.pyqtSignal(object)     # records from dispatcher thread
 
-    def __init__(self, host: str, port: int, poll_ms: int = POLL_MS):
+    def __init__(self, commands: CommandDispatcher, poll_ms: int = POLL_MS):
         super().__init__()
-        self.client = RigctlClient(host, port, timeout=TCP_TIMEOUT)
+        self.commands = commands
         self.poll_ms = poll_ms
         self._timer = None
         self.retry_cnt = 0
         self.tx_active = 0
         self.request_sent = False
         self.one_time_done = set()
+        self.one_time_cmds = {p['cmd'] for p in cyclicRefreshParams if p.get('oneTime', False)}
+        self.scheduler = PollScheduler(
+            cyclicRefreshParams,
+            {'meter': POLL_METER_MS, 'level': poll_ms, 'slow': SLOWER_POLL_MS},
+            POLL_BUDGET,
+        )
+        self._polled = []
+        self.state = RigState(cyclicRefreshParams)
+        self.meter_cmds = [p['cmd'] for p in cyclicRefreshParams if p.get('tier') == 'meter']
+        # set directly from GUI thread (not a queued signal) so a poll in flight sees it
+        self.ignore_data_until = 0.0
+        self.state_stale = False
         self.reset_one_time.connect(self.on_reset_one_time)
+        self.poll_done.connect(self.on_poll_response)
 
     @QtCore.pyqtSlot()
     def start(self):
         self._timer = QtCore.QTimer()
-        self._timer.setInterval(self.poll_ms)
+        # scheduler decides what is due on every tick
+        self._timer.setInterval(POLL_TICK_MS)
         self._timer.timeout.connect(self.poll_all)
         self._timer.start()
         self.poll_all()  # first read
@@ -1252,59 +1383,58 @@ class PollWorker(QtCore.QObject):
     def resume(self):
         """Resumes polling."""
         self.retry_cnt = 0
-        self._timer.setInterval(self.poll_ms)
-        # print(self.poll_ms)
+        self._timer.setInterval(POLL_TICK_MS)
         if self._timer and not self._timer.isActive():
             self._timer.start()
 
     @QtCore.pyqtSlot(int)
     def tx_action(self, val: int):
-        if val:
-            self.tx_active = 1
-        else:
-            self.tx_active = 0
+        tx_active = 1 if val else 0
+        if tx_active != self.tx_active:
+            self.scheduler.state_changed()
+            self.state.forget(self.meter_cmds)
+        self.tx_active = tx_active
 
     @QtCore.pyqtSlot(str)
     def on_reset_one_time(self, cmd: str):
         """Allows re-execution of oneTime command read."""
         if cmd in self.one_time_done:
             self.one_time_done.remove(cmd)
+            self.scheduler.trigger(cmd)
+            self.state.forget([cmd])
         elif cmd == 'all':
             self.one_time_done = set()
             self.one_time_done.add('\\get_vfo_info VFOA')
             self.one_time_done.add('\\get_vfo_info VFOB')
+            self.scheduler.trigger()
+            self.state.forget()
 
+    @QtCore.pyqtSlot()
     def poll_all(self):
-        if not self.client.connected:
-            try:
-                self.client = RigctlClient(HOST, PORT, timeout=TCP_TIMEOUT)
-            except:
-                pass
+        # previous poll still queued or in flight
+        if self.request_sent:
             return
-        
-        cmd = ''
 
-        for param in cyclicRefreshParams:
-            command = param['cmd']
-            is_one_time = param.get('oneTime', False)
-
-            # skip oneTime if already executed
-            if is_one_time and command in self.one_time_done:
-                continue
+        # skip oneTime if already executed, all of them during TX
+        exclude = set(self.one_time_done)
+        if self.tx_active:
+            exclude |= self.one_time_cmds
 
-            # skip during TX (optional)
-            if getattr(self, "tx_active", 0) == 1 and is_one_time:
-                continue
-
-            # add command to set
-            cmd += '+' + command + ' '
+        self._polled = self.scheduler.due(self.tx_active, exclude)
+        if not self._polled:
+            return
 
-        cmd += '\n'
+        cmd = ''.join('+' + command + ' ' for command in self._polled) + '\n'
         # print(cmd)
-        resp = self.client.send(cmd)
-        # print(resp)
+        self.request_sent = True
+        self.commands.submit(cmd, PRIORITY_POLL, callback=self.poll_done.emit)
 
-        if not resp:
+    @QtCore.pyqtSlot(object)
+    def on_poll_response(self, respArray):
+        self.request_sent = False
+        # print(respArray)
+
+        if not respArray:
             self.status.emit(f"No answer from {HOST}:{PORT}")
             if self.retry_cnt > MAX_RETRY_CNT:
                 # self._timer.setInterval(SLOWER_POLL_MS)
@@ -1313,36 +1443,26 @@ class PollWorker(QtCore.QObject):
                 self.retry_cnt += 1
             return
 
-        parts = re.split(r'(RPRT [+-]?\d+)', resp)
-        respArray = []
-        tmp = ""
+        # records come back in the order of polled commands
+        for command, record in zip(self._polled, respArray):
+            self.scheduler.update(command, record, self.tx_active)
 
-        for part in parts:
-            if re.match(r'RPRT [+-]?\d+', part):
-                # this is the end marker -> add to current block and close block
-                tmp += part + "\n"
-                respArray.append(tmp)
-                tmp = ""
-            else:
-                # data part
-                tmp += part
+        # answers right after a set-command may still hold the old value
+        if time.monotonic() < self.ignore_data_until:
+            self.state_stale = True
+            return
+        if self.state_stale:
+            self.state_stale = False
+            self.state.forget()
 
-        # remove empty elements
-        respArray =  [b for b in respArray if b.strip()]
-        # print(respArray)
-        self.result.emit(respArray)
+        changes, received = self.state.apply(self._polled, respArray)
+        if changes:
+            self.result.emit(changes)
 
         # mark oneTime as executed
-        for item in respArray:
-            if 'RPRT 0' in item:
-                for param in cyclicRefreshParams:
-                    if param.get('oneTime', False):
-                        if param.get('expectedResp') + ': ' + param.get('cmd').split(' ')[1] in item:
-                            cmd = param['cmd']
-                            if cmd not in self.one_time_done:
-                                self.one_time_done.add(cmd)
-                                # print(cmd + ' received OK')
-        return 
+        for cmd in received:
+            if cmd in self.one_time_cmds:
+                self.one_time_done.add(cmd)
 
 class DoubleClickButton(QtWidgets.QPushButton):
     singleClicked = QtCore.pyqtSignal()
@@ -1368,87 +1488,8 @@ class DoubleClickButton(QtWidgets.QPushButton):
         self.singleClicked.emit()
 
 
-def build_colormap(theme):
-    n_steps = 256
-    colors = np.array([[(c >> 16) & 0xFF, (c >> 8) & 0xFF, c & 0xFF] for c in theme], dtype=np.float32)
-    segments = len(colors) - 1
-    steps_per_segment = n_steps // segments
-    palette = np.zeros((n_steps, 3), dtype=np.uint8)
-    idx = 0
-    for s in range(segments):
-        c0 = colors[s]
-        c1 = colors[s+1]
-        for i in range(steps_per_segment):
-            t = i / steps_per_segment
-            palette[idx] = (c0 + t * (c1 - c0)).astype(np.uint8)
-            idx += 1
-    while idx < n_steps:
-        palette[idx] = colors[-1].astype(np.uint8)
-        idx += 1
-    return palette
-
 PALETTE = build_colormap(WF_THEME)
 
-class ImaAdpcmCodec:
-    ima_index_table = [-1, -1, -1, -1, 2, 4, 6, 8,
-                       -1, -1, -1, -1, 2, 4, 6, 8]
-    ima_step_table = [7,8,9,10,11,12,13,14,16,17,19,21,23,25,28,31,34,37,41,45,
-                      50,55,60,66,73,80,88,97,107,118,130,143,157,173,190,209,230,253,279,307,
-                      337,371,408,449,494,544,598,658,724,796,876,963,1060,1166,1282,1411,1552,1707,1878,2066,
-                      2272,2499,2749,3024,3327,3660,4026,4428,4871,5358,5894,6484,7132,7845,8630,9493,10442,11487,12635,13899,
-                      15289,16818,18500,20350,22385,24623,27086,29794,32767]
-    def __init__(self):
-        self.reset()
-    def reset(self):
-        self.step_index = 0
-        self.predictor = 0
-        self.step = 0
-        self.synchronized = 0
-        self.sync_word = b"SYNC"
-        self.sync_counter = 0
-        self.phase = 0
-        self.sync_buffer = np.zeros(4, dtype=np.uint8)
-        self.sync_buffer_index = 0
-    def decode(self, data):
-        # Vectorized: extract all nibbles at once
-        arr = np.frombuffer(data, dtype=np.uint8)
-        nibbles = np.empty(len(arr) * 2, dtype=np.int32)
-        nibbles[0::2] = arr & 0x0F
-        nibbles[1::2] = (arr >> 4) & 0x0F
-        # Process sequentially but with less Python overhead
-        idx_table = ImaAdpcmCodec.ima_index_table
-        step_table = ImaAdpcmCodec.ima_step_table
-        output = np.empty(len(nibbles), dtype=np.int16)
-        step_index = self.step_index
-        predictor = self.predictor
-        step = self.step
-        for i in range(len(nibbles)):
-            nib = nibbles[i]
-            step_index += idx_table[nib]
-            if step_index < 0: step_index = 0
-            elif step_index > 88: step_index = 88
-            diff = step >> 3
-            if nib & 1: diff += step >> 2
-            if nib & 2: diff += step >> 1
-            if nib & 4: diff += step
-            if nib & 8: diff = -diff
-            predictor += diff
-            if predictor > 32767: predictor = 32767
-            elif predictor < -32768: predictor = -32768
-            output[i] = predictor
-            step = step_table[step_index]
-        self.step_index = step_index
-        self.predictor = predictor
-        self.step = step
-        return output
-    
-def draw_line(data: np.ndarray, palette: np.ndarray, min_db=-120.0, max_db=-30.0, offset=0.0) -> np.ndarray:
-    data_offset = data + offset
-    norm = np.clip((data_offset - min_db) / (max_db - min_db), 0.0, 1.0)
-    indices = (norm * (len(palette) - 1)).astype(np.int32)
-    rgb_row = palette[indices]
-    return rgb_row
-
 class WaterfallWidget(QtWidgets.QWidget):
     freq_clicked = QtCore.pyqtSignal(int)   # emitted when user clicks/selects freq
     freq_hover = QtCore.pyqtSignal(int)     # emitted when mouse moves (position)
@@ -1464,22 +1505,10 @@ class WaterfallWidget(QtWidgets.QWidget):
         self.height_px = int(height/2)
         self.setMinimumSize(400, int(height/2))
 
-        # QImage as buffer only for display; we also keep _buffer (numpy) to safely modify
-        self._image = QtGui.QImage(self.width_px, self.height_px, QtGui.QImage.Format_RGB888)
-        self._image.fill(QtGui.QColor('black'))
-        self._buffer = np.zeros((self.height_px, self.width_px, 3), dtype=np.uint8)
         self.setMouseTracking(True)
 
-        self._lock = threading.Lock()
         self.min_db = WATERFALL_MIN_DB_DEFAULT
         self.max_db = self.min_db + WATERFALL_DYNAMIC_RANGE
-        self.fft_avg = 0
-
-        # FPS limiting
-        import time as _time
-        self._last_frame_time = 0.0
-        self._min_frame_interval = 1.0 / 20  # max ~20 FPS
-        self._time = _time
 
         # paleta
         self.palette = PALETTE.copy()
@@ -1487,6 +1516,46 @@ class WaterfallWidget(QtWidgets.QWidget):
         # zoom/pan
         self.zoom_factor = 1.0  # 1.0 = full width (no zoom)
         self.center_pos = 0.5   # 0..1 position in full FFT
+
+        # received rows also go to the history file, scrolled back with Shift + wheel
+        self._history = None
+        if WATERFALL_HISTORY_ROWS:
+            try:
+                self._history = HistoryFile(WATERFALL_HISTORY_FILE, WATERFALL_HISTORY_ROWS, DEFAULT_FFT_SIZE)
+            except (OSError, ValueError) as e:
+                print("Waterfall history disabled:", e)
+        self._history_seq = None    # newest history row shown at the top, None = live
+        self._history_map = ColumnMap(WATERFALL_REDUCE_MODE)
+        self._history_image = None
+        self._history_levels = None
+        self._history_times = None
+        self._history_key = None
+
+        # rows are stored as level bytes, colours come from this table when drawing
+        self._colors = None
+        self._colors_key = None
+
+        # rows are rendered on a separate thread, paintEvent only blits its ring
+        self._renderer = RowRenderer(
+            self.height_px - WATERFALL_MARGIN, self.width_px,
+            view=lambda: (self.zoom_factor, self.center_pos),
+            reduce_mode=WATERFALL_REDUCE_MODE,
+            history=self._history,
+        )
+        self._wrap_ring(self._renderer.ring)
+        self._renderer.start()
+
+        # repaint paced by timer at target FPS, rows arrived meanwhile share one paint
+        self.frames_painted = 0
+        self.rows_merged = 0
+        self._painted_rows = 0
+        self._reported_stats = None
+        self._last_stats_report = time.monotonic()
+        self._frame_timer = QtCore.QTimer(self)
+        self._frame_timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self._frame_timer.timeout.connect(self._on_frame)
+        self.set_target_fps(WATERFALL_FPS)
+        self._frame_timer.start()
         self._dragging = False
         self._last_x = 0
 
@@ -1516,13 +1585,94 @@ class WaterfallWidget(QtWidgets.QWidget):
         self.bookmarks = []
         self._hovered_bookmark = None
 
+        # Cached overlay layers (scale + bands, bookmark/spot dots),
+        # rebuilt only when view (zoom/pan/size) or their data changes
+        self._scale_layer = None
+        self._scale_key = None
+        self._marker_layer = None
+        self._marker_key = None
+
         self.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
 
+    def _wrap_ring(self, ring):
+        """_image wraps the ring memory (no copy), paintEvent draws it in two parts."""
+        # writable pointer: an image over read-only memory is copied by setColorTable()
+        self._image = QtGui.QImage(sip.voidptr(ring.data.ctypes.data), ring.width, ring.rows,
+                                   ring.width, QtGui.QImage.Format_Indexed8)
+        self._image_colors = None
+
+    def _color_table(self):
+        """Colour of every level for current min/max dB, rebuilt only when they change."""
+        key = (self.min_db, self.max_db)
+        if key != self._colors_key:
+            rgb = level_palette(self.palette, self.min_db, self.max_db).astype(np.uint32)
+            self._colors = ((0xFF << 24) | (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]).tolist()
+            self._colors_key = key
+        return self._colors
+
+    @property
+    def fft_avg(self):
+        return self._renderer.fft_avg
+
+    def stop(self):
+        self._renderer.stop()
+        if self._history is not None:
+            self._history.close()
+
+    def set_dx_spots(self, spots):
+        self.dx_spots = spots
+        self._marker_key = None
+        self.update()
+
+    def set_bookmarks(self, bookmarks):
+        self.bookmarks = bookmarks
+        self._marker_key = None
+        self.update()
+
+    def _waterfall_rect(self):
+        """Area below the frequency scale where rows are drawn."""
+        return QtCore.QRect(0, WATERFALL_MARGIN, self.width_px, max(0, self.height_px - WATERFALL_MARGIN))
+
+    def set_reduce_mode(self, mode):
+        self._renderer.column_map.set_mode(mode)
+        self._history_map.set_mode(mode)
+        self._history_key = None
+
+    def scroll_history(self, rows):
+        """Moves the view rows back in time (negative = towards live)."""
+        if self._history is None:
+            return
+        newest = self._history.count - 1
+        seq = newest if self._history_seq is None else self._history_seq
+        seq = max(self._history.oldest, seq - rows)
+        self._history_seq = None if seq >= newest else seq
+        self.update()
+
+    def _render_history(self, rect):
+        """Image of the history rows that fit in rect, rebuilt only when view changes."""
+        # rows keep arriving while scrolled back, the top row shown may be overwritten by now
+        self._history_seq = max(self._history_seq, self._history.oldest)
+        key = (self._history_seq, rect.width(), rect.height(), self.zoom_factor, self.center_pos)
+        if key == self._history_key:
+            return
+        self._history_key = key
+        times, rows = self._history.read(self._history_seq, rect.height())
+        self._history_times = times
+        self._history_map.update(self._history.bins, self.zoom_factor, self.center_pos, rect.width())
+        levels = np.ascontiguousarray(self._history_map.apply(rows))
+        self._history_levels = levels     # QImage does not own the memory
+        self._history_image = QtGui.QImage(sip.voidptr(levels.ctypes.data), rect.width(), len(levels),
+                                           rect.width(), QtGui.QImage.Format_Indexed8)
+
+    # Levels only change the colour table, the stored rows (live ring and
+    # history) are recoloured on the next paint without waiting for new rows
     def set_min_db(self, value):
         self.min_db = int(value)
+        self.update()
 
     def set_max_db(self, value):
         self.max_db = int(value)
+        self.update()
 
     def _x_to_freq(self, x):
         vis_start, vis_end = self._visible_freq_range()
@@ -1578,15 +1728,14 @@ class WaterfallWidget(QtWidgets.QWidget):
             self.min_db = self.fft_avg - WATERFALL_DYNAMIC_RANGE * 0.3
             self.max_db = self.min_db + WATERFALL_DYNAMIC_RANGE
             self.new_min_db.emit(int(self.min_db))
+            self.update()
 
     def resizeEvent(self, event):
         new_size = event.size()
-        with self._lock:
-            self.width_px = new_size.width()
-            self.height_px = new_size.height()
-            self._image = QtGui.QImage(self.width_px, self.height_px, QtGui.QImage.Format_RGB888)
-            self._image.fill(QtGui.QColor('black'))
-            self._buffer = np.zeros((self.height_px, self.width_px, 3), dtype=np.uint8)
+        self.width_px = new_size.width()
+        self.height_px = new_size.height()
+        # paintEvent runs on this thread too, so the new ring is wrapped before next paint
+        self._wrap_ring(self._renderer.resize(self.height_px - WATERFALL_MARGIN, self.width_px))
 
         self.update()
         super().resizeEvent(event)
@@ -1594,7 +1743,14 @@ class WaterfallWidget(QtWidgets.QWidget):
     def wheelEvent(self, event):
         delta = event.angleDelta().y()
 
-        if event.modifiers() & QtCore.Qt.ControlModifier or self._dragging:
+        if event.modifiers() & QtCore.Qt.ShiftModifier:
+            # some platforms turn Shift + wheel into horizontal scrolling
+            delta = delta or event.angleDelta().x()
+            steps = -1 if delta > 0 else 1
+            self.scroll_history(steps * WATERFALL_HISTORY_STEP)
+            event.accept()
+
+        elif event.modifiers() & QtCore.Qt.ControlModifier or self._dragging:
             # pozycja kursora (x w pikselach)
             mouse_x = event.x()
 
@@ -1746,48 +1902,45 @@ class WaterfallWidget(QtWidgets.QWidget):
             vis_start = vis_end - vis_bw
         return vis_start, vis_end
 
-    @QtCore.pyqtSlot(np.ndarray)
     def push_row(self, fft_row):
-        # FPS limiting — drop frames if too fast
-        now = self._time.time()
-        if now - self._last_frame_time < self._min_frame_interval:
-            return
-        self._last_frame_time = now
-
-        # zoom: select slice
-        n = len(fft_row)
-        self.fft_avg = np.mean(fft_row)
-        visible_n = max(2, int(n * self.zoom_factor))
-        center = int(self.center_pos * n)
-        start = max(0, center - visible_n // 2)
-        end = min(n, start + visible_n)
-        if end - start < visible_n:
-            start = max(0, end - visible_n)
-        fft_visible = fft_row[start:end]
-
-        # scale to widget width
-        if fft_visible.size != self.width_px:
-            x_old = np.arange(len(fft_visible))
-            x_new = np.linspace(0, len(fft_visible) - 1, self.width_px)
-            fft_visible = np.interp(x_new, x_old, fft_visible)
-
-        rgb_row = draw_line(fft_visible, self.palette, self.min_db, self.max_db)
+        """Queues decoded row for rendering, can be called from any thread."""
+        self._renderer.submit(fft_row)
 
-        with self._lock:
-            # scroll buffer down by one row (only waterfall area)
-            self._buffer[1+WATERFALL_MARGIN:] = self._buffer[WATERFALL_MARGIN:-1]
-            self._buffer[WATERFALL_MARGIN] = rgb_row
-
-            # copy to QImage
-            ptr = self._image.bits()
-            ptr.setsize(self._image.byteCount())
-            bytes_per_line = self._image.bytesPerLine()
-            arr2d = np.frombuffer(ptr, dtype=np.uint8).reshape((self.height_px, bytes_per_line))
-            rgb_view = arr2d[:, :self.width_px * 3].reshape((self.height_px, self.width_px, 3))
-            rgb_view[:, :] = self._buffer[:, :]
-
-        # request redraw
-        self.update()
+    def set_target_fps(self, fps):
+        self._frame_timer.setInterval(int(1000 / max(1, fps)))
+
+    def frame_stats(self):
+        """Counters of rows rendered, frames painted, rows sharing a frame and rows dropped."""
+        return {
+            'rendered': self._renderer.rendered,
+            'painted': self.frames_painted,
+            'merged': self.rows_merged,
+            'dropped': self._renderer.dropped,
+        }
+
+    @QtCore.pyqtSlot()
+    def _on_frame(self):
+        rendered = self._renderer.rendered
+        new_rows = rendered - self._painted_rows
+        if new_rows > 0:
+            self._painted_rows = rendered
+            self.frames_painted += 1
+            self.rows_merged += new_rows - 1
+            # only rows changed, scale and markers stay cached; history view is frozen
+            if self._history_seq is None:
+                self.update(self._waterfall_rect())
+        self._report_frame_stats()
+
+    def _report_frame_stats(self):
+        now = time.monotonic()
+        if now - self._last_stats_report < WATERFALL_STATS_REPORT_INTERVAL:
+            return
+        self._last_stats_report = now
+        stats = self.frame_stats()
+        if stats != self._reported_stats:
+            self._reported_stats = stats
+            print(f"Waterfall: {stats['rendered']} rows in {stats['painted']} frames, "
+                  f"{stats['merged']} merged, {stats['dropped']} dropped")
 
     def _format_freq(self, hz):
         # frequency formatting -> Hz, kHz, MHz
@@ -1797,233 +1950,292 @@ class WaterfallWidget(QtWidgets.QWidget):
             return f"{hz/1e3:.1f} kHz"
         return f"{int(hz)} Hz"
 
+    def _freq_to_x(self, freq, vis_start, bw):
+        return int((freq - vis_start) / bw * (self.width_px - 1))
+
+    def _render_scale_layer(self, vis_start, vis_end):
+        """Frequency scale (labels every 0.1 MHz + intermediate ticks) and ham bands."""
+        layer = QtGui.QPixmap(max(1, self.width_px), WATERFALL_MARGIN)
+        layer.fill(QtCore.Qt.transparent)
+        painter = QtGui.QPainter(layer)
+        bw = vis_end - vis_start
+
+        painter.setPen(QtGui.QPen(QtGui.QColor("#ffd000"), 1))
+        font = painter.font()
+        font.setPointSize(10)
+        painter.setFont(font)
+        metrics = painter.fontMetrics()
+
+        # major ticks every 0.1 MHz
+        start_mhz = vis_start / 1e6
+        end_mhz = vis_end / 1e6
+        start_tick = np.floor(start_mhz * 10) / 10
+        end_tick = np.ceil(end_mhz * 10) / 10
+        inv_bw = 1.0 / bw if bw > 0 else 0
+        w_minus_1 = self.width_px - 1
+
+        tick = start_tick
+        while tick <= end_tick + 1e-9:
+            freq_hz = tick * 1e6
+            if vis_start <= freq_hz <= vis_end:
+                x = int((freq_hz - vis_start) * inv_bw * w_minus_1)
+                # major tick + label
+                painter.drawLine(x, WATERFALL_MARGIN - MAJOR_THICK_HEIGHT, x, WATERFALL_MARGIN)
+                text = f"{tick:.2f}"
+                tw = metrics.horizontalAdvance(text)
+                tx = max(2, x - tw // 2)
+                painter.drawText(tx, 16, text)
+
+                # intermediate ticks
+                if MINOR_TICKS_PER_MAJOR > 0:
+                    step = 0.1 / MINOR_TICKS_PER_MAJOR
+                    for i in range(1, MINOR_TICKS_PER_MAJOR):
+                        sub_tick = tick + i * step
+                        sub_freq_hz = sub_tick * 1e6
+                        if sub_freq_hz >= vis_end:
+                            break
+                        x_sub = int((sub_freq_hz - vis_start) * inv_bw * w_minus_1)
+                        painter.drawLine(x_sub, WATERFALL_MARGIN - MINOR_TICK_HEIGHT, x_sub, WATERFALL_MARGIN)
+            tick += 0.05
+
+        # --- green bands for amateur bands
+        bw = max(1e-9, bw)
+        for name, f_start, f_end in HAM_BANDS:
+            # if band is visible at all in current range
+            if f_end < vis_start or f_start > vis_end:
+                continue
+
+            # calculate visible fragment
+            start_clamped = max(f_start, vis_start)
+            end_clamped = min(f_end, vis_end)
+
+            # convert to pixels
+            x1 = self._freq_to_x(start_clamped, vis_start, bw)
+            x2 = self._freq_to_x(end_clamped, vis_start, bw)
+
+            # width (min 2px to be visible even when zoomed)
+            w = max(2, x2 - x1)
+
+            # semi-transparent green band
+            painter.fillRect(x1, WATERFALL_MARGIN - 10, w, 10, QtGui.QColor(0, 200, 0, 90))
+
+            # band label (if it fits)
+            text = name
+            tw = metrics.horizontalAdvance(text)
+            if w > tw + 4:
+                painter.setPen(QtGui.QPen(QtGui.QColor(150, 255, 150), 1))
+                painter.drawText(x1 + (w - tw) // 2, WATERFALL_MARGIN - 2, text)
+
+        painter.end()
+        return layer
+
+    def _render_marker_layer(self, vis_start, vis_end):
+        """Bookmark (cyan) and DX Cluster spot (orange) dots on top of the scale."""
+        layer = QtGui.QPixmap(max(1, self.width_px), WATERFALL_MARGIN)
+        layer.fill(QtCore.Qt.transparent)
+        painter = QtGui.QPainter(layer)
+        painter.setPen(QtCore.Qt.NoPen)
+        bw = max(1e-9, vis_end - vis_start)
+
+        if self.bookmarks:
+            BM_DOT_RADIUS = 3
+            BM_DOT_Y = WATERFALL_MARGIN - 7
+            painter.setBrush(QtGui.QColor(0, 200, 255, 220))
+            for bm in self.bookmarks:
+                f = bm['freq_hz']
+                if vis_start <= f <= vis_end:
+                    x_bm = self._freq_to_x(f, vis_start, bw)
+                    painter.drawEllipse(x_bm - BM_DOT_RADIUS, BM_DOT_Y - BM_DOT_RADIUS, BM_DOT_RADIUS * 2, BM_DOT_RADIUS * 2)
+
+        if self.dx_cluster_enabled and self.dx_spots:
+            DOT_RADIUS = 3
+            DOT_Y = WATERFALL_MARGIN - 3
+            painter.setBrush(QtGui.QColor(255, 140, 0, 220))
+            for spot in self.dx_spots:
+                f = spot['freq_hz']
+                if vis_start <= f <= vis_end:
+                    x_spot = self._freq_to_x(f, vis_start, bw)
+                    painter.drawEllipse(x_spot - DOT_RADIUS, DOT_Y - DOT_RADIUS, DOT_RADIUS * 2, DOT_RADIUS * 2)
+
+        painter.end()
+        return layer
+
+    def _draw_tooltip(self, painter, x, ty, tip_text, border, text_color):
+        tip_font = painter.font()
+        tip_font.setPointSize(9)
+        tip_font.setBold(True)
+        painter.setFont(tip_font)
+        tip_metrics = painter.fontMetrics()
+        tw = tip_metrics.horizontalAdvance(tip_text)
+        th = tip_metrics.height()
+        tx = max(2, min(x - tw // 2, self.width_px - tw - 4))
+        painter.fillRect(tx - 3, ty - 1, tw + 6, th + 4, QtGui.QColor(30, 30, 30, 140))
+        painter.setPen(QtGui.QPen(border, 1))
+        painter.drawRect(tx - 3, ty - 1, tw + 6, th + 4)
+        painter.setPen(QtGui.QPen(text_color, 1))
+        painter.drawText(tx, ty + th - 2, tip_text)
+        # restore font
+        tip_font.setBold(False)
+        tip_font.setPointSize(10)
+        painter.setFont(tip_font)
+
     def paintEvent(self, event):
         painter = QtGui.QPainter(self)
-        # draw image
-        with self._lock:
-            painter.drawImage(self.rect(), self._image, self._image.rect())
-
-            # --- drawing frequency scale (labels every 0.1 MHz + intermediate ticks)
-            vis_start, vis_end = self._visible_freq_range()
-            bw = vis_end - vis_start
-
-            painter.setPen(QtGui.QPen(QtGui.QColor("#ffd000"), 1))
-            font = painter.font()
-            font.setPointSize(10)
-            painter.setFont(font)
-            metrics = painter.fontMetrics()
-
-            # major ticks every 0.1 MHz
-            start_mhz = vis_start / 1e6
-            end_mhz = vis_end / 1e6
-            start_tick = np.floor(start_mhz * 10) / 10
-            end_tick = np.ceil(end_mhz * 10) / 10
-            inv_bw = 1.0 / bw if bw > 0 else 0
-            w_minus_1 = self.width_px - 1
-
-            tick = start_tick
-            while tick <= end_tick + 1e-9:
-                freq_hz = tick * 1e6
-                if vis_start <= freq_hz <= vis_end:
-                    x = int((freq_hz - vis_start) * inv_bw * w_minus_1)
-                    # major tick + label
-                    painter.drawLine(x, WATERFALL_MARGIN - MAJOR_THICK_HEIGHT, x, WATERFALL_MARGIN)
-                    text = f"{tick:.2f}"
-                    tw = metrics.horizontalAdvance(text)
-                    tx = max(2, x - tw // 2)
-                    painter.drawText(tx, 16, text)
-
-                    # intermediate ticks
-                    if MINOR_TICKS_PER_MAJOR > 0:
-                        step = 0.1 / MINOR_TICKS_PER_MAJOR
-                        for i in range(1, MINOR_TICKS_PER_MAJOR):
-                            sub_tick = tick + i * step
-                            sub_freq_hz = sub_tick * 1e6
-                            if sub_freq_hz >= vis_end:
-                                break
-                            x_sub = int((sub_freq_hz - vis_start) * inv_bw * w_minus_1)
-                            painter.drawLine(x_sub, WATERFALL_MARGIN - MINOR_TICK_HEIGHT, x_sub, WATERFALL_MARGIN)
-                tick += 0.05
-
-
-            # draw frame and current min/max dB values in corner
-            overlay_y = self.height_px - 92
-            painter.setPen(QtGui.QPen(QtGui.QColor(180,180,180), 1))
-            # painter.drawRect(0, 0, self.width_px-1, self.height_px-1)
-
-            # min/max dB | hover freq overlay
-            painter.fillRect(4, overlay_y + 22, 120, 52, QtGui.QColor(60,60,60,150))
-            painter.setPen(QtGui.QPen(QtGui.QColor(255,255,255), 1))
-            painter.drawText(8, overlay_y + 38, f"Min dB: {self.min_db:.0f}")
-            painter.drawText(8, overlay_y + 54, f"Max dB: {self.max_db:.0f}")
-            painter.drawText(8, overlay_y + 54 + 16, f"{self.hover_freq/1000000:.3f}")
-
-            # --- drawing green bands for amateur bands
-            for name, f_start, f_end in HAM_BANDS:
-                # if band is visible at all in current range
-                if f_end < vis_start or f_start > vis_end:
-                    continue
-
-                # calculate visible fragment
-                start_clamped = max(f_start, vis_start)
-                end_clamped = min(f_end, vis_end)
-
-                # convert to pixels
-                x1 = int((start_clamped - vis_start) / bw * (self.width_px - 1))
-                x2 = int((end_clamped - vis_start) / bw * (self.width_px - 1))
-
-                # width (min 2px to be visible even when zoomed)
-                w = max(2, x2 - x1)
-
-                # semi-transparent green band
-                painter.fillRect(x1, WATERFALL_MARGIN - 10, w, 10, QtGui.QColor(0, 200, 0, 90))
-
-                # band label (if it fits)
-                text = name
-                tw = metrics.horizontalAdvance(text)
-                if w > tw + 4:
-                    painter.setPen(QtGui.QPen(QtGui.QColor(150, 255, 150), 1))
-                    painter.drawText(x1 + (w - tw) // 2, WATERFALL_MARGIN - 2, text)
-
-            if self.hover_freq is not None:
-                if vis_start <= self.hover_freq <= vis_end:
-                    x_h = int((self.hover_freq - vis_start) / bw * (self.width_px - 1))
-                    pen_h = QtGui.QPen(QtGui.QColor(150, 255, 150, 255), 2)   # cyan
-                    painter.setPen(pen_h)
-                    painter.drawLine(x_h, 0, x_h, self.height_px)
-                    painter.drawText(x_h, self.height_px - 16, f"{self.hover_freq/1000000:.4f}")
-
-            # --- drawing vertical lines: selected (yellow) and hover (cyan)
-            # freq -> x mapping
-            vis_start, vis_end = self._visible_freq_range()
-            bw = max(1e-9, (vis_end - vis_start))
-            if self.selected_freq is not None:
-                if vis_start <= self.selected_freq <= vis_end:
-                    x_sel = int((self.selected_freq - vis_start) / bw * (self.width_px - 1))
-                    pen_sel = QtGui.QPen(QtGui.QColor(255, 255, 0, 220), 2)  # yellow
-                    painter.setPen(pen_sel)
-                    painter.drawLine(x_sel, 0, x_sel, self.height_px)
-                    # filter width
-                    x_width = x_sel
-                    width = int((self.selected_freq + self.filter_width - vis_start) / bw * (self.width_px - 1))
-                    if self.mode == 'USB':
-                        width = int((self.selected_freq + self.filter_width - vis_start) / bw * (self.width_px - 1))
-                    elif self.mode == 'LSB':
-                        width = int((self.selected_freq - self.filter_width - vis_start) / bw * (self.width_px - 1))
-                    elif self.mode == 'CW':
-                        width = int((self.selected_freq - self.filter_width - vis_start) / bw * (self.width_px - 1))
-                    elif self.mode == 'AM' or self.mode == 'FM':
-                        width = int((self.selected_freq + self.filter_width/2 - vis_start) / bw * (self.width_px - 1))
-                        x_width = int((self.selected_freq - self.filter_width/2 - vis_start) / bw * (self.width_px - 1))
-
-                    painter.fillRect(x_width, 0, width - x_width, self.height_px, QtGui.QColor(205,205,100,50))
-                    # draw frequency label
-                    # painter.fillRect(x_sel, x_sel + 100, self.height_px - 2, self.height_px + 12, QtGui.QColor(60,60,60,150))
-                    painter.drawText(x_sel, self.height_px - 2, f"{self.selected_freq/1000000:.4f}")
-
-            # --- drawing bookmarks (cyan dots on top of scale) ---
-            if self.bookmarks:
-                BM_DOT_RADIUS = 3
-                BM_DOT_Y = WATERFALL_MARGIN - 7
-                for bm in self.bookmarks:
-                    f = bm['freq_hz']
-                    if vis_start <= f <= vis_end:
-                        x_bm = int((f - vis_start) / bw * (self.width_px - 1))
-                        painter.setPen(QtCore.Qt.NoPen)
-                        painter.setBrush(QtGui.QColor(0, 200, 255, 220))
-                        painter.drawEllipse(x_bm - BM_DOT_RADIUS, BM_DOT_Y - BM_DOT_RADIUS, BM_DOT_RADIUS * 2, BM_DOT_RADIUS * 2)
-
-                # tooltip for hovered bookmark
-                if self._hovered_bookmark is not None:
-                    hb = self._hovered_bookmark
-                    f = hb['freq_hz']
-                    if vis_start <= f <= vis_end:
-                        x_bm = int((f - vis_start) / bw * (self.width_px - 1))
-                        tip_font = painter.font()
-                        tip_font.setPointSize(9)
-                        tip_font.setBold(True)
-                        painter.setFont(tip_font)
-                        tip_metrics = painter.fontMetrics()
-                        name = hb.get('name', '')
-                        tip_text = f"{name}  {f/1e6:.4f} {hb.get('mode', '')}" if name else f"{f/1e6:.4f} {hb.get('mode', '')}"
-                        tw = tip_metrics.horizontalAdvance(tip_text)
-                        th = tip_metrics.height()
-                        tx = max(2, min(x_bm - tw // 2, self.width_px - tw - 4))
-                        ty = 12
-                        painter.fillRect(tx - 3, ty - 1, tw + 6, th + 4, QtGui.QColor(30, 30, 30, 140))
-                        painter.setPen(QtGui.QPen(QtGui.QColor(100, 220, 255, 140), 1))
-                        painter.drawRect(tx - 3, ty - 1, tw + 6, th + 4)
-                        painter.setPen(QtGui.QPen(QtGui.QColor(150, 240, 255, 200), 1))
-                        painter.drawText(tx, ty + th - 2, tip_text)
-                        tip_font.setBold(False)
-                        tip_font.setPointSize(10)
-                        painter.setFont(tip_font)
-
-                painter.setBrush(QtCore.Qt.NoBrush)
-
-            # --- drawing DX Cluster spots (dots on scale + tooltip on hover) ---
-            if self.dx_cluster_enabled and self.dx_spots:
-                DOT_RADIUS = 3
-                DOT_Y = WATERFALL_MARGIN - 3
-                for spot in self.dx_spots:
-                    f = spot['freq_hz']
-                    if vis_start <= f <= vis_end:
-                        x_spot = int((f - vis_start) / bw * (self.width_px - 1))
-                        # orange dot on scale
-                        painter.setPen(QtCore.Qt.NoPen)
-                        painter.setBrush(QtGui.QColor(255, 140, 0, 220))
-                        painter.drawEllipse(x_spot - DOT_RADIUS, DOT_Y - DOT_RADIUS, DOT_RADIUS * 2, DOT_RADIUS * 2)
-
-                # tooltip for hovered spot
-                if self._hovered_spot is not None:
-                    hs = self._hovered_spot
-                    f = hs['freq_hz']
-                    if vis_start <= f <= vis_end:
-                        x_spot = int((f - vis_start) / bw * (self.width_px - 1))
-                        tip_font = painter.font()
-                        tip_font.setPointSize(9)
-                        tip_font.setBold(True)
-                        painter.setFont(tip_font)
-                        tip_metrics = painter.fontMetrics()
-                        tip_text = f"{hs['call']}" # {f/1e3:.1f}
-                        tw = tip_metrics.horizontalAdvance(tip_text)
-                        th = tip_metrics.height()
-                        tx = max(2, min(x_spot - tw // 2, self.width_px - tw - 4))
-                        ty = WATERFALL_MARGIN - 23
-                        painter.fillRect(tx - 3, ty - 1, tw + 6, th + 4, QtGui.QColor(30, 30, 30, 140))
-                        painter.setPen(QtGui.QPen(QtGui.QColor(255, 200, 80, 140), 1))
-                        painter.drawRect(tx - 3, ty - 1, tw + 6, th + 4)
-                        painter.setPen(QtGui.QPen(QtGui.QColor(255, 220, 100, 200), 1))
-                        painter.drawText(tx, ty + th - 2, tip_text)
-                        # restore font
-                        tip_font.setBold(False)
-                        tip_font.setPointSize(10)
-                        painter.setFont(tip_font)
-
-                painter.setBrush(QtCore.Qt.NoBrush)
+        dirty = event.rect()
+        if dirty.top() < WATERFALL_MARGIN:
+            painter.fillRect(0, 0, self.width_px, WATERFALL_MARGIN, QtCore.Qt.black)
+        colors = self._color_table()
+        if self._history_seq is None:
+            # the renderer thread writes the ring, hold its lock only for the blits
+            with self._renderer.lock:
+                # rows from head to the end of ring are the newest (top), then the wrapped part
+                rows = self._renderer.ring.rows
+                head = self._renderer.ring.head
+                top = rows - head
+                if self._image_colors is not colors:
+                    self._image.setColorTable(colors)
+                    self._image_colors = colors
+                painter.drawImage(QtCore.QRect(0, WATERFALL_MARGIN, self.width_px, top),
+                                  self._image, QtCore.QRect(0, head, self.width_px, top))
+                if head:
+                    painter.drawImage(QtCore.QRect(0, WATERFALL_MARGIN + top, self.width_px, head),
+                                      self._image, QtCore.QRect(0, 0, self.width_px, head))
+        else:
+            rect = self._waterfall_rect()
+            self._render_history(rect)
+            self._history_image.setColorTable(colors)
+            painter.fillRect(rect, QtCore.Qt.black)
+            painter.drawImage(rect.topLeft(), self._history_image)
+            if len(self._history_times):
+                age = time.time() - self._history_times[0]
+                painter.fillRect(self.width_px - 150, WATERFALL_MARGIN + 4, 146, 20, QtGui.QColor(60,60,60,150))
+                painter.setPen(QtGui.QPen(QtGui.QColor(255,200,0), 1))
+                painter.drawText(self.width_px - 146, WATERFALL_MARGIN + 19,
+                                 f"History -{int(age // 60)}:{int(age % 60):02d} (Shift+wheel)")
+
+        vis_start, vis_end = self._visible_freq_range()
+        bw = max(1e-9, vis_end - vis_start)
+
+        # --- static layers, re-rendered only when view or data changed
+        scale_key = (self.width_px, vis_start, vis_end)
+        if scale_key != self._scale_key:
+            self._scale_layer = self._render_scale_layer(vis_start, vis_end)
+            self._scale_key = scale_key
+        marker_key = (self.width_px, vis_start, vis_end, self.dx_cluster_enabled)
+        if marker_key != self._marker_key:
+            self._marker_layer = self._render_marker_layer(vis_start, vis_end)
+            self._marker_key = marker_key
+        if dirty.top() < WATERFALL_MARGIN:
+            painter.drawPixmap(0, 0, self._scale_layer)
+
+        font = painter.font()
+        font.setPointSize(10)
+        painter.setFont(font)
+
+        # draw frame and current min/max dB values in corner
+        overlay_y = self.height_px - 92
+
+        # min/max dB | hover freq overlay
+        painter.fillRect(4, overlay_y + 22, 120, 52, QtGui.QColor(60,60,60,150))
+        painter.setPen(QtGui.QPen(QtGui.QColor(255,255,255), 1))
+        painter.drawText(8, overlay_y + 38, f"Min dB: {self.min_db:.0f}")
+        painter.drawText(8, overlay_y + 54, f"Max dB: {self.max_db:.0f}")
+        painter.drawText(8, overlay_y + 54 + 16, f"{self.hover_freq/1000000:.3f}")
+
+        if self.hover_freq is not None:
+            if vis_start <= self.hover_freq <= vis_end:
+                x_h = self._freq_to_x(self.hover_freq, vis_start, bw)
+                pen_h = QtGui.QPen(QtGui.QColor(150, 255, 150, 255), 2)   # cyan
+                painter.setPen(pen_h)
+                painter.drawLine(x_h, 0, x_h, self.height_px)
+                painter.drawText(x_h, self.height_px - 16, f"{self.hover_freq/1000000:.4f}")
+
+        # --- drawing vertical lines: selected (yellow) and hover (cyan)
+        if self.selected_freq is not None:
+            if vis_start <= self.selected_freq <= vis_end:
+                x_sel = self._freq_to_x(self.selected_freq, vis_start, bw)
+                pen_sel = QtGui.QPen(QtGui.QColor(255, 255, 0, 220), 2)  # yellow
+                painter.setPen(pen_sel)
+                painter.drawLine(x_sel, 0, x_sel, self.height_px)
+                # filter width
+                x_width = x_sel
+                width = self._freq_to_x(self.selected_freq + self.filter_width, vis_start, bw)
+                if self.mode == 'LSB' or self.mode == 'CW':
+                    width = self._freq_to_x(self.selected_freq - self.filter_width, vis_start, bw)
+                elif self.mode == 'AM' or self.mode == 'FM':
+                    width = self._freq_to_x(self.selected_freq + self.filter_width/2, vis_start, bw)
+                    x_width = self._freq_to_x(self.selected_freq - self.filter_width/2, vis_start, bw)
+
+                painter.fillRect(x_width, 0, width - x_width, self.height_px, QtGui.QColor(205,205,100,50))
+                # draw frequency label
+                painter.drawText(x_sel, self.height_px - 2, f"{self.selected_freq/1000000:.4f}")
+
+        # --- bookmarks and DX Cluster spots (dots on scale + tooltip on hover)
+        if dirty.top() < WATERFALL_MARGIN:
+            painter.drawPixmap(0, 0, self._marker_layer)
+
+        if self.bookmarks and self._hovered_bookmark is not None:
+            hb = self._hovered_bookmark
+            f = hb['freq_hz']
+            if vis_start <= f <= vis_end:
+                name = hb.get('name', '')
+                tip_text = f"{name}  {f/1e6:.4f} {hb.get('mode', '')}" if name else f"{f/1e6:.4f} {hb.get('mode', '')}"
+                self._draw_tooltip(painter, self._freq_to_x(f, vis_start, bw), 12, tip_text,
+                                   QtGui.QColor(100, 220, 255, 140), QtGui.QColor(150, 240, 255, 200))
+
+        if self.dx_cluster_enabled and self.dx_spots and self._hovered_spot is not None:
+            hs = self._hovered_spot
+            f = hs['freq_hz']
+            if vis_start <= f <= vis_end:
+                self._draw_tooltip(painter, self._freq_to_x(f, vis_start, bw), WATERFALL_MARGIN - 23, f"{hs['call']}",
+                                   QtGui.QColor(255, 200, 80, 140), QtGui.QColor(255, 220, 100, 200))
 
 class WsReceiver(threading.Thread, QtCore.QObject):
     push_row_signal = QtCore.pyqtSignal(object)
     config_signal = QtCore.pyqtSignal(dict)
 
-    def __init__(self, ws_url, fft_size=DEFAULT_FFT_SIZE):
+    # FFT frames decoded in parallel, rows still leave in arrival order
+    DECODE_WORKERS = 2
+    # frames waiting for decode, newer frames are dropped above this
+    MAX_PENDING = 8
+    # how often the view is checked for renegotiation with the proxy
+    VIEW_CHECK_INTERVAL = 0.3
+
+    def __init__(self, ws_url, fft_size=DEFAULT_FFT_SIZE, view=None):
         threading.Thread.__init__(self, daemon=True)
         QtCore.QObject.__init__(self)
         self.ws_url = ws_url
         self.fft_size = fft_size
-        self.fft_codec = ImaAdpcmCodec()
         self._stop_event = threading.Event()
+        self._loop = None
+        self._main_task = None
         self._ws = None
+        self._pool = None
+        self._codecs = threading.local()
+        self._config = {}
+        self.dropped = 0
+        # view() -> (zoom_factor, center_pos, width), sent to the proxy when it changes
+        self.view = view
+        self._proxied = False
+        self._link_view = None
+        self.bytes_received = 0
+        self._decoders = {FRAME_TYPE_FFT: self._decode, FRAME_TYPE_ROW: decode_row_frame,
+                          FRAME_TYPE_ROW_ZLIB: decode_row_frame}
         self.samp_rate = 1000000
         self.center_freq = 14250000
 
     def stop(self):
         self._stop_event.set()
-        try:
-            if self._ws:
-                self._ws.close()
-        except Exception:
-            pass
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self._cancel_main)
+            except RuntimeError:
+                pass
+
+    def _cancel_main(self):
+        if self._main_task is not None:
+            self._main_task.cancel()
 
     def send_set_frequency(self, frequency):
         low_freq = self.center_freq - self.samp_rate / 2
@@ -2031,83 +2243,173 @@ class WsReceiver(threading.Thread, QtCore.QObject):
         # Change SDR frequency when current frequency is outside bandwith
         if frequency > high_freq or frequency < low_freq:
             print('Changing SDR frequency to ' + str(frequency))
+            cmd = '{"type":"setfrequency","params":{"frequency":' + str(int(frequency + self.samp_rate / 6)) + '}}' # Add offset to not tune exactly on desired freq
+            self.send_text(cmd)
+
+    def send_text(self, text):
+        """Thread safe send of a text message on the current connection."""
+        ws, loop = self._ws, self._loop
+        if ws is None or ws.closed or loop is None:
+            print("WsReceiver: no active ws to send", text[:40])
+            return
+        future = asyncio.run_coroutine_threadsafe(ws.send_str(text), loop)
+        future.add_done_callback(self._on_send_done)
+
+    @staticmethod
+    def _on_send_done(future):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            print("WsReceiver: failed to send:", future.exception())
+
+    def _decode(self, data):
+        # runs in the pool, one codec per worker thread
+        codec = getattr(self._codecs, 'codec', None)
+        if codec is None:
+            codec = self._codecs.codec = ImaAdpcmCodec()
+        return decode_fft_frame(codec, data)
+
+    def _on_text(self, message):
+        if message == '{"type":"rrc_proxy"}':
+            print("WsReceiver: connected through waterfall proxy")
+            self._proxied = True
+            self._link_view = None
+            return
+        # OpenWebRX also sends smeter, dial frequencies, profiles... skip them unparsed
+        if '"config"' not in message:
+            return
+        try:
+            json_msg = json.loads(message)
+        except ValueError:
+            return
+        if json_msg.get('type') != 'config':
+            return
+        val = json_msg.get('value', {})
+        cfg = {}
+        if 'fft_size' in val:
+            self.fft_size = 2048
+            cfg['fft_size'] = self.fft_size
+        if 'samp_rate' in val:
+            self.samp_rate = val['samp_rate']
+            cfg['samp_rate'] = self.samp_rate
+        if 'center_freq' in val:
+            self.center_freq = val['center_freq']
+            cfg['center_freq'] = self.center_freq
+        self._emit_config(cfg)
+
+    def _emit_config(self, cfg):
+        # config messages repeat a lot, the GUI only hears about real changes
+        changed = {k: v for k, v in cfg.items() if self._config.get(k) != v}
+        if changed:
+            self._config.update(changed)
+            self.config_signal.emit(changed)
+
+    async def _negotiate_view(self, ws):
+        """Keeps the proxy sending only the span and columns the widget shows."""
+        while True:
+            if self._proxied and self.view is not None:
+                zoom_factor, center_pos, width = self.view()
+                if self._link_view is None or not view_covers(self._link_view, zoom_factor, center_pos, width):
+                    self._link_view = link_view(zoom_factor, center_pos, width)
+                    zoom, center, columns = self._link_view
+                    await ws.send_str(json.dumps({'type': 'rrc_view', 'params': {
+                        'zoom': zoom, 'center': center, 'columns': columns, 'fps': WATERFALL_FPS, 'zlib': True}}))
+            await asyncio.sleep(self.VIEW_CHECK_INTERVAL)
+
+    async def _report_link(self):
+        while True:
+            received = self.bytes_received
+            await asyncio.sleep(WATERFALL_STATS_REPORT_INTERVAL)
+            rate = (self.bytes_received - received) / WATERFALL_STATS_REPORT_INTERVAL
+            print(f"Waterfall link: {rate / 1000:.1f} kB/s" + (" (proxy)" if self._proxied else ""))
+
+    async def _deliver_rows(self, pending, wakeup):
+        """Awaits decodes in submission order and hands rows to the renderer."""
+        while True:
+            while not pending:
+                wakeup.clear()
+                await wakeup.wait()
             try:
-                if self._ws and hasattr(self._ws, "send"):
-                    cmd = '{"type":"setfrequency","params":{"frequency":' + str(int(frequency + self.samp_rate / 6)) + '}}' # Add offset to not tune exactly on desired freq
-                    self._ws.send(cmd)
-                else:
-                    print("WsReceiver: no active ws to send setfrequency")
+                row = await pending[0]
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                print("WsReceiver: failed to send setfrequency:", e)
-
-    def run(self):
-        HEADER_SIZE = 6
-        COMPRESS_FFT_PAD_N = 14
-
-        def on_message(ws, message):
-            if self._stop_event.is_set():
-                return
-            if isinstance(message, str):
+                # a malformed frame costs one row, not the waterfall
+                print("WsReceiver: decode failed:", e)
+                row = None
+            pending.popleft()
+            if row is not None and not self._stop_event.is_set():
+                self.push_row_signal.emit(row)
+
+    async def _session(self, session):
+        loop = asyncio.get_running_loop()
+        pending = collections.deque()
+        wakeup = asyncio.Event()
+        deliver = asyncio.ensure_future(self._deliver_rows(pending, wakeup))
+        tasks = [deliver]
+        self._proxied = False
+        try:
+            async with session.ws_connect(self.ws_url, heartbeat=20, receive_timeout=None,
+                                          max_msg_size=0) as ws:
+                self._ws = ws
+                tasks.append(asyncio.ensure_future(self._negotiate_view(ws)))
+                tasks.append(asyncio.ensure_future(self._report_link()))
+                await ws.send_str('SERVER DE CLIENT client=openwebrx.js type=receiver')
+                async for msg in ws:
+                    if msg.type == aiohttp.WSMsgType.BINARY:
+                        data = msg.data
+                        self.bytes_received += len(data)
+                        # dispatch on frame type byte, only FFT rows are decoded
+                        decode = self._decoders.get(data[0]) if data else None
+                        if decode is None:
+                            continue
+                        if deliver.done():
+                            # rows would only pile up, reconnect with a fresh session
+                            print("WsReceiver: row delivery stopped:",
+                                  None if deliver.cancelled() else deliver.exception())
+                            break
+                        if len(pending) >= self.MAX_PENDING:
+                            self.dropped += 1
+                            continue
+                        pending.append(loop.run_in_executor(self._pool, decode, data))
+                        wakeup.set()
+                    elif msg.type == aiohttp.WSMsgType.TEXT:
+                        self.bytes_received += len(msg.data)
+                        self._on_text(msg.data)
+                    elif msg.type == aiohttp.WSMsgType.ERROR:
+                        print("WS error:", ws.exception())
+                        break
+                print("WS closed", ws.close_code)
+        finally:
+            self._ws = None
+            for task in tasks:
+                task.cancel()
+
+    async def _main(self):
+        async with aiohttp.ClientSession() as session:
+            while not self._stop_event.is_set():
                 try:
-                    json_msg = json.loads(message)
-                except Exception:
-                    return
-                # if this is a config message -> emit
-                if 'type' in json_msg and 'config' in json_msg['type']:
-                    val = json_msg.get('value', {})
-                    cfg = {}
-                    if 'fft_size' in val:
-                        self.fft_size = val['fft_size']
-                        self.fft_size = 2048
-                        cfg['fft_size'] = self.fft_size
-                    if 'samp_rate' in val:
-                        self.samp_rate = val['samp_rate']
-                        cfg['samp_rate'] = self.samp_rate
-                    if 'center_freq' in val:
-                        self.center_freq = val['center_freq']
-                        # print(self.center_freq)
-                        cfg['center_freq'] = self.center_freq
-                    if cfg:
-                        # emit configuration to UI
-                        self.config_signal.emit(cfg)
-                return
-
-            data = message
-            if len(data) < COMPRESS_FFT_PAD_N:
-                return
-            frame_type = data[0]
-            if frame_type == 1:
-                # if len(payload) == self.fft_size:
-                    # decoding (assume waterfall_i16 -> dB style)
-                self.fft_codec.reset()
-                waterfall_i16 = self.fft_codec.decode(data)
-                waterfall_f32 = waterfall_i16[COMPRESS_FFT_PAD_N:].astype(np.float32) / 100.0
+                    await self._session(session)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print("WsReceiver exception:", e)
                 if not self._stop_event.is_set():
-                    self.push_row_signal.emit(waterfall_f32)
-
-        def on_error(ws, error):
-            if not self._stop_event.is_set():
-                print("WS error:", error)
+                    await asyncio.sleep(1)
 
-        def on_close(ws, code, msg):
-            print("WS closed", code, msg)
-
-        def on_open(ws):
-            ws.send('SERVER DE CLIENT client=openwebrx.js type=receiver')
-
-        while not self._stop_event.is_set():
-            try:
-                self._ws = websocket.WebSocketApp(self.ws_url,
-                                                  on_message=on_message,
-                                                  on_error=on_error,
-                                                  on_close=on_close,
-                                                  on_open=on_open)
-                self._ws.run_forever(ping_interval=20, ping_timeout=5)
-            except Exception as e:
-                print("WsReceiver exception:", e)
-            if not self._stop_event.is_set():
-                import time
-                time.sleep(1)
+    def run(self):
+        self._pool = concurrent.futures.ThreadPoolExecutor(self.DECODE_WORKERS,
+                                                           thread_name_prefix='fft-decode')
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._main_task = self._loop.create_task(self._main())
+        try:
+            self._loop.run_until_complete(self._main_task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._pool.shutdown(wait=False)
+            self._loop.close()
 
 ### --- DX Cluster Client --- ###
 class DxClusterClient(threading.Thread, QtCore.QObject):
@@ -2292,6 +2594,7 @@ class MainWindow(QtWidgets.QMainWindow):
     send_fst_signal = QtCore.pyqtSignal(int)
     pause_polling = QtCore.pyqtSignal(int)
     resume_polling = QtCore.pyqtSignal()
+    poll_now = QtCore.pyqtSignal()
     sound_finished = QtCore.pyqtSignal(object)
     waterfall_freq_update = QtCore.pyqtSignal(int, int, str)
     fast_freq_status = QtCore.pyqtSignal(bool)
@@ -2320,11 +2623,10 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # self.setWindowOpacity(0.8)
 
-        self.ignore_next_data_switch = False
-        self.ignore_next_data_cnt = 3
-
         self.tx_active = 0
+        self._tx_shown = None
         self.tx_sent = 0
+        self.trx_power_status = 0
         self._audio_thread = None
         self._audio_stop_event = None
 
@@ -2988,16 +3290,22 @@ class MainWindow(QtWidgets.QMainWindow):
         self.status = self.statusBar()
         self.status.setVisible(False)
 
+        # Command thread - all rigctld traffic goes through its queue
+        self.commands = CommandDispatcher(HOST, PORT)
+        self.commands.start()
+
         # Read thread
         self.thread = QtCore.QThread()
-        self.worker = PollWorker(HOST, PORT, POLL_MS)
+        self.worker = PollWorker(self.commands, POLL_MS)
         self.worker.moveToThread(self.thread)
 
+        self.param_handlers = self.build_param_handlers()
         self.thread.started.connect(self.worker.start)
         self.worker.result.connect(self.parse_hamlib_response)
         self.worker.status.connect(self.status.showMessage)
         self.pause_polling.connect(self.worker.pause)
         self.resume_polling.connect(self.worker.resume)
+        self.poll_now.connect(self.worker.poll_all)
         self.thread.start()
 
         # Handling sending changes to radio
@@ -3011,8 +3319,11 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # Waterfall
         if WATERFALL_ENABLED:
-            self.ws_thread = WsReceiver(WS_URL, fft_size=DEFAULT_FFT_SIZE)
-            self.ws_thread.push_row_signal.connect(self.waterfall_widget.push_row)
+            wf = self.waterfall_widget
+            self.ws_thread = WsReceiver(WS_URL, fft_size=DEFAULT_FFT_SIZE,
+                                        view=lambda: (wf.zoom_factor, wf.center_pos, wf.width_px))
+            # direct: rows go straight from ws thread to render thread, not via GUI event loop
+            self.ws_thread.push_row_signal.connect(self.waterfall_widget.push_row, QtCore.Qt.DirectConnection)
             self.ws_thread.config_signal.connect(self.waterfall_widget.update_config)
             self.waterfall_widget.samp_rate = self.ws_thread.samp_rate
             self.waterfall_widget.center_freq = self.ws_thread.center_freq
@@ -3035,8 +3346,6 @@ class MainWindow(QtWidgets.QMainWindow):
                 self.dx_cluster.status_changed.connect(self._update_dx_status)
                 self.dx_cluster.start()
 
-        self.client = RigctlClient(HOST, PORT, timeout=TCP_TIMEOUT)
-
         # Load bookmarks
         self._refresh_waterfall_bookmarks()
 
@@ -3044,8 +3353,7 @@ class MainWindow(QtWidgets.QMainWindow):
     def _on_dx_spots_updated(self, spots):
         """Received new DX spots from cluster - update waterfall."""
         if WATERFALL_ENABLED and hasattr(self, 'waterfall_widget'):
-            self.waterfall_widget.dx_spots = spots
-            self.waterfall_widget.update()
+            self.waterfall_widget.set_dx_spots(spots)
 
     @QtCore.pyqtSlot(str)
     def _update_dx_status(self, status):
@@ -3150,9 +3458,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def parse_powerstat(self, val):
         if val is not None:
-            val = val.split('get_powerstat:\nPower Status: ')[1].split('\n')[0]
-            val = int(val)
-            self.client.trx_power_status = val
+            self.trx_power_status = val
             if val:
                 self.power_btn.setText("OFF")
                 self.power_btn.setStyleSheet("border-radius: 14px; background-color: #fa6060; border: 1px solid black;")
@@ -3161,9 +3467,6 @@ class MainWindow(QtWidgets.QMainWindow):
                 self.power_btn.setText("ON")
                 self.power_btn.setStyleSheet("border-radius: 14px; background-color: #60fa60; border: 1px solid black;")
 
-    def parse_freq(self, val):
-        pass
-
     def parse_rf_power(self, val):
         if val is not None:
             val = float(val)
@@ -3182,42 +3485,42 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def parse_tx(self, val):
         if val is not None:
-            ptt = val.split('get_ptt:\nPTT: ')[1].split('\n')[0]
-            val = int(ptt)
+            self.tx_active = 1 if val else 0
+            # Watchdog: radio still reports TX but we already sent T 0
+            if val and self.tx_sent == 0:
+                self._tx_watchdog_cnt = getattr(self, '_tx_watchdog_cnt', 0) + 1
+                if self._tx_watchdog_cnt >= 2:
+                    self._tx_watchdog_cnt = 0
+                    QTimer.singleShot(0, self.disable_tx)
+            else:
+                self._tx_watchdog_cnt = 0
+
+            # PTT comes every poll (watchdog), widgets only follow changes
+            if self.tx_active == self._tx_shown:
+                return
+            self._tx_shown = self.tx_active
             if val:
-                self.tx_active = 1
                 self.centralWidget().setStyleSheet("background-color: red;")
                 temp = self.windowTitle()
                 if not "[TX]" in temp:
                     self.setWindowTitle("[TX] " + temp)
                 self.replace_s_meter_when_tx(1)
-                # Watchdog: radio still reports TX but we already sent T 0
-                if self.tx_sent == 0:
-                    self._tx_watchdog_cnt = getattr(self, '_tx_watchdog_cnt', 0) + 1
-                    if self._tx_watchdog_cnt >= 2:
-                        self._tx_watchdog_cnt = 0
-                        QTimer.singleShot(0, self.disable_tx)
-                else:
-                    self._tx_watchdog_cnt = 0
             else:
-                self.tx_active = 0
-                self._tx_watchdog_cnt = 0
                 self.setWindowTitle(self.windowTitle().replace('[TX] ', ''))
                 self.centralWidget().setStyleSheet("")
                 self.replace_s_meter_when_tx(0)
     
     def parse_preamp(self, val):
         if val is not None:
-            if val == '10': # TODO: magic number
+            if val == 10: # TODO: magic number
                 self.ipo_btn.setStyleSheet("background-color: " + ACTIVE_COLOR + "; text-align: center; border-radius: 4px; border: 1px solid black;")
                 self.ipo_val = 1
             else:
                 self.ipo_btn.setStyleSheet("background-color: " + NOT_ACTIVE_COLOR + "; text-align: center; border-radius: 4px; border: 1px solid black;")
                 self.ipo_val = 0
 
-    def parse_vfo(self, val):
-        if val is not None:
-            vfo = val.split('get_vfo:\nVFO: ')[1].split('\n')[0]
+    def parse_vfo(self, vfo):
+        if vfo is not None:
             if vfo == 'VFOA':
                 self.active_vfo = 0
             elif vfo == 'VFOB':
@@ -3286,92 +3589,25 @@ class MainWindow(QtWidgets.QMainWindow):
                 self.att_btn.setStyleSheet("background-color: " + NOT_ACTIVE_COLOR + "; text-align: center; border-radius: 4px; border: 1px solid black;")
                 self.att_val = 0
 
-    def parse_raw(self, val):
-        param = val.split('send_cmd: ')[1].split(';')[0]
-        param_value = val.split('Reply: ' + param)[1].split(';')[0]
-
-        parser_name = self.find_parser_for_raw(param)
-        if parser_name is None:
-            print(f"No parser available for raw({param})")
-            return
-
-        # get method function from self
-        parser_fn = getattr(self, parser_name, None)
-        if parser_fn is None:
-            print(f"Parser function {parser_name} not found!")
-            return
-
-        # call dedicated parser
-        parser_fn(param_value)
-
-    def find_parser_for_raw(self, param):
-        for item in cyclicRefreshParams:
-            if item['cmd'].startswith('w') and param in item['cmd'].split('w')[1]:
-                return item['parser']
-        return None
-    
-    def find_parser_for_get_level(self, param):
-        for item in cyclicRefreshParams:
-            if item['cmd'].startswith('l ') and item['cmd'].split(' ')[1] == param:
-                return item['parser']
-        return None
-    
-    def find_parser_for_get_func(self, param):
+    def build_param_handlers(self):
+        """poll cmd -> parser method, built once from cyclicRefreshParams"""
+        handlers = {}
         for item in cyclicRefreshParams:
-            if item['cmd'].startswith('u ') and item['cmd'].split(' ')[1] == param:
-                return item['parser']
-        return None
-
-    def parse_get_level(self, val):
-        param = val.split(': ')[1].split('\n')[0]
-        param_value = val.split(param + '\n')[1].split('\n')[0]
-
-        parser_name = self.find_parser_for_get_level(param)
-        if parser_name is None:
-            print(f"No parser available for get_level({param})")
-            return
-
-        # get method function from self
-        parser_fn = getattr(self, parser_name, None)
-        if parser_fn is None:
-            print(f"Parser function {parser_name} not found!")
-            return
-
-        # call dedicated parser
-        parser_fn(param_value)
-
-    def parse_get_func(self, val):
-        param = val.split(': ')[1].split('\n')[0]
-        param_value = val.split(param + '\n')[1].split('\n')[0]
-
-        parser_name = self.find_parser_for_get_func(param)
-        if parser_name is None:
-            print(f"No parser available for get_func({param})")
-            return
-
-        # get method function from self
-        parser_fn = getattr(self, parser_name, None)
-        if parser_fn is None:
-            print(f"Parser function {parser_name} not found!")
-            return
-
-        # call dedicated parser
-        # print(param + '=' + param_value)
-        parser_fn(param_value)
+            # get method function from self
+            parser_fn = getattr(self, item['parser'], None)
+            if parser_fn is None:
+                print(f"Parser function {item['parser']} not found!")
+                continue
+            handlers[item['cmd']] = parser_fn
+        return handlers
 
     def parse_get_vfo_info(self, val):
-        vfo = val.split('get_vfo_info: ')[1].split('\n')[0]
-        freq = int(val.split('Freq: ')[1].split('\n')[0])
+        vfo, freq, mode, width = val
 
         # ??? Some Hamlib error
         if freq < 0:
             return
 
-        mode = val.split('Mode: ')[1].split('\n')[0]
-        width = int(val.split('Width: ')[1].split('\n')[0])
-        split = val.split('Split: ')[1].split('\n')[0]
-        satmode = val.split('SatMode: ')[1].split('\n')[0]
-
         update_needed = False
 
         if vfo == 'VFOA':
@@ -3429,8 +3665,7 @@ class MainWindow(QtWidgets.QMainWindow):
             # print('parse_get_vfo_info')
             self.waterfall_freq_update.emit(self.current_freq, self.filter_width, self.mode)
 
-    def parse_get_freq(self, val):
-        freq = int(val.split('Frequency: ')[1].split('\n')[0])
+    def parse_get_freq(self, freq):
         updated_needed = True
 
         if freq != self.current_freq:
@@ -3451,8 +3686,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.waterfall_freq_update.emit(freq, self.filter_width, self.mode)
 
     def parse_get_mode(self, val):
-        mode = val.split('get_mode:\nMode: ')[1].split('\n')[0]
-        width = int(val.split('\nPassband: ')[1].split('\n')[0])
+        mode, width = val
         updated_needed = False
 
         if mode != self.mode:
@@ -3491,35 +3725,15 @@ class MainWindow(QtWidgets.QMainWindow):
         # print(key)
         # print(val)
 
-        if self.ignore_next_data_switch:
-            if self.ignore_next_data_cnt:
-                self.ignore_next_data_cnt = self.ignore_next_data_cnt - 1
-                return
-            else:
-                self.ignore_next_data_switch = False
-
-        for resp in val:
-            if 'RPRT 0' in resp:
-                if 'get_level' in resp:
-                    self.parse_get_level(resp)
-                elif 'get_func' in resp:
-                    self.parse_get_func(resp)
-                elif 'get_freq' in resp:
-                    self.parse_get_freq(resp)
-                elif 'get_mode' in resp:
-                    self.parse_get_mode(resp)
-                elif 'get_vfo_info' in resp:
-                    self.parse_get_vfo_info(resp)
-                elif 'get_vfo' in resp:
-                    self.parse_vfo(resp)
-                elif 'get_ptt' in resp:
-                    self.parse_tx(resp)
-                elif 'send_cmd' in resp:
-                    self.parse_raw(resp)
-                elif 'get_powerstat' in resp:
-                    self.parse_powerstat(resp)
-            else:
-                print('Error in response: RPRT ' + resp.split('RPRT ')[0])
+        if time.monotonic() < self.worker.ignore_data_until:
+            # dropped here, worker reports everything again after the window
+            self.worker.state_stale = True
+            return
+
+        for cmd, value in val.items():
+            handler = self.param_handlers.get(cmd)
+            if handler is not None:
+                handler(value)
 
     def update_mode_display(self):
         for mode, label in self.mode_labels.items():
@@ -3565,8 +3779,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.zoom_slider.blockSignals(False)
 
     def ignore_next_data(self, cnt=2):
-        self.ignore_next_data_switch = True
-        self.ignore_next_data_cnt = cnt
+        # polls are no longer fixed-rate, keep the old window of cnt poll periods
+        self.worker.ignore_data_until = time.monotonic() + cnt * POLL_MS / 1000.0
 
     def shift_slider_move(self, value):
         center = 0
@@ -3576,13 +3790,13 @@ class MainWindow(QtWidgets.QMainWindow):
 
         cmd = f"L IF " + str(value)
         self.ignore_next_data()
-        self.client.send(cmd)
+        self.commands.submit(cmd, coalesce=True)
         self.worker.reset_one_time.emit("l IF")
 
     def notch_slider_move(self, value):
         cmd = f"L NOTCHF " + str(value)
         self.ignore_next_data()
-        self.client.send(cmd)
+        self.commands.submit(cmd, coalesce=True)
         self.worker.reset_one_time.emit("l NOTCHF")
 
     def notch_checked(self, value):
@@ -3591,23 +3805,23 @@ class MainWindow(QtWidgets.QMainWindow):
         else:
             cmd = f"U MN 0"
         self.ignore_next_data()
-        self.client.send(cmd)
+        self.commands.submit(cmd)
         self.worker.reset_one_time.emit("u MN")
 
     def nr_slider_move(self, value):
         cmd = f"L NR " + str(value / 10)
         self.ignore_next_data()
-        self.client.send(cmd)
+        self.commands.submit(cmd, coalesce=True)
 
     def nr_checked(self, value):
         if value:
             cmd = f"U NR 1"
-            self.client.send(cmd)
+            self.commands.submit(cmd)
             cmd = f"L NR " + str(self.nr_slider.value() / 10)
         else:
             cmd = f"U NR 0"
         self.ignore_next_data()
-        self.client.send(cmd)
+        self.commands.submit(cmd)
         self.worker.reset_one_time.emit("u NR")
 
     def set_frequency_label(self, label, freq):
@@ -3686,13 +3900,13 @@ class MainWindow(QtWidgets.QMainWindow):
         return f"{swr:.1f}"
 
     def power_btn_clicked(self):
-        if self.client.trx_power_status:
+        if self.trx_power_status:
             cmd = f"\\set_powerstat 0"
         else:
             cmd = f"\\set_powerstat 1"
             self.power_btn.setStyleSheet("border-radius: 14px; background-color: orange; border: 1px solid black;")
             self.pause_polling.emit(3000)
-        self.client.send(cmd)
+        self.commands.submit(cmd)
         self.worker.reset_one_time.emit("\\get_powerstat")
 
     def att_btn_clicked(self):
@@ -3700,7 +3914,7 @@ class MainWindow(QtWidgets.QMainWindow):
             cmd = f"L ATT 0"
         else:
             cmd = f"L ATT 20"
-        self.client.send(cmd)
+        self.commands.submit(cmd)
         self.worker.reset_one_time.emit("l ATT")
 
     def ipo_btn_clicked(self):
@@ -3708,7 +3922,7 @@ class MainWindow(QtWidgets.QMainWindow):
             cmd = f"L PREAMP 10"
         else:
             cmd = f"L PREAMP 0"
-        self.client.send(cmd)
+        self.commands.submit(cmd)
         self.worker.reset_one_time.emit("l PREAMP")
 
     def ipo_att_btn_clicked(self):
@@ -3716,32 +3930,32 @@ class MainWindow(QtWidgets.QMainWindow):
             cmd = f"wRA00;"
         else:
             cmd = f"wRA01;"
-        self.client.send(cmd)
+        self.commands.submit(cmd)
 
     def band_down_btn_clicked(self):
         cmd = f"G BAND_DOWN"
         self.ignore_next_data(4)
-        self.client.send(cmd)
+        self.commands.submit(cmd)
         self.waterfall_widget.initial_zoom_set = False
         QTimer.singleShot(2500, lambda: self.worker.reset_one_time.emit("all"))
 
     def band_up_btn_clicked(self):
         cmd = f"G BAND_UP"
         self.ignore_next_data(4)
-        self.client.send(cmd)
+        self.commands.submit(cmd)
         self.waterfall_widget.initial_zoom_set = False
         QTimer.singleShot(2500, lambda: self.worker.reset_one_time.emit("all"))
 
     def a_eq_b_btn_clicked(self):
         cmd = f"G CPY"
-        self.client.send(cmd)
+        self.commands.submit(cmd)
         self.worker.reset_one_time.emit("all")
 
     def vfo_switch_btn_clicked(self):
         cmd = f"G XCHG"
         # self.ignore_next_data()
         print('VFO SWITCH')
-        self.client.send(cmd)
+        self.commands.submit(cmd)
         self.worker.reset_one_time.emit("all")
         self.waterfall_widget.initial_zoom_set = False
 
@@ -3750,7 +3964,7 @@ class MainWindow(QtWidgets.QMainWindow):
             cmd = f"U NB 0"
         else:
             cmd = f"U NB 1"
-        self.client.send(cmd)
+        self.commands.submit(cmd)
         self.worker.reset_one_time.emit("u NB")
 
     def monitor_btn_clicked(self):
@@ -3758,7 +3972,7 @@ class MainWindow(QtWidgets.QMainWindow):
             cmd = f"U MON 0"
         else:
             cmd = f"U MON 1"
-        self.client.send(cmd)
+        self.commands.submit(cmd)
         self.worker.reset_one_time.emit("u MON")
 
     def split_btn_clicked(self):
@@ -3770,7 +3984,7 @@ class MainWindow(QtWidgets.QMainWindow):
             cmd = f"S 0 VFOA"
             self.split_active = 0
             self.split_btn.setStyleSheet("border-radius: 14px; background-color: lightgray; border: 1px solid black;")
-        self.client.send(cmd)
+        self.commands.submit(cmd)
 
     def mode_down_btn_clicked(self):
         current_mode_index = findIndexOfString(self.mode, radioModes)
@@ -3781,7 +3995,7 @@ class MainWindow(QtWidgets.QMainWindow):
             new_mode = current_mode_index + 1
 
         cmd = f"M " + radioModes[new_mode] + " 0"
-        self.client.send(cmd)
+        self.commands.submit(cmd)
 
     def mode_up_btn_clicked(self):
         current_mode_index = findIndexOfString(self.mode, radioModes)
@@ -3792,7 +4006,7 @@ class MainWindow(QtWidgets.QMainWindow):
             new_mode = current_mode_index - 1
 
         cmd = f"M " + radioModes[new_mode] + " 0"
-        self.client.send(cmd)
+        self.commands.submit(cmd)
 
     def radio_fast_freq_clicked(self):
         self.fast_freq_status.emit(self.radio_fast_freq.isChecked())
@@ -3844,7 +4058,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.set_frequency_label(self.freq_display_sub, freq)
         self.waterfall_freq_update.emit(freq, self.filter_width, self.mode)
         self.ignore_next_data()
-        self.client.send(cmd)
+        self.commands.submit(cmd, coalesce=True)
 
     def volume_change(self, new_pos: int):
         if self.last_volume_pos == 0:
@@ -3867,7 +4081,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.volume_group.setTitle(f'Vol[{self.current_vol}]')
             cmd = f"L AF {self.current_vol/100:0.3f}"
             self.ignore_next_data()
-            self.client.send(cmd)
+            self.commands.submit(cmd, coalesce=True)
 
     def squelch_change(self, new_pos: int):
         if self.last_squelch_pos == 0:
@@ -3888,7 +4102,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.squelch_group.setTitle(f'Sql[{self.current_sql}]')
             cmd = f"L SQL {self.current_sql/100:0.3f}"
             self.ignore_next_data()
-            self.client.send(cmd)
+            self.commands.submit(cmd, coalesce=True)
 
     def set_tuner(self):
         if self.tuner_status_val:
@@ -3896,25 +4110,20 @@ class MainWindow(QtWidgets.QMainWindow):
         else:
             cmd = f"U TUNER 1"
         # print(cmd)
-        self.client.send(cmd)
+        self.commands.submit(cmd)
         self.worker.reset_one_time.emit("u TUNER")
 
     def tuning_start(self):
         # cmd = f"wAC002;"
         cmd = f"U TUNER 2"
         # print(cmd)
-        self.client.send(cmd)
+        self.commands.submit(cmd)
         # self.worker.pause(1000)
 
     def disable_tx(self):
         cmd = f"T 0"
-        if not self.client.connected or self.client.s is None:
-            self.client = RigctlClient(HOST, PORT)
-        resp = self.client.send(cmd)
-        if resp is None:
-            # Reconnect and retry once
-            self.client = RigctlClient(HOST, PORT)
-            self.client.send(cmd)
+        # Dispatcher reconnects and retries PTT commands once
+        self.commands.submit(cmd, PRIORITY_PTT)
         self.tx_sent = 0
 
     def replace_s_meter_when_tx(self, tx_state):
@@ -3931,13 +4140,15 @@ class MainWindow(QtWidgets.QMainWindow):
     @QtCore.pyqtSlot(int)
     def tx_action(self, val: int):
         temp = self.windowTitle()
+        # title/background changed here, parse_tx redraws on next PTT answer
+        self._tx_shown = None
 
         if val:
             cmd = f"T 1"
-            self.client.send(cmd)
+            self.commands.submit(cmd, PRIORITY_PTT)
             self.setWindowTitle("[TX] " + temp)
             self.centralWidget().setStyleSheet("background-color: orange;")
-            self.worker.poll_all()
+            self.poll_now.emit()
             self.tx_sent = 1
         else:
             self.setWindowTitle(self.windowTitle().replace('[TX] ', ''))
@@ -3969,7 +4180,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
         cmd = f"M " + self.mode + " " + str(self.filter_width)
         self.ignore_next_data()
-        self.client.send(cmd)
+        self.commands.submit(cmd)
 
     def antenna_switch_changed(self):
         if not self.tx_active:
@@ -3987,7 +4198,7 @@ class MainWindow(QtWidgets.QMainWindow):
         if dialog.exec_():
             value = dialog.get_value()
             cmd = f"L RFPOWER {value/100:0.2f}"
-            self.client.send(cmd)
+            self.commands.submit(cmd)
 
     def open_frequency_dialog(self):
         dlg = FrequencyDialog(self, value=self.current_freq)
@@ -4038,8 +4249,7 @@ class MainWindow(QtWidgets.QMainWindow):
     def _refresh_waterfall_bookmarks(self):
         """Push current bookmarks to waterfall widget."""
         if WATERFALL_ENABLED and hasattr(self, 'waterfall_widget'):
-            self.waterfall_widget.bookmarks = self._load_bookmarks()
-            self.waterfall_widget.update()
+            self.waterfall_widget.set_bookmarks(self._load_bookmarks())
 
     def save_bookmark(self):
         """Save current frequency and mode as bookmark."""
@@ -4072,7 +4282,7 @@ class MainWindow(QtWidgets.QMainWindow):
                 mode = sel.get('mode', self.mode)
                 freq = sel['freq_hz']
                 cmd = f"M {mode} 0"
-                self.client.send(cmd)
+                self.commands.submit(cmd)
                 self.frequency_change(freq)
         # Save in case bookmarks were deleted
         self._save_bookmarks(dlg.bookmarks)
@@ -4142,6 +4352,10 @@ class MainWindow(QtWidgets.QMainWindow):
         MOUSE_WHEEL_FAST_FREQ_STEP = config.get('mouse_wheel_fast_freq_step')
         DEFAULT_NOISE_REDUCTION = config.get('default_noise_reduction')
         
+        if WATERFALL_ENABLED and hasattr(self, 'waterfall_widget'):
+            self.waterfall_widget.set_reduce_mode(config.get('waterfall_reduce_mode'))
+            self.waterfall_widget.set_target_fps(config.get('waterfall_fps'))
+        
         # Zaktualizuj nazwy anten w UI
         if hasattr(self, 'antenna_1'):
             self.antenna_1.setText(ANTENNA_1_NAME)
@@ -4172,11 +4386,12 @@ class MainWindow(QtWidgets.QMainWindow):
     def swr_btn_pressed(self):
         self.current_power = self.tx_power_btn.text().replace('W', '')
         self.current_mode = self.mode
+        # Same priority as PTT so they are not overtaken by T 1
         cmd = f"M CW 0"
-        self.client.send(cmd)
+        self.commands.submit(cmd, PRIORITY_PTT)
 
         cmd = f"L RFPOWER {10/100:0.2f}"
-        self.client.send(cmd)
+        self.commands.submit(cmd, PRIORITY_PTT)
         
         self.send_tx_signal.emit(1)
         self.swr_btn.setStyleSheet("background-color: " + BUTTON_COLOR + "; text-align: center; border-radius: 4px; border: 1px solid black;")
@@ -4196,8 +4411,11 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def miceq_btn_btn_pressed(self):
         cmd = "EX037"
-        current_eq = self.client.send('w' + cmd + ';')
-        if cmd in current_eq:
+        self.commands.submit('w' + cmd + ';', on_result=self._open_eq_dialog)
+
+    def _open_eq_dialog(self, current_eq):
+        cmd = "EX037"
+        if current_eq and cmd in current_eq:
             current_eq = current_eq.replace(cmd, '')
             current_eq = current_eq.replace(';', '')
             current_eq = current_eq.replace('\0', '')
@@ -4207,22 +4425,26 @@ class MainWindow(QtWidgets.QMainWindow):
             if dlg.exec_():
                 eq_value = dlg.selected_eq
                 cmd = 'w' + cmd + str(eq_value) + ';'
-                self.client.send(cmd)
-
-    def _read_ex_value(self, ex_cmd):
-        """Read an EX parameter value. Returns integer or None on failure."""
-        resp = self.client.send('w' + ex_cmd + ';')
-        if resp and ex_cmd in resp:
-            val = resp.replace(ex_cmd, '').replace(';', '').replace('\0', '').replace('RPRT 0', '').replace('\n', '').strip()
-            try:
-                return int(val)
-            except ValueError:
-                pass
-        return None
+                self.commands.submit(cmd)
+
+    def _read_ex_value(self, ex_cmd, on_value):
+        """Read an EX parameter value. Calls on_value with integer or None on failure."""
+        def on_result(resp):
+            value = None
+            if resp and ex_cmd in resp:
+                val = resp.replace(ex_cmd, '').replace(';', '').replace('\0', '').replace('RPRT 0', '').replace('\n', '').strip()
+                try:
+                    value = int(val)
+                except ValueError:
+                    pass
+            on_value(value)
+        self.commands.submit('w' + ex_cmd + ';', on_result=on_result)
 
     def cw_btn_pressed(self):
+        self.commands.submit('wEX020;EX022;', on_result=self._open_cw_dialog)
+
+    def _open_cw_dialog(self, resp):
         import re as _re
-        resp = self.client.send('wEX020;EX022;')
         if not resp:
             return
         m_pitch = _re.search(r'EX020(\d+)', resp)
@@ -4236,26 +4458,26 @@ class MainWindow(QtWidgets.QMainWindow):
             return
         dlg = CwDialog(self, pitch=pitch, sidetone=sidetone)
         if dlg.exec_():
-            self.client.send(f'wEX020{dlg.selected_pitch:02d};')
-            self.client.send(f'wEX022{dlg.selected_sidetone:03d};')
+            self.commands.submit(f'wEX020{dlg.selected_pitch:02d};')
+            self.commands.submit(f'wEX022{dlg.selected_sidetone:03d};')
 
     def stop_swr_check(self):
         cmd = f"M " + self.current_mode + " 0"
-        self.client.send(cmd)
+        self.commands.submit(cmd)
 
         cmd = f"L RFPOWER {int(self.current_power)/100:0.2f}"
-        self.client.send(cmd)
+        self.commands.submit(cmd)
 
     def play_sound(self, path, widget):
         if self.tx_active or self.tx_sent:
             self.send_tx_signal.emit(0)
             cmd = f"U MON 0"
-            self.client.send(cmd)
+            self.commands.submit(cmd)
             stopSound()
             widget.setStyleSheet("background-color: " + ACTIVE_COLOR + "; text-align: center; border-radius: 4px; border: 1px solid black;")
         else:
             cmd = f"U MON 1"
-            self.client.send(cmd)
+            self.commands.submit(cmd, PRIORITY_PTT)
             self.send_tx_signal.emit(1)
             widget.setStyleSheet("background-color: " + BUTTON_COLOR + "; text-align: center; border-radius: 4px; border: 1px solid black;")
         
@@ -4272,7 +4494,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def disable_monitor(self):
         cmd = f"U MON 0"
-        self.client.send(cmd)
+        self.commands.submit(cmd)
 
     def play1_btn_pressed(self):
         self.play_sound(REC1_PATH, self.play1_btn)
@@ -4286,6 +4508,7 @@ class MainWindow(QtWidgets.QMainWindow):
     def closeEvent(self, event):
         if WATERFALL_ENABLED and hasattr(self, 'ws_thread'):
             self.ws_thread.stop()
+            self.waterfall_widget.stop()
         if hasattr(self, 'dx_cluster'):
             self.dx_cluster.stop()
         if self._audio_stop_event is not None:
@@ -4294,6 +4517,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self._audio_thread.join(timeout=3)
         self.thread.quit()
         self.thread.wait(1000)
+        self.commands.stop()
         super().closeEvent(event)
 
     def switch_antenna(self, cmd, host=HOST, port=ANTENNA_SWITCH_PORT):
@@ -0,0 +1,623 @@
+#!/usr/bin/env python3
+"""
+Hamlib rigctld TCP client.
+
+Commands prefixed with '+' use the extended response protocol: every command
+answers with a record terminated by an 'RPRT n' line. The client counts the
+records it is waiting for and returns as soon as the last one has arrived,
+instead of waiting for the socket timeout. Several batches can be written at
+once (pipelined) and are read back in order. Plain commands are sent as '+'
+commands as well, so a late answer is always one whole record and can never
+be taken for the answer to a later command.
+
+CoalescingCommandQueue sits in front of the client: rapid writes to the same
+target (frequency, AF, SQL...) are merged so only the latest value is sent,
+at a rate the CAT link can sustain. PollScheduler picks which parameters are
+read on each poll tick. tokenize_record() turns an extended answer into a
+RigRecord, RigState keeps the typed values of the polled parameters and
+reports only the ones which changed.
+
+Usage:
+    python rigctl.py                   # parse benchmark over a recorded poll
+    python rigctl.py --polls 20000
+"""
+
+import functools
+import heapq
+import itertools
+import re
+import socket
+import threading
+import time
+from collections import deque, namedtuple
+from types import MappingProxyType
+
+TCP_TIMEOUT = 0.1
+# Upper limit for a complete extended answer - only reached when the rig does not respond
+RESPONSE_TIMEOUT = 1.0
+
+_RPRT_RE = re.compile(rb'RPRT [+-]?\d+\n')
+_EXTENDED_CMD_RE = re.compile(r'(?:^|\s)\+')
+
+
+def count_extended_cmds(line: str) -> int:
+    """Number of '+' prefixed commands in a line = number of RPRT records expected."""
+    return len(_EXTENDED_CMD_RE.findall(line))
+
+
+# kind    - 'get_level', 'get_func', 'get_freq', 'send_cmd'...
+# arg     - level/func name, VFO of get_vfo_info, raw command; None when absent
+# value   - first bare line (get_level/get_func) or raw reply value, else None
+# fields  - 'Key: value' lines, e.g. {'Frequency': '14074000'}, read only mapping
+# status  - RPRT code, None when missing
+RigRecord = namedtuple('RigRecord', 'kind arg value fields status')
+
+
+_NO_FIELDS = MappingProxyType({})
+_new_record = tuple.__new__
+
+
+# Most poll answers repeat unchanged, those are served from the cache.
+# RigRecord is shared between callers, hence the read only fields.
+@functools.lru_cache(maxsize=512)
+def tokenize_record(record: str) -> RigRecord:
+    """Single pass over one extended response record."""
+    lines = record.split('\n')
+    n = len(lines) if lines[-1] else len(lines) - 1
+    kind, _, arg = lines[0].partition(':')
+    arg = arg.strip() or None
+
+    status = None
+    last = lines[n - 1]
+    if n > 1 and last[:5] == 'RPRT ':
+        if last == 'RPRT 0':            # nearly every answer, no int() needed
+            status = 0
+            n -= 1
+        else:
+            try:
+                status = int(last[5:])
+                n -= 1
+            except ValueError:
+                pass
+
+    value = None
+    fields = _NO_FIELDS
+    if n > 1:
+        key, sep, val = lines[1].partition(': ')
+        if not sep:
+            value = lines[1]
+        elif n == 2:
+            fields = MappingProxyType({key: val})
+        else:
+            parsed = {}
+            for line in lines[1:n]:
+                key, sep, val = line.partition(': ')
+                if sep:
+                    parsed[key] = val
+            fields = MappingProxyType(parsed)
+
+    if kind == 'send_cmd' and arg:
+        # 'send_cmd: RA0;' / 'Reply: RA01;' -> arg 'RA0', value '1'
+        arg = arg.split(';')[0]
+        reply = fields.get('Reply', '')
+        value = reply.split(arg, 1)[1].split(';')[0] if arg in reply else None
+    # tuple.__new__ skips the namedtuple's Python level __new__
+    return _new_record(RigRecord, (kind, arg, value, fields, status))
+
+
+class RigctlClient:
+    def __init__(self, host: str, port: int, timeout: float = TCP_TIMEOUT,
+                 response_timeout: float = RESPONSE_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.response_timeout = response_timeout
+        self.trx_power_status = 0
+        self.s = None
+        self._buf = b""
+        # records still owed by rigctld for batches that timed out
+        self._stale_records = 0
+        try:
+            self.s = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            self.connected = 1
+        except:
+            self.connected = 0
+
+    def send(self, cmd: str):
+        """Sends one command line, returns the answer as str or None.
+
+        '+' command lines return their records joined. A plain command gets
+        the answer it would have in the default protocol ('RPRT 0' for set
+        commands, bare values for get commands) but travels as a '+' command.
+        """
+        if count_extended_cmds(cmd):
+            records = self.send_records(cmd)
+            if not records:
+                return None
+            return "".join(records).strip() or None
+        records = self.send_records("+" + cmd.strip())
+        if not records:
+            return None
+        return plain_reply(records[0]) or None
+
+    def send_records(self, line: str):
+        """Sends one line of '+' commands, returns list of records (one per command) or None."""
+        result = self.send_batches([line])
+        return result[0] if result else None
+
+    def send_batches(self, lines):
+        """Pipelines several command lines and returns a list of record lists, one per line.
+
+        All lines are written before reading, so rigctld can work on the next batch
+        while the previous answer is still on the wire. Returns None on connection
+        problems or when the answer did not complete within response_timeout.
+        """
+        if self.s is None:
+            return None
+        lines = [l if l.endswith("\n") else l + "\n" for l in lines]
+        expected = deque(count_extended_cmds(l) for l in lines)
+        try:
+            self.s.sendall("".join(lines).encode("ascii", errors="ignore"))
+            deadline = time.monotonic() + self.response_timeout
+
+            # drop answers of batches which timed out earlier
+            while self._stale_records:
+                if self._read_record(deadline) is None:
+                    self._stale_records += sum(expected)
+                    return None
+                self._stale_records -= 1
+
+            result = []
+            while expected:
+                records = []
+                while len(records) < expected[0]:
+                    record = self._read_record(deadline)
+                    if record is None:
+                        self._stale_records = sum(expected) - len(records)
+                        return None
+                    records.append(record)
+                expected.popleft()
+                result.append(records)
+            return result
+        except (OSError, ConnectionError):
+            self._disconnect()
+            return None
+
+    def _read_record(self, deadline):
+        """Returns next record ending with 'RPRT n' as str, None on timeout."""
+        while True:
+            m = _RPRT_RE.search(self._buf)
+            if m:
+                record = self._buf[:m.end()]
+                self._buf = self._buf[m.end():]
+                return record.decode("utf-8", errors="ignore").replace("\0", "")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self.s.settimeout(remaining)
+            try:
+                data = self.s.recv(4096)
+            except socket.timeout:
+                return None
+            if not data:
+                raise ConnectionError("rigctld closed connection")
+            self._buf += data
+
+    def _disconnect(self):
+        self.connected = 0
+        try:
+            if self.s is not None:
+                self.s.close()
+        except OSError:
+            pass
+        self.s = None
+        self._buf = b""
+        self._stale_records = 0
+
+
+def plain_reply(record: str) -> str:
+    """Extended record -> default protocol answer: header dropped, 'Key: value' -> value."""
+    lines = record.strip().split('\n')[1:]
+    return '\n'.join(line.partition(': ')[2] if ': ' in line else line for line in lines)
+
+
+def command_target(cmd: str) -> str:
+    """What a set-command writes to: 'L AF 0.300' -> 'L AF', 'F 14074000' -> 'F'."""
+    parts = cmd.split()
+    return " ".join(parts[:-1]) if len(parts) > 1 else cmd.strip()
+
+
+class QueuedCommand:
+    __slots__ = ('priority', 'seq', 'cmd', 'callback', 'on_result', 'key')
+
+    def __init__(self, priority, seq, cmd, callback=None, on_result=None, key=None):
+        self.priority = priority
+        self.seq = seq
+        self.cmd = cmd
+        self.callback = callback
+        self.on_result = on_result
+        self.key = key
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class CoalescingCommandQueue:
+    """Thread safe priority queue of rigctld commands.
+
+    Commands put with coalesce=True replace a still pending command writing
+    the same target (last value wins, queue position of the first one is kept)
+    and are rate limited per target to min_intervals[target] seconds
+    (default_interval when not listed). Merged writes are counted in elided.
+    """
+
+    def __init__(self, min_intervals=None, default_interval=0.0):
+        self.min_intervals = dict(min_intervals or {})
+        self.default_interval = default_interval
+        self.elided = {}
+        self._cond = threading.Condition()
+        self._heap = []
+        self._pending = {}      # target -> QueuedCommand
+        self._last_sent = {}    # target -> time.monotonic()
+        self._seq = itertools.count()
+        self._closed = False
+
+    def put(self, cmd, priority, callback=None, on_result=None, coalesce=False):
+        with self._cond:
+            key = command_target(cmd) if coalesce else None
+            pending = self._pending.get(key) if key else None
+            if pending is not None:
+                pending.cmd = cmd
+                pending.callback = callback
+                pending.on_result = on_result
+                self.elided[key] = self.elided.get(key, 0) + 1
+                return
+            item = QueuedCommand(priority, next(self._seq), cmd, callback, on_result, key)
+            if key:
+                self._pending[key] = item
+            heapq.heappush(self._heap, item)
+            self._cond.notify()
+
+    def get(self):
+        """Blocks until a command may be sent, returns QueuedCommand or None when closed."""
+        with self._cond:
+            while not self._closed:
+                wait = None
+                now = time.monotonic()
+                # rate limited targets are popped, set aside and pushed back;
+                # at most one per target, coalescing updates entries in place
+                deferred = []
+                item = None
+                while self._heap:
+                    candidate = heapq.heappop(self._heap)
+                    ready_at = self._ready_at(candidate.key)
+                    if ready_at <= now:
+                        item = candidate
+                        break
+                    deferred.append(candidate)
+                    if wait is None or ready_at - now < wait:
+                        wait = ready_at - now
+                for d in deferred:
+                    heapq.heappush(self._heap, d)
+                if item is not None:
+                    if item.key:
+                        del self._pending[item.key]
+                        self._last_sent[item.key] = now
+                    return item
+                self._cond.wait(wait)
+            return None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def elided_total(self):
+        with self._cond:
+            return sum(self.elided.values())
+
+    def _ready_at(self, key):
+        if not key or key not in self._last_sent:
+            return 0.0
+        return self._last_sent[key] + self.min_intervals.get(key, self.default_interval)
+
+
+class PollScheduler:
+    """Decides which cyclic parameters are polled on each tick.
+
+    Every parameter belongs to a tier ('meter', 'level', 'slow') giving its base
+    period and priority. Parameters which keep returning the same answer are
+    polled less often (up to max_factor * base period), a change brings them
+    back to the base period. Meters with 'state': 'tx' (PO, ALC, SWR) are only
+    fast during TX, 'state': 'rx' (S-meter) only during RX. The total number of
+    commands per second is limited to budget by a token bucket.
+    """
+
+    TIER_PRIORITY = {'meter': 0, 'level': 1, 'slow': 2}
+
+    def __init__(self, params, tier_periods, budget, max_factor=4.0, backoff=1.25):
+        self.tier_periods = dict(tier_periods)
+        self.budget = float(budget)
+        self.max_factor = max_factor
+        self.backoff = backoff
+        self._tokens = self.budget
+        self._last_refill = time.monotonic()
+        self._entries = {}
+        for param in params:
+            self._entries[param['cmd']] = {
+                'param': param,
+                'factor': 1.0,
+                'next_due': 0.0,
+                'last': None,
+            }
+
+    def _tier(self, param, tx_active):
+        tier = param.get('tier', 'level')
+        # meters which only make sense in the other TX/RX state are polled slowly
+        state = param.get('state')
+        if tier == 'meter' and state and state != ('tx' if tx_active else 'rx'):
+            tier = 'slow'
+        return tier
+
+    def _base_period(self, param, tx_active):
+        return self.tier_periods[self._tier(param, tx_active)] / 1000.0
+
+    def due(self, tx_active=False, exclude=(), now=None):
+        """Returns list of commands to poll now, most important first, within budget."""
+        now = time.monotonic() if now is None else now
+        self._tokens = min(self.budget, self._tokens + (now - self._last_refill) * self.budget)
+        self._last_refill = now
+
+        candidates = []
+        for cmd, entry in self._entries.items():
+            if cmd in exclude or entry['next_due'] > now:
+                continue
+            param = entry['param']
+            candidates.append((self.TIER_PRIORITY[self._tier(param, tx_active)], entry['next_due'], cmd))
+        candidates.sort()
+
+        selected = []
+        for _, _, cmd in candidates:
+            if self._tokens < 1.0:
+                break
+            self._tokens -= 1.0
+            entry = self._entries[cmd]
+            period = self._base_period(entry['param'], tx_active) * entry['factor']
+            entry['next_due'] = now + period
+            selected.append(cmd)
+        return selected
+
+    def update(self, cmd, response, tx_active=False, now=None):
+        """Feeds back the answer for cmd, adapts its period to how often it changes."""
+        entry = self._entries.get(cmd)
+        if entry is None:
+            return False
+        now = time.monotonic() if now is None else now
+        changed = response != entry['last']
+        entry['last'] = response
+        if changed:
+            entry['factor'] = 1.0
+            entry['next_due'] = min(entry['next_due'], now + self._base_period(entry['param'], tx_active))
+        else:
+            entry['factor'] = min(self.max_factor, entry['factor'] * self.backoff)
+        return changed
+
+    def trigger(self, cmd=None):
+        """Makes cmd (or all parameters when None) due on the next tick with base period."""
+        for key, entry in self._entries.items():
+            if cmd is None or key == cmd:
+                entry['factor'] = 1.0
+                entry['next_due'] = 0.0
+                entry['last'] = None
+
+    def state_changed(self):
+        """TX/RX switch - meters are due immediately in the new state."""
+        for entry in self._entries.values():
+            if entry['param'].get('tier') == 'meter':
+                entry['factor'] = 1.0
+                entry['next_due'] = 0.0
+
+
+
+# Typed value of a record, by response kind. get_level / get_func / send_cmd
+# values are converted with the per-parameter 'type' (see RigState).
+_RECORD_CONVERTERS = {
+    'get_freq': lambda rec: int(rec.fields['Frequency']),
+    'get_mode': lambda rec: (rec.fields['Mode'], int(rec.fields['Passband'])),
+    'get_vfo_info': lambda rec: (rec.arg, int(rec.fields['Freq']), rec.fields['Mode'], int(rec.fields['Width'])),
+    'get_vfo': lambda rec: rec.fields['VFO'],
+    'get_ptt': lambda rec: int(rec.fields['PTT']),
+    'get_powerstat': lambda rec: int(rec.fields['Power Status']),
+}
+_DEFAULT_TYPES = {'get_level': float, 'get_func': int, 'send_cmd': str}
+_MISSING = object()
+
+
+class RigState:
+    """Typed snapshot of polled parameters, keyed by poll command ('l AF', 'f'...).
+
+    params is the cyclicRefreshParams list: 'type' overrides the value type of
+    get_level/get_func answers, 'alwaysEmit' reports the parameter on every
+    poll even when unchanged.
+    """
+
+    def __init__(self, params):
+        self.values = {}
+        self.types = {p['cmd']: p['type'] for p in params if 'type' in p}
+        self.always = {p['cmd'] for p in params if p.get('alwaysEmit', False)}
+
+    def convert(self, cmd, rec):
+        converter = _RECORD_CONVERTERS.get(rec.kind)
+        if converter is not None:
+            return converter(rec)
+        return self.types.get(cmd, _DEFAULT_TYPES.get(rec.kind, str))(rec.value)
+
+    def apply(self, cmds, records):
+        """Feeds one poll answer, returns ({cmd: value} of changed parameters, [cmds answered OK])."""
+        changes = {}
+        received = []
+        for cmd, record in zip(cmds, records):
+            rec = tokenize_record(record)
+            if rec.status != 0:
+                print(f'Error in response: {rec.kind} RPRT {rec.status}')
+                continue
+            try:
+                value = self.convert(cmd, rec)
+            except (KeyError, ValueError, TypeError):
+                print(f"Cannot parse answer for {cmd}: {record!r}")
+                continue
+            received.append(cmd)
+            if cmd in self.always or self.values.get(cmd, _MISSING) != value:
+                self.values[cmd] = value
+                changes[cmd] = value
+        return changes, received
+
+    def forget(self, cmds=None):
+        """Drops known values (all when None), they are reported again on the next answer."""
+        if cmds is None:
+            self.values.clear()
+        else:
+            for cmd in cmds:
+                self.values.pop(cmd, None)
+
+
+_BENCH_POLL = [
+    "get_level: AF\n0.300000\nRPRT 0\n",
+    "get_level: SQL\n0.000000\nRPRT 0\n",
+    "get_level: STRENGTH\n-42\nRPRT 0\n",
+    "get_level: RFPOWER_METER\n0.000000\nRPRT 0\n",
+    "get_level: ALC\n0.000000\nRPRT 0\n",
+    "get_level: SWR\n1.000000\nRPRT 0\n",
+    "get_powerstat:\nPower Status: 1\nRPRT 0\n",
+    "get_freq:\nFrequency: 14074000\nRPRT 0\n",
+    "get_mode:\nMode: USB\nPassband: 2400\nRPRT 0\n",
+    "get_vfo_info: VFOA\nFreq: 14074000\nMode: USB\nWidth: 2400\nSplit: 0\nSatMode: 0\nRPRT 0\n",
+    "get_level: RFPOWER\n0.500000\nRPRT 0\n",
+    "get_func: TUNER\n0\nRPRT 0\n",
+    "get_ptt:\nPTT: 0\nRPRT 0\n",
+    "get_vfo:\nVFO: VFOA\nRPRT 0\n",
+    "get_func: NB\n0\nRPRT 0\n",
+    "get_level: IF\n0\nRPRT 0\n",
+    "send_cmd: RA0;\nReply: RA01;\nRPRT 0\n",
+]
+
+_BENCH_PARAMS = ['l AF', 'l SQL', 'l STRENGTH', 'l RFPOWER_METER', 'l ALC', 'l SWR', 'l RFPOWER',
+                 'u TUNER', 'u NB', 'l IF', 'l PREAMP', 'u MON', 'u MN', 'l NOTCHF', 'u NR',
+                 'l NR', 'l ATT', 'wRA0;']
+
+
+def _legacy_parse(resp, params, sink):
+    """String splitting + linear parser lookup, as done before the dispatch table."""
+    def find(prefix, param):
+        for cmd in params:
+            if prefix == 'w':
+                if cmd.startswith('w') and param in cmd.split('w')[1]:
+                    return cmd
+            elif cmd.startswith(prefix) and cmd.split(' ')[1] == param:
+                return cmd
+        return None
+
+    if 'RPRT 0' not in resp:
+        return
+    if 'get_level' in resp or 'get_func' in resp:
+        param = resp.split(': ')[1].split('\n')[0]
+        value = resp.split(param + '\n')[1].split('\n')[0]
+        sink(find('l ' if 'get_level' in resp else 'u ', param), value)
+    elif 'get_freq' in resp:
+        sink('f', int(resp.split('Frequency: ')[1].split('\n')[0]))
+    elif 'get_mode' in resp:
+        sink('m', (resp.split('get_mode:\nMode: ')[1].split('\n')[0],
+                   int(resp.split('\nPassband: ')[1].split('\n')[0])))
+    elif 'get_vfo_info' in resp:
+        sink(resp.split('get_vfo_info: ')[1].split('\n')[0],
+             (int(resp.split('Freq: ')[1].split('\n')[0]), resp.split('Mode: ')[1].split('\n')[0],
+              int(resp.split('Width: ')[1].split('\n')[0]), resp.split('Split: ')[1].split('\n')[0],
+              resp.split('SatMode: ')[1].split('\n')[0]))
+    elif 'get_vfo' in resp:
+        sink('v', resp.split('get_vfo:\nVFO: ')[1].split('\n')[0])
+    elif 'get_ptt' in resp:
+        sink('t', resp.split('get_ptt:\nPTT: ')[1].split('\n')[0])
+    elif 'send_cmd' in resp:
+        param = resp.split('send_cmd: ')[1].split(';')[0]
+        sink(find('w', param), resp.split('Reply: ' + param)[1].split(';')[0])
+    elif 'get_powerstat' in resp:
+        sink('\\get_powerstat', resp.split('get_powerstat:\nPower Status: ')[1].split('\n')[0])
+
+
+def _benchmark(polls):
+    results = []
+    sink = lambda key, value: results.append(value)
+
+    # (kind, arg) -> handler, built once like MainWindow does
+    table = {}
+    for cmd in _BENCH_PARAMS:
+        if cmd.startswith('l '):
+            table[('get_level', cmd[2:])] = sink
+        elif cmd.startswith('u '):
+            table[('get_func', cmd[2:])] = sink
+        elif cmd.startswith('w'):
+            table[('send_cmd', cmd[1:].split(';')[0])] = sink
+    for kind in ('get_freq', 'get_mode', 'get_vfo', 'get_ptt', 'get_powerstat'):
+        table[(kind, None)] = sink
+    for vfo in ('VFOA', 'VFOB'):
+        table[('get_vfo_info', vfo)] = sink
+
+    def table_parse(resp):
+        rec = tokenize_record(resp)
+        if rec.status != 0:
+            return
+        handler = table.get((rec.kind, rec.arg))
+        if handler is not None:
+            handler(rec.kind, rec.value if rec.value is not None else rec.fields)
+
+    # both paths must find a handler for every record
+    for resp in _BENCH_POLL:
+        before = len(results)
+        _legacy_parse(resp, _BENCH_PARAMS, sink)
+        table_parse(resp)
+        if len(results) != before + 2:
+            raise SystemExit(f"Record not dispatched: {resp!r}")
+
+    # S-meter and frequency change between polls, the rest mostly does not
+    recorded = []
+    for i in range(64):
+        poll = list(_BENCH_POLL)
+        poll[2] = f"get_level: STRENGTH\n{-60 + i % 40}\nRPRT 0\n"
+        poll[7] = f"get_freq:\nFrequency: {14074000 + (i % 8) * 10}\nRPRT 0\n"
+        recorded.append(poll)
+
+    tokenize = tokenize_record.__wrapped__
+
+    def uncached(resp):
+        rec = tokenize(resp)
+        if rec.status != 0:
+            return
+        handler = table.get((rec.kind, rec.arg))
+        if handler is not None:
+            handler(rec.kind, rec.value if rec.value is not None else rec.fields)
+
+    parsers = (('legacy', lambda r: _legacy_parse(r, _BENCH_PARAMS, sink)),
+               ('table (no cache)', uncached),
+               ('table', table_parse))
+    # rounds interleaved, best of each: CPU clock changes hit all parsers alike
+    best = {}
+    for _ in range(5):
+        for name, fn in parsers:
+            results.clear()
+            start = time.perf_counter()
+            for i in range(polls):
+                for resp in recorded[i % len(recorded)]:
+                    fn(resp)
+            elapsed = time.perf_counter() - start
+            best[name] = min(best.get(name, elapsed), elapsed)
+    for name, _ in parsers:
+        print(f"{name:>16}: {best[name] / polls * 1e6:8.1f} us/poll ({len(_BENCH_POLL)} records, {polls} polls, best of 5)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="rigctld response parse benchmark")
+    parser.add_argument("--polls", type=int, default=5000)
+    args = parser.parse_args()
+    _benchmark(args.polls)
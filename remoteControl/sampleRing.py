@@ -0,0 +1,586 @@
+#!/usr/bin/env python3
+"""
+Preallocated sample ring for the realtime audio paths (audioServer, audioClient).
+
+SampleRing is a single producer / single consumer float32 ring. The producer
+(asyncio thread receiving WebRTC frames) only moves the write counter, the
+consumer (PortAudio callback) only moves the read counter. Both counters are
+plain ints stored after the samples are copied, so no lock is taken and
+nothing is allocated per block. The callback always gets exactly `frames`
+samples, whatever the size of the received frames.
+
+JitterBuffer puts latency control on top of a SampleRing. The producer side
+tracks how late every block arrives compared to the earliest one (transit
+spread), the target depth follows its recent peak plus a jitter margin:
+the lowest depth that rides out the jitter seen lately. The consumer side
+keeps the buffered depth on that target by playing slightly faster or slower (fractional resampling, at most
+MAX_RATE_ADJUST), which also absorbs sound card clock drift between sender
+and receiver. Blocks are never dropped except for a large backlog.
+
+BroadcastRing is the other direction: the callback writes each capture
+block once and every listener reads it at its own cursor, so the callback
+cost does not depend on the number of listeners.
+
+Usage:
+    python sampleRing.py               # compare with the old queue.Queue of chunks
+    python sampleRing.py --blocks 50000
+    python sampleRing.py --simulate    # jitter + drift simulation, old vs adaptive buffer
+    python sampleRing.py --simulate --seed 2 --seconds 1200
+    python sampleRing.py --alloc       # bytes allocated per received frame, old vs in place
+    python sampleRing.py --fanout      # capture callback cost vs. number of listeners
+"""
+
+import time
+import numpy as np
+
+
+class SampleRing:
+
+    def __init__(self, capacity):
+        size = 1 << max(1, capacity - 1).bit_length()
+        self._buf       = np.zeros(size, dtype=np.float32)
+        self._size      = size
+        self._w         = 0         # samples written so far, stored by the producer only
+        self._r         = 0         # samples read so far, stored by the consumer only
+        self._clear     = False
+        self.overflows  = 0         # producer blocks dropped, ring full
+        self.underruns  = 0         # consumer reads that had to be padded with silence
+
+    @property
+    def capacity(self):
+        return self._size
+
+    def available(self):
+        """Samples waiting for the consumer."""
+        return self._w - self._r
+
+    # ── producer ──
+
+    def write(self, samples, scale=None):
+        """Copies samples in, drops the whole block when it does not fit.
+
+        samples may be any numeric array (e.g. int16 straight from a frame
+        plane), with scale it is converted while copying, no temporary.
+        """
+        n = len(samples)
+        w = self._w
+        if n > self._size - (w - self._r):
+            self.overflows += 1
+            return False
+        i = w % self._size
+        first = min(n, self._size - i)
+        self._buf[i:i + first] = samples[:first]
+        if first < n:
+            self._buf[:n - first] = samples[first:]
+        if scale is not None:
+            # after the cast, in float32: a mixed type multiply would buffer
+            self._buf[i:i + first] *= scale
+            if first < n:
+                self._buf[:n - first] *= scale
+        self._w = w + n     # publish after the data is in place
+        return True
+
+    def clear(self):
+        """Asks the consumer to drop everything buffered on its next read."""
+        self._clear = True
+
+    # ── consumer ──
+
+    def take_clear(self):
+        """Carries out a pending clear(), True if there was one."""
+        if not self._clear:
+            return False
+        self._clear = False
+        self._r = self._w
+        return True
+
+    def read_into(self, out):
+        """Fills out with the oldest samples, silence after them. Returns samples read."""
+        self.take_clear()
+        frames = len(out)
+        r = self._r
+        n = min(frames, self._w - r)
+        i = r % self._size
+        first = min(n, self._size - i)
+        out[:first] = self._buf[i:i + first]
+        if first < n:
+            out[first:n] = self._buf[:n - first]
+        if n < frames:
+            out[n:] = 0.0
+            if n:
+                self.underruns += 1
+        self._r = r + n
+        return n
+
+    def skip(self, n):
+        """Drops up to n oldest samples."""
+        self._r += max(0, min(n, self._w - self._r))
+
+    def peek_into(self, out, n):
+        """Copies the n oldest samples (n <= available()) without consuming them."""
+        i = self._r % self._size
+        first = min(n, self._size - i)
+        out[:first] = self._buf[i:i + first]
+        if first < n:
+            out[first:n] = self._buf[:n - first]
+
+
+class BroadcastRing:
+    """Single producer, many consumers, whole blocks.
+
+    The producer (audio callback) writes every block once, each consumer
+    keeps its own cursor (blocks read so far) and reads in place. A block is
+    only overwritten after the producer has lapped the ring, read() keeps
+    consumers at most max_lag blocks behind so that never happens to a block
+    being read.
+    """
+
+    def __init__(self, blocks, block, dtype=np.int16):
+        size = 1 << max(1, blocks - 1).bit_length()
+        self._buf   = np.zeros((size, block), dtype=dtype)
+        self._size  = size
+        self.seq    = 0         # blocks written so far, stored by the producer only
+
+    def write(self, samples):
+        self._buf[self.seq % self._size] = samples
+        self.seq += 1           # publish after the data is in place
+
+    def read(self, cursor, max_lag):
+        """Returns (block, next cursor), cursor < seq. Lagging readers skip ahead.
+
+        block is a view into the ring, not a copy: use it right away.
+        """
+        seq = self.seq
+        if seq - cursor > max_lag:
+            cursor = seq - max_lag
+        return self._buf[cursor % self._size], cursor + 1
+
+
+class JitterBuffer:
+    """Adaptive playout buffer: SampleRing + jitter tracking + drift correction.
+
+    push() is called by the producer for every received block, read_into() by
+    the audio callback. Neither allocates. stats() may be read from anywhere.
+    """
+
+    MAX_RATE_ADJUST = 0.005     # +-0.5 % playback rate, not audible on speech
+    RATE_GAIN       = 0.1       # rate change per second of depth error
+    DEPTH_SMOOTHING = 0.05      # depth average, per callback
+    JITTER_DECAY    = 60.0      # s, how long a late block keeps the target up
+    JITTER_MARGIN   = 2.0       # running jitters added on top of the spread peak
+    BASE_CREEP      = 0.001     # per block, lets the earliest transit follow clock drift
+    MAX_GAP         = 1.0       # s without blocks, then transit tracking starts over
+    MAX_BACKLOG     = 0.2       # s above target, beyond that the excess is skipped at once
+    RESUME_LEVEL    = 0.5       # of target, after running dry, stalled blocks tend to arrive together
+
+    def __init__(self, rate, block, min_depth_ms=20, max_depth_ms=300, max_frames=None):
+        self.rate       = rate
+        self.block      = block
+        self.min_depth  = int(rate * min_depth_ms / 1000)
+        self.max_depth  = int(rate * max_depth_ms / 1000)
+        self.ring       = SampleRing(self.max_depth + int(rate * self.MAX_BACKLOG) + 4 * block)
+        max_frames      = max_frames or 4 * block
+        # resampler scratch, sized for the largest callback
+        n = int(max_frames * (1 + self.MAX_RATE_ADJUST)) + 2
+        self._src       = np.zeros(n, dtype=np.float32)
+        self._ramp      = np.arange(max_frames, dtype=np.float64)
+        self._x         = np.zeros(max_frames, dtype=np.float64)
+        self._i         = np.zeros(max_frames, dtype=np.intp)
+        self._i1        = np.zeros(max_frames, dtype=np.intp)
+        self._a         = np.zeros(max_frames, dtype=np.float32)
+        self._b         = np.zeros(max_frames, dtype=np.float32)
+        self._fi        = np.zeros(max_frames, dtype=np.float64)
+        self._w         = np.zeros(max_frames, dtype=np.float32)
+        self._frac      = 0.0
+        # producer side
+        self._last_arrival = None
+        self._prev_late = 0.0
+        self._media     = 0         # samples received since transit tracking started
+        self._base      = 0.0       # s, earliest transit (arrival - media time) seen lately
+        self.jitter     = 0.0       # s, RFC 3550 style running jitter, for stats
+        self.spread     = 0.0       # s, decaying peak of transit above the earliest one
+        self.target     = max(self.min_depth, 2 * block)
+        # consumer side
+        self._playing   = False
+        self.depth      = 0.0       # samples, smoothed
+        self.ratio      = 1.0       # input samples consumed per output sample
+        self.skipped    = 0
+        self.rebuffers  = 0
+
+    def reset(self):
+        self.ring.clear()
+        self._playing = False
+        self._last_arrival = None
+
+    # ── producer ──
+
+    def push(self, samples, now=None, scale=None):
+        """Queues a received block (see SampleRing.write for scale), now is its arrival time."""
+        now = time.monotonic() if now is None else now
+        last = self._last_arrival
+        if last is None or now - last > self.MAX_GAP:
+            self._media = 0
+            self._base = now
+            self._prev_late = 0.0
+            self.spread = 0.0
+        else:
+            transit = now - self._media / self.rate
+            late = transit - self._base
+            if late < 0:
+                self._base = transit
+                late = 0.0
+            else:
+                self._base += late * self.BASE_CREEP
+            self.jitter += (abs(late - self._prev_late) - self.jitter) / 16.0
+            self._prev_late = late
+            self.spread = max(late, self.spread * np.exp(-(now - last) / self.JITTER_DECAY))
+            # one block for the read, one for the arrival phase: blocks come whole, so
+            # the depth seen by the callback may be up to a block above its low point
+            target = 2 * self.block + (self.spread + self.JITTER_MARGIN * self.jitter) * self.rate
+            self.target = int(min(self.max_depth, max(self.min_depth, target)))
+        self._last_arrival = now
+        self._media += len(samples)
+        return self.ring.write(samples, scale)
+
+    # ── consumer ──
+
+    def read_into(self, out):
+        """Fills out (exactly len(out) samples), silence while (re)buffering."""
+        frames = len(out)
+        ring = self.ring
+        if ring.take_clear():
+            # reset() by the producer, prebuffer again for the next stream
+            self._playing = False
+        available = ring.available()
+
+        if not self._playing:
+            if available < self.target * self.RESUME_LEVEL:
+                out[:] = 0.0
+                return 0
+            self._playing = True
+            self.depth = available
+            self._frac = 0.0
+
+        if available > self.target + self.MAX_BACKLOG * self.rate:
+            # burst after a network stall, catching up by rate alone would take minutes
+            excess = int(available - self.target)
+            ring.skip(excess)
+            self.skipped += excess
+            available -= excess
+            self.depth = available
+
+        self.depth += (available - self.depth) * self.DEPTH_SMOOTHING
+        error = (self.depth - self.target) / self.rate
+        adjust = min(self.MAX_RATE_ADJUST, max(-self.MAX_RATE_ADJUST, error * self.RATE_GAIN))
+        self.ratio = ratio = 1.0 + adjust
+
+        # input positions of the output samples: frac + ratio * k
+        x = self._x[:frames]
+        np.multiply(self._ramp[:frames], ratio, out=x)
+        x += self._frac
+        last = x[-1]
+        need = int(last) + (2 if last % 1.0 else 1)     # one more only when interpolating past it
+        if need > available:
+            # ran dry: play what is left and rebuffer, the rate control brings depth back to target
+            n = ring.read_into(out)
+            self._playing = False
+            self.rebuffers += 1
+            return n
+
+        ring.peek_into(self._src, need)
+        # every step stays within one dtype or is a plain cast, mixed type
+        # ufuncs and take(mode='raise') would allocate temporaries
+        i, i1, a, b = self._i[:frames], self._i1[:frames], self._a[:frames], self._b[:frames]
+        fi, w = self._fi[:frames], self._w[:frames]
+        np.copyto(i, x, casting='unsafe')          # floor, x >= 0
+        np.add(i, 1, out=i1)
+        np.minimum(i1, need - 1, out=i1)            # weight 0 there, keeps src in range
+        np.take(self._src, i, out=a, mode='clip')
+        np.take(self._src, i1, out=b, mode='clip')
+        np.subtract(b, a, out=b)
+        np.copyto(fi, i)
+        np.subtract(x, fi, out=x)
+        np.copyto(w, x, casting='same_kind')
+        b *= w
+        np.add(a, b, out=out)
+
+        end = self._frac + ratio * frames
+        consumed = int(end)
+        self._frac = end - consumed
+        ring.skip(consumed)
+        return frames
+
+    def stats(self):
+        """Current latency figures in ms, ratio in ppm."""
+        to_ms = 1000.0 / self.rate
+        return {
+            'depth_ms':   round(float(self.depth) * to_ms, 1),
+            'target_ms':  round(self.target * to_ms, 1),
+            'jitter_ms':  round(float(self.jitter) * 1000, 1),
+            'spread_ms':  round(float(self.spread) * 1000, 1),
+            'rate_ppm':   round((self.ratio - 1.0) * 1e6),
+            'rebuffers':  self.rebuffers,
+            'skipped_ms': round(self.skipped * to_ms, 1),
+            'overflows':  self.ring.overflows,
+        }
+
+
+def _benchmark(blocks, block_size=960):
+    import queue
+    import time
+
+    chunk = np.random.default_rng(1).standard_normal(block_size).astype(np.float32)
+    out = np.zeros((block_size, 1), dtype=np.float32)
+
+    q = queue.Queue(maxsize=24)
+    start = time.perf_counter()
+    for _ in range(blocks):
+        q.put_nowait(chunk.copy())
+        q.qsize()
+        c = q.get_nowait()
+        n = min(len(c), block_size)
+        out[:n, 0] = c[:n]
+    old = (time.perf_counter() - start) / blocks
+
+    ring = SampleRing(24 * block_size)
+    start = time.perf_counter()
+    for _ in range(blocks):
+        ring.write(chunk)
+        ring.available()
+        ring.read_into(out[:, 0])
+    new = (time.perf_counter() - start) / blocks
+
+    print(f"queue.Queue: {old * 1e6:6.2f} us/block   SampleRing: {new * 1e6:6.2f} us/block "
+          f"({blocks} blocks of {block_size})")
+
+
+def _alloc_benchmark(frames, rate=48000, block=960):
+    """Bytes allocated per received frame on the frame -> ring path, old vs in place."""
+    import queue
+    import tracemalloc
+    import av
+
+    pcm = (np.random.default_rng(1).standard_normal(block) * 3000).astype(np.int16)
+    frame = av.AudioFrame.from_ndarray(pcm.reshape(1, -1), format="s16", layout="mono")
+    frame.sample_rate = rate
+    planes = {fmt: av.AudioResampler(format=fmt, layout="mono", rate=rate).resample(frame)[0]
+              for fmt in ("s16", "fltp")}
+
+    def old_client(q, f):
+        raw = np.frombuffer(bytes(f.planes[0]), dtype=np.int16)
+        q.put_nowait(raw.astype(np.float32) / 32768.0)
+
+    def old_server(q, f):
+        q.put_nowait(np.frombuffer(bytes(f.planes[0]), dtype=np.float32))
+
+    def new_client(jb, f):
+        jb.push(np.frombuffer(f.planes[0], dtype=np.int16, count=f.samples), scale=1.0 / 32768.0)
+
+    def new_server(jb, f):
+        jb.push(np.frombuffer(f.planes[0], dtype=np.float32, count=f.samples))
+
+    def run(convert, fmt, sink, drain):
+        f = planes[fmt]
+        out = np.zeros(block, dtype=np.float32)
+        start = time.perf_counter()
+        for _ in range(frames):
+            convert(sink, f)
+            drain(out)
+        elapsed = (time.perf_counter() - start) / frames
+        # peak above the live baseline while converting / while draining one frame
+        tracemalloc.start()
+        peaks = [0, 0]
+        for _ in range(frames):
+            for k, step in enumerate((lambda: convert(sink, f), lambda: drain(out))):
+                base = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                step()
+                peaks[k] = max(peaks[k], tracemalloc.get_traced_memory()[1] - base)
+        tracemalloc.stop()
+        return peaks, elapsed
+
+    def queue_case():
+        q = queue.Queue(maxsize=24)
+
+        def drain(out):
+            out[:] = q.get_nowait()[:len(out)]
+        return q, drain
+
+    def jb_case():
+        jb = JitterBuffer(rate, block)
+        return jb, jb.read_into
+
+    print(f"per frame of {block} samples, max over {frames} frames:")
+    for name, convert, fmt, case in (("client old (bytes + astype)", old_client, "s16", queue_case),
+                                     ("client new (view + scale)", new_client, "s16", jb_case),
+                                     ("server old (bytes)", old_server, "fltp", queue_case),
+                                     ("server new (view)", new_server, "fltp", jb_case)):
+        (push, pull), elapsed = run(convert, fmt, *case())
+        print(f"{name:>28}: {push:6d} B allocated converting, {pull:6d} B playing out, {elapsed * 1e6:5.1f} us")
+
+
+def _fanout_benchmark(blocks, block=960, listeners=(1, 4, 16, 64)):
+    """Capture callback cost with n listeners: a queue + wake-up each vs. BroadcastRing."""
+    import asyncio
+    import threading
+
+    indata = np.zeros((block, 1), dtype=np.int16)
+
+    def measure(n, shared):
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        received = [0]
+
+        def put(q, data):
+            try:
+                q.put_nowait(data)
+            except asyncio.QueueFull:
+                pass
+
+        def wake(event):
+            event.set()
+            event.clear()
+
+        async def setup():
+            ring = BroadcastRing(16, block)
+            event = asyncio.Event()
+            queues = [asyncio.Queue(maxsize=8) for _ in range(n)]
+
+            async def queue_reader(q):
+                while True:
+                    await q.get()
+                    received[0] += 1
+
+            async def ring_reader():
+                cursor = ring.seq
+                while True:
+                    while cursor >= ring.seq:
+                        await event.wait()
+                    _, cursor = ring.read(cursor, 4)
+                    received[0] += 1
+
+            tasks = [loop.create_task(ring_reader() if shared else queue_reader(q)) for q in queues]
+            return ring, event, queues, tasks
+
+        async def teardown(tasks):
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        ring, event, queues, tasks = asyncio.run_coroutine_threadsafe(setup(), loop).result()
+        spent = 0.0
+        for _ in range(blocks):
+            start = time.perf_counter()
+            if shared:
+                ring.write(indata[:, 0])
+                loop.call_soon_threadsafe(wake, event)
+            else:
+                data = indata[:, 0].copy()
+                for q in queues:
+                    loop.call_soon_threadsafe(put, q, data)
+            spent += time.perf_counter() - start
+            time.sleep(0.002)
+        asyncio.run_coroutine_threadsafe(teardown(tasks), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+        return spent / blocks, received[0] / (blocks * n)
+
+    print(f"capture callback, {blocks} blocks of {block} every 2 ms:")
+    for n in listeners:
+        old, old_rx = measure(n, False)
+        new, new_rx = measure(n, True)
+        print(f"{n:3d} listeners: per-listener queues {old * 1e6:6.1f} us ({old_rx:4.0%} delivered)   "
+              f"BroadcastRing {new * 1e6:5.1f} us ({new_rx:4.0%} delivered)")
+
+
+def _simulate(seconds, drift_ppm, jitter_ms, seed=1, rate=48000, block=960):
+    """Network frames with jitter and a sender clock off by drift_ppm, played by a steady callback.
+
+    Old: fixed prefill of 2 blocks, drop 2 blocks when more than 30 are queued.
+    Returns {name: (silent blocks, mean ms buffered, p95 ms buffered)} and the adaptive stats.
+    """
+    rng = np.random.default_rng(seed)
+    period = block / rate
+    # arrival times: sender clock drift + random delay (occasional spikes)
+    n_frames = int((seconds + 1) / period)    # the stream outlasts the run, no silence at the end
+    send = np.arange(n_frames) * period * (1 - drift_ppm * 1e-6)
+    delay = rng.exponential(jitter_ms / 1000, n_frames)
+    delay[rng.random(n_frames) < 0.01] += 0.1
+    # delivered in order: a late frame holds back the ones behind it
+    arrive = np.maximum.accumulate(send + delay + 0.05)
+    frames = [np.full(block, float(k), dtype=np.float32) for k in range(8)]
+
+    def run(push, read, depth):
+        out = np.zeros(block, dtype=np.float32)
+        t, k, silent, depths = 0.05, 0, 0, []
+        while t < seconds:
+            while k < n_frames and arrive[k] <= t:
+                push(frames[k % 8], arrive[k])
+                k += 1
+            if read(out) < block:
+                silent += 1
+            depths.append(depth())
+            t += period
+        return silent, np.mean(depths) / rate * 1000, np.percentile(depths, 95) / rate * 1000
+
+    import queue
+    q = queue.Queue(maxsize=24)
+    state = {'pre': False}
+
+    def old_push(samples, now):
+        try:
+            q.put_nowait(samples)
+        except queue.Full:
+            pass
+
+    def old_read(out):
+        if not state['pre']:
+            if q.qsize() < 2:
+                return 0
+            state['pre'] = True
+        drained = 0
+        while q.qsize() > 30 and drained < 2:
+            q.get_nowait()
+            drained += 1
+        try:
+            out[:] = q.get_nowait()
+            return len(out)
+        except queue.Empty:
+            return 0
+
+    jb = JitterBuffer(rate, block)
+    results = {
+        'fixed prefill': run(old_push, old_read, lambda: q.qsize() * block),
+        'adaptive': run(jb.push, jb.read_into, jb.ring.available),
+    }
+    return results, jb.stats()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SampleRing benchmark")
+    parser.add_argument("--blocks", type=int, default=20000)
+    parser.add_argument("--simulate", action="store_true", help="jitter buffer simulation instead of benchmark")
+    parser.add_argument("--alloc", action="store_true", help="allocations per frame on the frame -> ring path")
+    parser.add_argument("--fanout", action="store_true", help="capture callback cost vs. number of listeners")
+    parser.add_argument("--seconds", type=float, default=600)
+    parser.add_argument("--drift", type=float, default=200, help="sender clock error, ppm")
+    parser.add_argument("--jitter", type=float, default=10, help="mean extra network delay, ms")
+    parser.add_argument("--seed", type=int, default=1, help="random draw of the simulated network")
+    args = parser.parse_args()
+    if args.fanout:
+        _fanout_benchmark(min(args.blocks, 1000))
+    elif args.alloc:
+        _alloc_benchmark(args.blocks)
+    elif args.simulate:
+        for drift in (args.drift, -args.drift):
+            results, stats = _simulate(args.seconds, drift, args.jitter, args.seed)
+            print(f"{args.seconds:.0f} s, drift {drift:+.0f} ppm, jitter {args.jitter:.0f} ms (+1% 100 ms spikes)")
+            for name, (silent, mean_ms, p95_ms) in results.items():
+                print(f"{name:>14}: {silent:5d} silent blocks, buffered {mean_ms:6.1f} ms avg, {p95_ms:6.1f} ms p95")
+            print(f"{'':>14}  {stats}")
+    else:
+        _benchmark(args.blocks)
@@ -0,0 +1,583 @@
+#!/usr/bin/env python3
+"""
+Waterfall rendering pipeline, without any GUI dependency.
+
+    OpenWebRX FFT frame -> IMA-ADPCM decode -> level row -> ColumnMap (zoom
+    slice + resample to widget width) -> RowRing
+
+Rows are carried as level bytes on a fixed dB scale (LEVEL_DB_MIN /
+LEVEL_DB_STEP) from decoding to the ring and the history file. Colours are
+only applied when drawing: level_palette() gives the colour of every level
+for the current min/max dB, the widget uses it as the colour table of an
+8-bit indexed image.
+
+WsReceiver and WaterfallWidget are thin wrappers around these stages, so the
+whole path can be measured here on recorded websocket captures. RowRenderer
+runs the stages after decoding on its own thread, the GUI only blits the ring.
+
+Behind waterfallProxy (remoteControlNode) rows arrive already reduced to the
+client view as FRAME_TYPE_ROW messages (one level byte per column), optionally
+zlib compressed, see link_view() / encode_row_frame() / decode_row_frame().
+
+Capture file: binary websocket messages, each prefixed with its length
+(4 bytes, little endian).
+
+Usage:
+    python waterfallPipeline.py --record capture.bin --url ws://sdr:8073/ws/ --frames 500
+    python waterfallPipeline.py capture.bin                 # benchmark recorded frames
+    python waterfallPipeline.py                             # benchmark synthetic frames
+    python waterfallPipeline.py --fft-sizes 1024,4096 --widths 800,2560 --zoom 0.5
+    python waterfallPipeline.py --interp                    # old slice + np.interp path
+    python waterfallPipeline.py --reduce power              # max | mean | power
+"""
+
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+import numpy as np
+
+from imaAdpcm import ImaAdpcmCodec
+
+FRAME_TYPE_FFT = 1
+# samples at the start of a decoded FFT frame which are not part of the spectrum
+COMPRESS_FFT_PAD_N = 14
+
+# Row already reduced to the client view by waterfallProxy (remoteControlNode):
+# header (type, full FFT size, first bin, end bin) + one level byte per column
+FRAME_TYPE_ROW = 0x81
+# same, level bytes zlib compressed
+FRAME_TYPE_ROW_ZLIB = 0x82
+ROW_HEADER = struct.Struct('<BHHH')
+# level byte = (dB - LEVEL_DB_MIN) / LEVEL_DB_STEP, covers -150 .. +3 dB
+LEVEL_DB_MIN = -150.0
+LEVEL_DB_STEP = 0.6
+# linear power of every level, for the 'power' reduce mode
+LEVEL_POWER = np.power(10.0, (np.arange(256) * LEVEL_DB_STEP + LEVEL_DB_MIN) * 0.1)
+# level of every decoded int16 centi-dB sample, indexed by its uint16 bit pattern
+CENTI_DB_LEVELS = np.clip(np.round((np.arange(65536, dtype=np.uint16).view(np.int16) / 100.0 - LEVEL_DB_MIN)
+                                   / LEVEL_DB_STEP), 0, 255).astype(np.uint8)
+
+
+def build_colormap(theme):
+    n_steps = 256
+    colors = np.array([[(c >> 16) & 0xFF, (c >> 8) & 0xFF, c & 0xFF] for c in theme], dtype=np.float32)
+    segments = len(colors) - 1
+    steps_per_segment = n_steps // segments
+    palette = np.zeros((n_steps, 3), dtype=np.uint8)
+    idx = 0
+    for s in range(segments):
+        c0 = colors[s]
+        c1 = colors[s+1]
+        for i in range(steps_per_segment):
+            t = i / steps_per_segment
+            palette[idx] = (c0 + t * (c1 - c0)).astype(np.uint8)
+            idx += 1
+    while idx < n_steps:
+        palette[idx] = colors[-1].astype(np.uint8)
+        idx += 1
+    return palette
+
+
+def db_to_levels(db):
+    return np.clip((db - LEVEL_DB_MIN) * (1.0 / LEVEL_DB_STEP) + 0.5, 0, 255).astype(np.uint8)
+
+
+def levels_to_db(levels):
+    return levels * LEVEL_DB_STEP + LEVEL_DB_MIN
+
+
+def level_palette(palette, min_db, max_db):
+    """Colour of every level byte for the min_db..max_db range -> (256, 3) uint8."""
+    norm = np.clip((levels_to_db(np.arange(256)) - min_db) / (max_db - min_db), 0.0, 1.0)
+    return palette[(norm * (len(palette) - 1)).astype(np.int32)]
+
+
+def decode_fft_frame(codec, data):
+    """OpenWebRX binary message -> spectrum row as level bytes, None for other frames."""
+    if len(data) < COMPRESS_FFT_PAD_N or data[0] != FRAME_TYPE_FFT:
+        return None
+    # every FFT frame is compressed on its own
+    codec.reset()
+    centi_db = codec.decode(data)[COMPRESS_FFT_PAD_N:]
+    return CENTI_DB_LEVELS[centi_db.view(np.uint16)]
+
+
+def encode_row_frame(row, start, end, full_bins, compress=False):
+    """Reduced level row covering bins start..end of a full_bins FFT -> FRAME_TYPE_ROW(_ZLIB) message."""
+    levels = row.tobytes()
+    if compress:
+        return ROW_HEADER.pack(FRAME_TYPE_ROW_ZLIB, full_bins, start, end) + zlib.compress(levels, 1)
+    return ROW_HEADER.pack(FRAME_TYPE_ROW, full_bins, start, end) + levels
+
+
+def decode_row_frame(data):
+    """FRAME_TYPE_ROW(_ZLIB) message -> level row laid out like a full span row.
+
+    The received columns are placed where their bins lie in the full span,
+    at the received resolution. Bins outside the sent span are filled with
+    the row mean, so fft_avg (auto levels) is not pulled down by them.
+    Frames without levels return None.
+    """
+    if len(data) <= ROW_HEADER.size:
+        return None
+    frame_type, full_bins, start, end = ROW_HEADER.unpack_from(data)
+    if frame_type == FRAME_TYPE_ROW_ZLIB:
+        levels = np.frombuffer(zlib.decompress(data[ROW_HEADER.size:]), dtype=np.uint8)
+    else:
+        levels = np.frombuffer(data, dtype=np.uint8, offset=ROW_HEADER.size)
+    if levels.size == 0:
+        # zero width row (e.g. compressed empty payload), nothing to draw
+        return None
+    n = len(levels)
+    span = max(1, end - start)
+    if n == span and span == full_bins:
+        return levels
+    row = np.full(max(n, round(n * full_bins / span)), round(levels.mean()), dtype=np.uint8)
+    offset = min(len(row) - n, round(start * n / span))
+    row[offset:offset + n] = levels
+    return row
+
+
+def link_view(zoom_factor, center_pos, width, margin=0.25):
+    """View requested from the proxy: (zoom, center, columns).
+
+    The span is widened by margin of the visible width on each side, so short
+    pans and small zoom steps stay inside what is already being sent.
+    """
+    zoom = min(1.0, zoom_factor * (1.0 + 2 * margin))
+    return zoom, float(center_pos), int(width * zoom / zoom_factor + 0.5)
+
+
+def view_covers(view, zoom_factor, center_pos, width):
+    """True while rows sent for view still serve the current zoom, pan and width."""
+    zoom, center, columns = view
+    if not (0.8 <= columns * zoom_factor / (zoom * width) <= 1.25):
+        return False
+    # visible fractions, shifted back inside 0..1 like zoom_range does
+    def fractions(z, c):
+        lo = min(max(0.0, c - z / 2), 1.0 - z)
+        return lo, lo + z
+    lo, hi = fractions(zoom, center)
+    vis_lo, vis_hi = fractions(zoom_factor, center_pos)
+    return lo - 1e-6 <= vis_lo and vis_hi <= hi + 1e-6
+
+
+def zoom_range(n, zoom_factor, center_pos):
+    """(start, end) bins visible for zoom_factor (1.0 = all) around center_pos (0..1)."""
+    visible_n = max(2, int(n * zoom_factor))
+    center = int(center_pos * n)
+    start = max(0, center - visible_n // 2)
+    end = min(n, start + visible_n)
+    if end - start < visible_n:
+        start = max(0, end - visible_n)
+    return start, end
+
+
+def zoom_slice(fft_row, zoom_factor, center_pos):
+    """Visible part of the row for zoom_factor (1.0 = all) around center_pos (0..1)."""
+    start, end = zoom_range(len(fft_row), zoom_factor, center_pos)
+    return fft_row[start:end]
+
+
+def resample(fft_visible, width):
+    """Linear interpolation of the visible bins to width pixels."""
+    if fft_visible.size == width:
+        return fft_visible
+    x_old = np.arange(len(fft_visible))
+    x_new = np.linspace(0, len(fft_visible) - 1, width)
+    return np.interp(x_new, x_old, fft_visible)
+
+
+# How several FFT bins falling into one column are combined
+#   max   - peak hold, a single bin carrier stays visible
+#   mean  - average of dB values, smoother noise floor
+#   power - average in linear power, then back to dB
+REDUCE_MODES = ('max', 'mean', 'power')
+
+
+class ColumnMap:
+    """Cached mapping of FFT bins to widget columns.
+
+    Rebuilt by update() only when the bin count, zoom, pan or width changes.
+    When there are fewer visible bins than columns, apply() interpolates
+    linearly (same result as np.interp) from precomputed indices and weights.
+    Otherwise the bins of every column are reduced with the selected mode,
+    all modes share the same bin edge table. apply() takes level rows and
+    returns level rows, also a 2D block of rows (history) with bins on the
+    last axis.
+    """
+
+    def __init__(self, mode='max'):
+        self._key = None
+        self._idx = None
+        self._weight = None
+        self._edges = None
+        self._counts = None
+        self._start = 0
+        self._end = 0
+        self.set_mode(mode)
+
+    def set_mode(self, mode):
+        if mode not in REDUCE_MODES:
+            print(f"Unknown waterfall reduce mode '{mode}', using 'max'")
+            mode = 'max'
+        self.mode = mode
+
+    @property
+    def span(self):
+        """(start, end) bins covered by the current map."""
+        return self._start, self._end
+
+    def update(self, n_bins, zoom_factor, center_pos, width):
+        """Returns True when the map had to be rebuilt."""
+        key = (n_bins, zoom_factor, center_pos, width)
+        if key == self._key:
+            return False
+        self._key = key
+        start, end = zoom_range(n_bins, zoom_factor, center_pos)
+        visible_n = end - start
+        self._start = start
+        self._end = end
+        if visible_n <= width:
+            x_new = np.linspace(0, visible_n - 1, width)
+            idx = np.minimum(x_new.astype(np.intp), visible_n - 2)
+            self._weight = (x_new - idx).astype(np.float32)
+            self._idx = idx + start
+            self._edges = None
+        else:
+            # first bin of every column (relative to start), each column gets at least one bin
+            self._edges = (np.arange(width, dtype=np.intp) * visible_n) // width
+            self._counts = np.diff(np.append(self._edges, visible_n)).astype(np.float32)
+            self._idx = self._weight = None
+        return True
+
+    def apply(self, fft_row):
+        if self._edges is not None:
+            visible = fft_row[..., self._start:self._end]
+            if self.mode == 'max':
+                return np.maximum.reduceat(visible, self._edges, axis=-1)
+            if self.mode == 'mean':
+                out = np.add.reduceat(visible, self._edges, axis=-1, dtype=np.float32) / self._counts
+            else:
+                power = np.add.reduceat(LEVEL_POWER[visible], self._edges, axis=-1) / self._counts
+                out = (10.0 * np.log10(power) - LEVEL_DB_MIN) * (1.0 / LEVEL_DB_STEP)
+        else:
+            left = fft_row[..., self._idx].astype(np.float32)
+            out = left + (fft_row[..., self._idx + 1] - left) * self._weight
+        return (out + 0.5).astype(np.uint8)
+
+
+class RowRing:
+    """Circular storage of rendered level rows, newest row at head.
+
+    Adding a row writes only that row; readers draw data[head:] followed by
+    data[:head] to get newest-first order.
+    """
+
+    def __init__(self, rows, width):
+        self.data = np.zeros((max(1, rows), width), dtype=np.uint8)
+        self.head = 0
+
+    @property
+    def rows(self):
+        return self.data.shape[0]
+
+    @property
+    def width(self):
+        return self.data.shape[1]
+
+    def push(self, row):
+        self.head = (self.head - 1) % self.data.shape[0]
+        self.data[self.head] = row
+
+    def ordered(self):
+        """Copy of all rows, newest first."""
+        return np.concatenate((self.data[self.head:], self.data[:self.head]))
+
+
+class HistoryFile:
+    """Waterfall history in a memory-mapped ring file of fixed size records.
+
+    Every record is a timestamp and one level row, resampled to `bins` with a peak-keeping
+    ColumnMap, so the file holds rows of any FFT size or proxy span. Rows are
+    addressed by sequence number (0 = first row ever written); only the last
+    `rows` of them are kept. The count lives in the file header, so history
+    survives a restart as long as rows and bins stay the same.
+
+    append() is called from one thread (RowRenderer), read() from any other.
+    """
+
+    MAGIC = b'RRCW'
+    HEADER = np.dtype([('magic', 'S4'), ('rows', '<u4'), ('bins', '<u4'), ('count', '<u8')])
+    HEADER_SIZE = 64
+
+    def __init__(self, path, rows, bins=2048):
+        self.path = path
+        self.record = np.dtype([('t', '<f8'), ('levels', 'u1', (bins,))])
+        size = self.HEADER_SIZE + rows * self.record.itemsize
+        header = None
+        if os.path.exists(path) and os.path.getsize(path) == size:
+            header = np.memmap(path, dtype=self.HEADER, mode='r+', shape=(1,))
+            if (header['magic'][0], header['rows'][0], header['bins'][0]) != (self.MAGIC, rows, bins):
+                header = None
+        if header is None:
+            with open(path, 'wb') as f:
+                f.truncate(size)
+            header = np.memmap(path, dtype=self.HEADER, mode='r+', shape=(1,))
+            header[0] = (self.MAGIC, rows, bins, 0)
+        self._header = header
+        self._records = np.memmap(path, dtype=self.record, mode='r+', offset=self.HEADER_SIZE, shape=(rows,))
+        self._map = ColumnMap('max')
+
+    @property
+    def rows(self):
+        return self._records.shape[0]
+
+    @property
+    def bins(self):
+        return self.record['levels'].shape[0]
+
+    @property
+    def count(self):
+        """Sequence number of the next row, i.e. rows written so far."""
+        return int(self._header['count'][0])
+
+    @property
+    def oldest(self):
+        """Oldest sequence number read() still returns."""
+        # the slot after the newest row may be overwritten right now, keep one spare
+        return max(0, self.count - self.rows + 1)
+
+    def append(self, fft_row, t=None):
+        self._map.update(len(fft_row), 1.0, 0.5, self.bins)
+        count = self.count
+        record = self._records[count % self.rows]
+        record['t'] = time.time() if t is None else t
+        record['levels'] = self._map.apply(fft_row)
+        # count is bumped last, a reader never sees a half written newest row
+        self._header['count'] = count + 1
+
+    def read(self, newest, n):
+        """(times, level rows) for sequence numbers newest, newest-1, ... (at most n, newest first).
+
+        Empty when newest has been overwritten already (newest < oldest).
+        """
+        oldest = max(self.oldest, newest - n + 1)
+        seq = np.arange(newest, oldest - 1, -1) % self.rows
+        records = self._records[seq]
+        return records['t'], records['levels']
+
+    def close(self):
+        self._header.flush()
+        self._records.flush()
+
+
+class RowRenderer(threading.Thread):
+    """Maps decoded level rows to widget columns in a RowRing, off the GUI thread.
+
+    submit() may be called from any thread. The input queue is bounded, when
+    the renderer falls behind the oldest row is dropped (counted in dropped).
+    view() returns (zoom_factor, center_pos) and is read for every row. The
+    ring may only be read or replaced while holding lock; readers poll
+    rendered to see whether new rows arrived. With a HistoryFile every
+    received row is also appended there.
+    """
+
+    def __init__(self, rows, width, view, queue_len=8, reduce_mode='max', history=None):
+        super().__init__(daemon=True)
+        self.view = view
+        self.history = history
+        self.lock = threading.Lock()
+        self.ring = RowRing(rows, width)
+        self.column_map = ColumnMap(reduce_mode)
+        self.fft_avg = 0
+        self.rendered = 0
+        self.dropped = 0
+        self._queue = deque(maxlen=queue_len)
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def submit(self, fft_row):
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(fft_row)
+            self._cond.notify()
+
+    def resize(self, rows, width):
+        """New empty ring for the new widget size, returns it."""
+        with self.lock:
+            self.ring = RowRing(rows, width)
+            return self.ring
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                fft_row = self._queue.popleft()
+
+            self.fft_avg = float(levels_to_db(np.mean(fft_row)))
+            if self.history is not None:
+                self.history.append(fft_row)
+            zoom_factor, center_pos = self.view()
+            width = self.ring.width
+            self.column_map.update(len(fft_row), zoom_factor, center_pos, width)
+            row = self.column_map.apply(fft_row)
+
+            with self.lock:
+                # ring replaced (resize) while this row was prepared
+                if row.shape[0] != self.ring.width:
+                    continue
+                self.ring.push(row)
+                self.rendered += 1
+
+
+def write_capture(path, messages):
+    with open(path, 'wb') as f:
+        for message in messages:
+            f.write(struct.pack('<I', len(message)))
+            f.write(message)
+
+
+def read_capture(path):
+    messages = []
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(4)
+            if len(header) < 4:
+                break
+            (length,) = struct.unpack('<I', header)
+            messages.append(f.read(length))
+    return messages
+
+
+def record_capture(url, path, frames):
+    """Stores the first `frames` FFT messages received from an OpenWebRX websocket."""
+    import websocket
+
+    ws = websocket.create_connection(url, timeout=10)
+    ws.send('SERVER DE CLIENT client=openwebrx.js type=receiver')
+    messages = []
+    try:
+        while len(messages) < frames:
+            message = ws.recv()
+            if isinstance(message, bytes) and message and message[0] == FRAME_TYPE_FFT:
+                messages.append(message)
+    finally:
+        ws.close()
+    write_capture(path, messages)
+    print(f"Recorded {len(messages)} FFT frames to {path}")
+
+
+def synthetic_frames(fft_size, count=64, seed=1):
+    """Random FFT messages of the right size, decode cost does not depend on content."""
+    rng = np.random.default_rng(seed)
+    n_bytes = (fft_size + COMPRESS_FFT_PAD_N) // 2
+    frames = []
+    for _ in range(count):
+        payload = rng.integers(0, 256, n_bytes, dtype=np.uint8)
+        payload[0] = FRAME_TYPE_FFT
+        frames.append(payload.tobytes())
+    return frames
+
+
+# palette is not a stage any more, it is the colour table used when drawing
+STAGES = ('decode', 'zoom', 'resample', 'ring')
+
+
+def run_pipeline(frames, width, height=400, zoom_factor=1.0, center_pos=0.5,
+                 rows=None, interp=False, reduce='max'):
+    """Pushes frames through all stages, returns (rows/s, {stage: mean seconds per row}).
+
+    interp=True uses the old per-row zoom_slice + np.interp instead of ColumnMap.
+    """
+    codec = ImaAdpcmCodec()
+    ring = RowRing(height, width)
+    column_map = ColumnMap(reduce)
+    rows = rows or len(frames)
+    spent = dict.fromkeys(STAGES, 0.0)
+    clock = time.perf_counter
+
+    done = 0
+    start = clock()
+    for i in range(rows):
+        t0 = clock()
+        row = decode_fft_frame(codec, frames[i % len(frames)])
+        t1 = clock()
+        if row is None:
+            continue
+        if interp:
+            visible = zoom_slice(row, zoom_factor, center_pos)
+            t2 = clock()
+            visible = (resample(visible, width) + 0.5).astype(np.uint8)
+        else:
+            column_map.update(len(row), zoom_factor, center_pos, width)
+            t2 = clock()
+            visible = column_map.apply(row)
+        t3 = clock()
+        ring.push(visible)
+        t4 = clock()
+        spent['decode'] += t1 - t0
+        spent['zoom'] += t2 - t1
+        spent['resample'] += t3 - t2
+        spent['ring'] += t4 - t3
+        done += 1
+    elapsed = clock() - start
+    done = max(1, done)
+    return done / elapsed, {stage: total / done for stage, total in spent.items()}
+
+
+def _benchmark(args):
+    if args.capture:
+        captures = {'capture': read_capture(args.capture)}
+        if not captures['capture']:
+            raise SystemExit(f"No frames in {args.capture}")
+    else:
+        captures = {f"fft {n}": synthetic_frames(n) for n in args.fft_sizes}
+
+    # warm up (cython import, numpy caches) so the first line is not skewed
+    run_pipeline(next(iter(captures.values())), args.widths[0], rows=50)
+
+    header = f"{'input':>12} {'width':>6} {'rows/s':>9} " + " ".join(f"{s + ' us':>12}" for s in STAGES)
+    print(header)
+    for name, frames in captures.items():
+        for width in args.widths:
+            rate, stages = run_pipeline(frames, width, zoom_factor=args.zoom, rows=args.rows,
+                                        interp=args.interp, reduce=args.reduce)
+            print(f"{name:>12} {width:>6} {rate:9.1f} " + " ".join(f"{stages[s] * 1e6:12.1f}" for s in STAGES))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    def int_list(text):
+        return [int(v) for v in text.split(',') if v]
+
+    parser = argparse.ArgumentParser(description="Waterfall pipeline benchmark")
+    parser.add_argument("capture", nargs="?", help="recorded capture file (synthetic frames when omitted)")
+    parser.add_argument("--record", metavar="PATH", help="record a capture instead of benchmarking")
+    parser.add_argument("--url", default="ws://127.0.0.1:8073/ws/", help="OpenWebRX websocket for --record")
+    parser.add_argument("--frames", type=int, default=500, help="frames to record")
+    parser.add_argument("--rows", type=int, default=500, help="rows per benchmark run")
+    parser.add_argument("--fft-sizes", type=int_list, default=[1024, 2048, 4096])
+    parser.add_argument("--widths", type=int_list, default=[800, 1920])
+    parser.add_argument("--zoom", type=float, default=1.0)
+    parser.add_argument("--interp", action="store_true", help="benchmark the old zoom slice + np.interp resample")
+    parser.add_argument("--reduce", choices=REDUCE_MODES, default='max', help="bins -> column reduction")
+    args = parser.parse_args()
+
+    if args.record:
+        record_capture(args.url, args.record, args.frames)
+    else:
+        _benchmark(args)
@@ -2,7 +2,7 @@
 """
 WebRTC Audio Bridge
 - One global sd.Stream duplex (device never occupied twice)
-- Each connection has its own capture queue (no cross-contamination)
+- Capture is written once into a shared ring, each connection reads it at its own cursor
 - HTTPS self-signed
 """
 
@@ -12,7 +12,7 @@ import logging
 import ssl
 import fractions
 import os
-import queue
+import sys
 import threading
 import av
 import numpy as np
@@ -21,6 +21,10 @@ from aiohttp import web
 from aiortc import RTCPeerConnection, RTCSessionDescription, MediaStreamTrack
 import aiohttp_cors
 
+# jitter buffer is shared with the desktop client
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "remoteControl"))
+from sampleRing import BroadcastRing, JitterBuffer
+
 # ── Monkey-patch: Opus bitrate ────────────────────────────────
 # aiortc hardcodes bit_rate=96000 and ignores SDP fmtp / setParameters()
 OPUS_BITRATE = 32_000
@@ -55,65 +59,48 @@ KEY_FILE  = "key.pem"
 
 # ── Global audio engine ────────────────────────────────────
 _lock            = threading.Lock()
-_capture_subs    = []     # mutable list, modified under _lock
-_capture_snap    = ()     # immutable tuple snapshot for lock-free callback
-_playback_q      = queue.Queue(maxsize=24)
+_capture_subs    = []     # active RadioTracks, modified under _lock
+_capture_notify  = None   # (loop, event) while anybody listens, read lock-free by the callback
 _audio_stream    = None
 _active_mics     = 0      # counter of active MicSink
 
-# Playback buffering
-PLAYBACK_PREFILL         = 2    # blocks before starting playback (60 ms)
-PLAYBACK_DRAIN_THRESHOLD = 30   # drain when queue exceeds this
+# Playback buffering: depth follows the measured jitter, drift is corrected by resampling
+PLAYBACK_MIN_DEPTH_MS = 20      # never below one block
+PLAYBACK_MAX_DEPTH_MS = 300     # cap for the target, whatever the network does
 
-_pb_prefilled = False
+# mic samples: MicSink (event loop) pushes, _audio_callback reads, no lock
+_playback_jb     = JitterBuffer(SAMPLE_RATE, BLOCK_SIZE, PLAYBACK_MIN_DEPTH_MS, PLAYBACK_MAX_DEPTH_MS)
 
-def _safe_async_put(aq, block):
-    """Called in the event loop via call_soon_threadsafe — catches QueueFull."""
-    try:
-        aq.put_nowait(block)
-    except asyncio.QueueFull:
-        pass
+# Capture broadcast
+CAPTURE_RING_BLOCKS = 16   # ring size, a listener never gets near it (see CAPTURE_MAX_LAG)
+CAPTURE_MAX_LAG     = 4    # blocks a listener may fall behind before skipping ahead (80 ms)
 
+# radio samples: _audio_callback writes, every RadioTrack reads at its own cursor
+_capture_ring    = BroadcastRing(CAPTURE_RING_BLOCKS, BLOCK_SIZE, np.int16)
 
-def _audio_callback(indata, outdata, frames, time_info, status):
-    global _pb_prefilled
 
+def _wake_listeners(event):
+    """Called in the event loop, once per captured block for all RadioTracks."""
+    event.set()
+    event.clear()   # waiters already woken stay woken
+
+
+def _audio_callback(indata, outdata, frames, time_info, status):
     if status:
         log.warning("audio: %s", status)
 
-    # ── Capture: broadcast to WebRTC clients (lock-free via snapshot) ──
-    block = indata[:, 0].copy()
-    for (loop, aq) in _capture_snap:    # tuple snapshot — no lock needed
-        try:
-            loop.call_soon_threadsafe(_safe_async_put, aq, block)
-        except Exception:
-            pass
-
-    # ── Playback: feed USB audio device from mic queue ──
-    if not _pb_prefilled:
-        if _playback_q.qsize() >= PLAYBACK_PREFILL:
-            _pb_prefilled = True
-        else:
-            outdata[:, 0] = 0.0
-            return
-
-    # Drain excess — max 2 per callback to avoid large audio jumps
-    drained = 0
-    while _playback_q.qsize() > PLAYBACK_DRAIN_THRESHOLD and drained < 2:
+    # ── Capture: one ring write and one loop wake-up, whatever the number of clients ──
+    _capture_ring.write(indata[:, 0])
+    notify = _capture_notify            # single read — no lock needed
+    if notify is not None:
         try:
-            _playback_q.get_nowait()
-            drained += 1
-        except queue.Empty:
-            break
+            notify[0].call_soon_threadsafe(_wake_listeners, notify[1])
+        except RuntimeError:
+            pass                        # loop closed during shutdown
 
-    try:
-        chunk = _playback_q.get_nowait()
-        n = min(len(chunk), frames)
-        outdata[:n, 0] = chunk[:n]
-        if n < frames:
-            outdata[n:, 0] = 0.0
-    except queue.Empty:
-        outdata[:, 0] = 0.0
+    # ── Playback: feed USB audio device from the jitter buffer ──
+    # exactly `frames` samples, silence only while (re)buffering
+    _playback_jb.read_into(outdata[:, 0])
 
 
 def _start_audio(device_index: int):
@@ -144,7 +131,7 @@ pcs = set()
 
 
 # ─────────────────────────────────────────────────────────────
-# TRANSMITTING: own capture queue → WebRTC
+# TRANSMITTING: shared capture ring → WebRTC
 # ─────────────────────────────────────────────────────────────
 
 class RadioTrack(MediaStreamTrack):
@@ -152,34 +139,33 @@ class RadioTrack(MediaStreamTrack):
 
     def __init__(self):
         super().__init__()
-        self._loop      = asyncio.get_event_loop()
-        self._async_q   = asyncio.Queue(maxsize=8)   # 160 ms max (was 50=1s!)
+        self._cursor    = _capture_ring.seq     # only blocks captured from now on
         self._pts       = 0
         self._time_base = fractions.Fraction(1, SAMPLE_RATE)
         self._cnt       = 0
-        # Register in broadcast list + update lock-free snapshot
-        global _capture_snap
+        # Register as listener, the first one publishes the loop to wake
+        global _capture_notify
         with _lock:
-            _capture_subs.append((self._loop, self._async_q))
-            _capture_snap = tuple(_capture_subs)
+            if not _capture_subs:
+                _capture_notify = (asyncio.get_event_loop(), asyncio.Event())
+            _capture_subs.append(self)
+            self._wakeup = _capture_notify[1]
         log.info("RadioTrack: registered (active: %d)", len(_capture_subs))
 
     async def recv(self):
-        # Pure await on asyncio.Queue — no executor threads, cancellable
-        samples = await self._async_q.get()
+        # Pure await on the shared wake-up — no executor threads, cancellable
+        while self._cursor >= _capture_ring.seq:
+            await self._wakeup.wait()
 
-        # Adaptive drain: if the queue grows, discard old frames
-        while self._async_q.qsize() > 3:
-            try:
-                samples = self._async_q.get_nowait()
-            except asyncio.QueueEmpty:
-                break
+        # Lagging behind: skip to the newest CAPTURE_MAX_LAG blocks
+        samples, self._cursor = _capture_ring.read(self._cursor, CAPTURE_MAX_LAG)
 
         self._cnt += 1
         if self._cnt % 200 == 1:
-            log.info("TX #%d peak=%d qsize=%d", self._cnt,
-                     int(np.max(np.abs(samples))), self._async_q.qsize())
+            log.info("TX #%d peak=%d behind=%d", self._cnt,
+                     int(np.max(np.abs(samples))), _capture_ring.seq - self._cursor)
 
+        # copies the ring block, nothing is held across the next await
         frame = av.AudioFrame.from_ndarray(samples.reshape(1, -1), format="s16", layout="mono")
         frame.sample_rate = SAMPLE_RATE
         frame.pts         = self._pts
@@ -189,14 +175,15 @@ class RadioTrack(MediaStreamTrack):
 
     def stop(self):
         super().stop()
-        # Unregister from broadcast list + update lock-free snapshot
-        global _capture_snap
+        # Unregister, the callback stops waking the loop after the last one
+        global _capture_notify
         with _lock:
             try:
-                _capture_subs.remove((self._loop, self._async_q))
+                _capture_subs.remove(self)
             except ValueError:
                 pass
-            _capture_snap = tuple(_capture_subs)
+            if not _capture_subs:
+                _capture_notify = None
         log.info("RadioTrack: unregistered (active: %d)", len(_capture_subs))
 
 
@@ -226,33 +213,32 @@ class MicSink:
 
                 # Resample synchronously — fast, doesn't block long, no executor
                 for of in self._resampler.resample(frame):
-                    samples = np.frombuffer(bytes(of.planes[0]), dtype=np.float32).copy()
-                    try:
-                        _playback_q.put_nowait(samples)
-                    except queue.Full:
-                        pass  # drop new frame — callback drain keeps latency bounded
+                    # plane memory viewed in place (it is padded, hence count),
+                    # the ring write is the only copy
+                    samples = np.frombuffer(of.planes[0], dtype=np.float32, count=of.samples)
+                    # arrival time feeds the jitter estimate, depth is kept by the callback
+                    _playback_jb.push(samples)
 
                 if cnt % 200 == 1:
-                    log.info("RX mic #%d rate=%d fmt=%s samples=%d pq=%d",
-                             cnt, frame.sample_rate, frame.format.name,
-                             frame.samples, _playback_q.qsize())
+                    st = _playback_jb.stats()
+                    log.info("RX mic #%d rate=%d fmt=%s samples=%d depth=%.0fms target=%.0fms "
+                             "jitter=%.1fms rate=%+dppm rebuffers=%d",
+                             cnt, frame.sample_rate, frame.format.name, frame.samples,
+                             st['depth_ms'], st['target_ms'], st['jitter_ms'], st['rate_ppm'], st['rebuffers'])
             except Exception as e:
                 log.warning("MicSink ended: %s", e)
                 break
 
     def stop(self):
-        global _pb_prefilled, _active_mics
+        global _active_mics
         self._active = False
         with _lock:
             _active_mics = max(0, _active_mics - 1)
             remaining = _active_mics
         log.info("MicSink: stop (remaining: %d)", remaining)
-        # Reset prefill and clear queue only when the last client disconnects
+        # Rebuffer from scratch only when the last client disconnects
         if remaining == 0:
-            _pb_prefilled = False
-            while not _playback_q.empty():
-                try: _playback_q.get_nowait()
-                except: break
+            _playback_jb.reset()
 
 
 # ─────────────────────────────────────────────────────────────
@@ -338,6 +324,11 @@ async def offer(request):
     )
 
 
+async def stats(request):
+    """Playback jitter buffer figures, for watching latency while tuning."""
+    return web.json_response({"playback": _playback_jb.stats(), "connections": len(pcs)})
+
+
 async def on_shutdown(app):
     global _audio_stream
     await asyncio.gather(*[pc.close() for pc in pcs])
@@ -351,6 +342,7 @@ def build_app():
     app = web.Application()
     app.on_shutdown.append(on_shutdown)
     app.router.add_post("/offer", offer)
+    app.router.add_get("/stats", stats)
     # app.router.add_static("/", path="static", show_index=True)
     cors = aiohttp_cors.setup(app, defaults={
         "*": aiohttp_cors.ResourceOptions(
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Waterfall proxy for OpenWebRX
+- Runs on the Pi next to OpenWebRX, remoteControl connects here instead of :8073
+- One upstream OpenWebRX session is shared by all clients, every FFT frame is
+  decoded once and then reduced to the view each client asked for
+  (visible span, number of columns, max rows/s, optional zlib)
+- Per-client backpressure: a client that cannot keep up gets its pending rows
+  merged (max-hold) instead of an ever growing queue
+- Text messages pass through in both directions, other binary frames are dropped
+- Logs upstream vs. client bytes/s
+
+Client -> proxy:  {"type":"rrc_view","params":{"zoom":z,"center":c,"columns":n,"fps":f,"zlib":b}}
+Proxy  -> client: {"type":"rrc_proxy"} right after connecting, then FFT rows as
+                  FRAME_TYPE_ROW(_ZLIB) messages (see remoteControl/waterfallPipeline.py).
+                  Until the first rrc_view arrives FFT frames are passed unchanged.
+
+Usage:
+    python waterfallProxy.py
+    python waterfallProxy.py --upstream ws://127.0.0.1:8073/ws/ --port 8074
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+# waterfall codec and wire format are shared with the desktop client
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "remoteControl"))
+from imaAdpcm import ImaAdpcmCodec
+from waterfallPipeline import FRAME_TYPE_FFT, ColumnMap, decode_fft_frame, encode_row_frame, zoom_range
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger("waterfall")
+
+UPSTREAM_URL   = "ws://127.0.0.1:8073/ws/"
+HOST           = "0.0.0.0"
+PORT           = 8074
+STATS_INTERVAL = 10     # seconds between bytes/s log lines
+MAX_TEXT_QUEUE = 64     # text messages waiting for a slow client, oldest dropped above
+
+
+class Subscriber:
+    """One client connection, rows are reduced and sent by its own task."""
+
+    def __init__(self, ws, name):
+        self.ws          = ws
+        self.name        = name
+        self.column_map  = ColumnMap("max")
+        self.view        = None     # (zoom, center, columns, fps, zlib) from rrc_view
+        self.bytes_out   = 0
+        self.merged      = 0        # rows folded into the next one (fps limit or slow link)
+        self._row        = None     # pending decoded row, max-hold of everything not sent yet
+        self._raw        = None     # pending FFT frame while there is no view
+        self._text       = []
+        self._wakeup     = asyncio.Event()
+        self._last_sent  = 0.0
+
+    def set_view(self, params):
+        try:
+            zoom    = min(1.0, max(0.001, float(params["zoom"])))
+            center  = min(1.0, max(0.0, float(params["center"])))
+            columns = max(16, int(params["columns"]))
+            fps     = max(0.0, float(params.get("fps", 0)))
+            packed  = bool(params.get("zlib", False))
+        except (KeyError, TypeError, ValueError):
+            log.warning("%s: bad rrc_view %s", self.name, params)
+            return
+        self.view = (zoom, center, columns, fps, packed)
+        log.info("%s: view zoom=%.3f center=%.3f columns=%d fps=%g zlib=%s",
+                 self.name, zoom, center, columns, fps, packed)
+
+    def offer_row(self, row, raw):
+        """Called for every decoded FFT frame, never waits for the client."""
+        if self._row is not None or self._raw is not None:
+            self.merged += 1
+        if self._row is not None and self._row.shape == row.shape:
+            np.maximum(self._row, row, out=self._row)
+        else:
+            self._row = row.copy()
+        self._raw = raw
+        self._wakeup.set()
+
+    def offer_text(self, text):
+        if len(self._text) >= MAX_TEXT_QUEUE:
+            del self._text[0]
+        self._text.append(text)
+        self._wakeup.set()
+
+    def _encode(self, row):
+        zoom, center, columns, fps, packed = self.view
+        start, end = zoom_range(len(row), zoom, center)
+        # never more columns than bins, that would only interpolate
+        self.column_map.update(len(row), zoom, center, min(columns, end - start))
+        return encode_row_frame(self.column_map.apply(row), start, end, len(row), packed)
+
+    async def send_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._text:
+                text = self._text.pop(0)
+                await self.ws.send_str(text)
+                self.bytes_out += len(text)
+            if self._row is None:
+                continue
+            fps = self.view[3] if self.view is not None else 0
+            if fps:
+                wait = self._last_sent + 1.0 / fps - time.monotonic()
+                if wait > 0:
+                    # rows arriving meanwhile are max-held into this one
+                    await asyncio.sleep(wait)
+            row, raw = self._row, self._raw
+            self._row = self._raw = None
+            data = raw if self.view is None else self._encode(row)
+            self._last_sent = time.monotonic()
+            await self.ws.send_bytes(data)
+            self.bytes_out += len(data)
+
+    async def receive_loop(self, upstream):
+        async for msg in self.ws:
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                if '"rrc_view"' in msg.data:
+                    try:
+                        self.set_view(json.loads(msg.data).get("params", {}))
+                    except ValueError:
+                        log.warning("%s: bad rrc_view message", self.name)
+                    continue
+                if msg.data.startswith("SERVER DE CLIENT"):
+                    # upstream handshake is done once by the proxy
+                    continue
+                await upstream.send_str(msg.data)
+            elif msg.type == aiohttp.WSMsgType.ERROR:
+                break
+
+
+class Upstream:
+    """The single OpenWebRX session, open while at least one client is connected."""
+
+    def __init__(self, url):
+        self.url         = url
+        self.subscribers = set()
+        self.bytes_in    = 0
+        self.ws          = None
+        self._codec      = ImaAdpcmCodec()
+        self._config     = {}       # merged config values, replayed to late joiners
+        self._task       = None
+        self._stats_task = None
+
+    def subscribe(self, sub):
+        self.subscribers.add(sub)
+        sub.offer_text('{"type":"rrc_proxy"}')
+        if self._config:
+            sub.offer_text(json.dumps({"type": "config", "value": self._config}))
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+            self._stats_task = asyncio.ensure_future(self._stats())
+
+    def unsubscribe(self, sub):
+        self.subscribers.discard(sub)
+        if not self.subscribers and self._task is not None:
+            log.info("last client left, closing upstream")
+            self._task.cancel()
+            self._stats_task.cancel()
+            self._task = None
+
+    async def send_str(self, text):
+        if self.ws is not None and not self.ws.closed:
+            await self.ws.send_str(text)
+
+    def _on_text(self, text):
+        if '"config"' in text:
+            try:
+                msg = json.loads(text)
+                if msg.get("type") == "config":
+                    self._config.update(msg.get("value", {}))
+            except ValueError:
+                pass
+        for sub in self.subscribers:
+            sub.offer_text(text)
+
+    async def _session(self, http):
+        loop = asyncio.get_running_loop()
+        async with http.ws_connect(self.url, heartbeat=20, max_msg_size=0) as ws:
+            self.ws = ws
+            log.info("upstream %s connected", self.url)
+            await ws.send_str("SERVER DE CLIENT client=openwebrx.js type=receiver")
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.BINARY:
+                    data = msg.data
+                    self.bytes_in += len(data)
+                    if not data or data[0] != FRAME_TYPE_FFT:
+                        continue
+                    # decoded once for everybody
+                    row = await loop.run_in_executor(None, decode_fft_frame, self._codec, data)
+                    if row is not None:
+                        for sub in self.subscribers:
+                            sub.offer_row(row, data)
+                elif msg.type == aiohttp.WSMsgType.TEXT:
+                    self.bytes_in += len(msg.data)
+                    self._on_text(msg.data)
+                elif msg.type == aiohttp.WSMsgType.ERROR:
+                    log.warning("upstream error %s", ws.exception())
+                    break
+        self.ws = None
+
+    async def _run(self):
+        async with aiohttp.ClientSession() as http:
+            while self.subscribers:
+                try:
+                    await self._session(http)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    log.warning("upstream %s failed: %r", self.url, e)
+                self.ws = None
+                if self.subscribers:
+                    await asyncio.sleep(1)
+
+    async def _stats(self):
+        while True:
+            bytes_in = self.bytes_in
+            bytes_out = {sub: sub.bytes_out for sub in self.subscribers}
+            await asyncio.sleep(STATS_INTERVAL)
+            rate_in = (self.bytes_in - bytes_in) / STATS_INTERVAL
+            for sub, sent in bytes_out.items():
+                if sub not in self.subscribers:
+                    continue
+                rate_out = (sub.bytes_out - sent) / STATS_INTERVAL
+                log.info("%s: upstream %.1f kB/s -> client %.1f kB/s (%.0f%%), %d rows merged", sub.name,
+                         rate_in / 1000, rate_out / 1000, 100.0 * rate_out / rate_in if rate_in else 0.0,
+                         sub.merged)
+
+
+async def websocket_handler(request):
+    ws = web.WebSocketResponse(heartbeat=20)
+    await ws.prepare(request)
+    upstream = request.app["upstream"]
+    sub = Subscriber(ws, request.remote or "client")
+    upstream.subscribe(sub)
+    log.info("%s: connected (%d clients)", sub.name, len(upstream.subscribers))
+    tasks = [asyncio.ensure_future(sub.send_loop()), asyncio.ensure_future(sub.receive_loop(upstream))]
+    try:
+        # client closing or failing to send ends the connection
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for t in tasks:
+            t.cancel()
+        upstream.unsubscribe(sub)
+        await ws.close()
+        log.info("%s: disconnected (%d clients)", sub.name, len(upstream.subscribers))
+    return ws
+
+
+def build_app(upstream_url=UPSTREAM_URL):
+    app = web.Application()
+    app["upstream"] = Upstream(upstream_url)
+    # same path as OpenWebRX, the client only changes the port
+    app.router.add_get("/ws/", websocket_handler)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenWebRX waterfall proxy")
+    parser.add_argument("--upstream", default=UPSTREAM_URL)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+    log.info("Waterfall proxy: ws://%s:%d/ws/ -> %s", args.host, args.port, args.upstream)
+    web.run_app(build_app(args.upstream), host=args.host, port=args.port)
@@ -201,6 +201,9 @@ ok "rrc_hamlib.service — enabled & started"
 sudo systemctl enable --now rrc_node.service
 ok "rrc_node.service — enabled & started"
 
+sudo systemctl enable --now rrc_waterfall.service
+ok "rrc_waterfall.service — enabled & started"
+
 warn "rrc_audio.service — installed but NOT enabled (Mumble is default)"
 
 echo ""
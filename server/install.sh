@@ -98,6 +98,14 @@ source env/bin/activate
 pip install -r requirements.txt 2>&1 | tee -a "$LOG_FILE"
 ok "Python environment ready"
 
+# ─────────────────────────────────────────────────────────────
+# 6a. Waterfall proxy (rrc_waterfall.service, next to OpenWebRX)
+# ─────────────────────────────────────────────────────────────
+info "Checking waterfall proxy..."
+env/bin/python remoteControlNode/waterfallProxy.py --help >/dev/null 2>&1 \
+    || err "waterfallProxy.py does not start — check install.log"
+ok "Waterfall proxy ready (service is enabled by configure.sh)"
+
 # ─────────────────────────────────────────────────────────────
 # 7. SSL certificates (for HTTPS Node server)
 # ─────────────────────────────────────────────────────────────
@@ -0,0 +1,45 @@
+import os
+import socket
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "remoteControl"))
+from rigctl import RigctlClient, plain_reply
+
+FREQ = b"get_freq:\nFrequency: 14074000\nRPRT 0\n"
+MODE = b"get_mode:\nMode: USB\nPassband: 2400\nRPRT 0\n"
+SET_PTT = b"set_ptt: 0\nRPRT 0\n"
+
+
+def make_client(response_timeout=0.05):
+    client = RigctlClient("127.0.0.1", 1, response_timeout=response_timeout)
+    client.s, rig = socket.socketpair()
+    client.connected = 1
+    return client, rig
+
+
+def test_plain_reply():
+    assert plain_reply(SET_PTT.decode()) == "RPRT 0"
+    assert plain_reply(FREQ.decode()) == "14074000\nRPRT 0"
+    assert plain_reply("send_cmd: EX037;\nReply: EX0371;\nRPRT 0\n") == "EX0371;\nRPRT 0"
+
+
+def test_plain_command_is_framed():
+    client, rig = make_client()
+    rig.sendall(SET_PTT)
+    assert client.send("T 0") == "RPRT 0"
+    assert rig.recv(100) == b"+T 0\n"
+
+
+def test_late_answers_do_not_shift_later_replies():
+    client, rig = make_client()
+    # poll batch times out, its two records are still owed
+    assert client.send_batches(["+f +m\n"]) is None
+    # a set command after it: the late poll records come first on the wire
+    rig.sendall(FREQ + MODE + SET_PTT)
+    assert client.send("T 0") == "RPRT 0"
+
+    # set command timing out, then the next poll
+    assert client.send("T 1") is None
+    rig.sendall(SET_PTT + FREQ + MODE)
+    records = client.send_batches(["+f +m\n"])
+    assert records == [[FREQ.decode(), MODE.decode()]]
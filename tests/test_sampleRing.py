@@ -0,0 +1,108 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "remoteControl"))
+from sampleRing import JitterBuffer, SampleRing, _simulate
+
+RATE = 48000
+BLOCK = 960
+
+
+def test_ring_clear_drops_buffered_samples():
+    ring = SampleRing(4 * BLOCK)
+    ring.write(np.ones(BLOCK, dtype=np.float32))
+    ring.clear()
+    out = np.full(BLOCK, 9.0, dtype=np.float32)
+    assert ring.read_into(out) == 0
+    assert not out.any()
+    assert ring.available() == 0
+
+
+def test_jitter_buffer_reset_flushes_before_next_read():
+    jb = JitterBuffer(RATE, BLOCK)
+    out = np.zeros(BLOCK, dtype=np.float32)
+    for k in range(10):
+        jb.push(np.ones(BLOCK, dtype=np.float32), now=k * BLOCK / RATE)
+    assert jb.read_into(out) == BLOCK
+    assert out.any()
+
+    jb.reset()
+    out[:] = 9.0
+    assert jb.read_into(out) == 0
+    assert not out.any()
+    assert jb.ring.available() == 0
+
+    # the flag is used up: a new stream is buffered and played, not discarded
+    for k in range(10):
+        jb.push(np.ones(BLOCK, dtype=np.float32), now=10.0 + k * BLOCK / RATE)
+    assert jb.read_into(out) == BLOCK
+    assert out.any()
+
+
+def test_jitter_starts_over_after_a_gap():
+    jb = JitterBuffer(RATE, BLOCK)
+    block = np.zeros(BLOCK, dtype=np.float32)
+    period = BLOCK / RATE
+    for k in range(50):
+        jb.push(block, now=k * period)
+    # last block before the stream stops arrives 150 ms late
+    jb.push(block, now=50 * period + 0.15)
+    jitter = jb.jitter
+    # after more than MAX_GAP the stream resumes on time
+    start = 50 * period + 0.15 + 2 * JitterBuffer.MAX_GAP
+    for k in range(3):
+        jb.push(block, now=start + k * period)
+    assert jb.jitter < jitter
+
+
+
+def test_target_follows_spread_peak_and_decays():
+    jb = JitterBuffer(RATE, BLOCK)
+    block = np.zeros(BLOCK, dtype=np.float32)
+    period = BLOCK / RATE
+    for k in range(100):
+        jb.push(block, now=k * period)
+    assert jb.target == 2 * BLOCK
+    # one block 100 ms late: the target makes room for it right away
+    late_at = 100 * period + 0.1
+    jb.push(block, now=late_at)
+    assert jb.spread == pytest.approx(0.1)
+    assert jb.target >= 2 * BLOCK + 0.1 * RATE
+    # then on time again: the peak fades with JITTER_DECAY
+    steps = int(JitterBuffer.JITTER_DECAY / period)
+    for k in range(1, steps + 1):
+        jb.push(block, now=late_at + k * period)
+    assert jb.spread == pytest.approx(0.1 * np.exp(-1), rel=0.05)
+
+
+@pytest.mark.parametrize("drift_ppm", [500, 200, -200, -500])
+def test_depth_follows_target_under_clock_drift(drift_ppm):
+    jb = JitterBuffer(RATE, BLOCK)
+    block = np.zeros(BLOCK, dtype=np.float32)
+    out = np.zeros(BLOCK, dtype=np.float32)
+    period = BLOCK / RATE
+    sent, rebuffers, errors = 0.0, None, []
+    for k in range(int(60 / period)):
+        now = k * period
+        while sent <= now:
+            jb.push(block, now=sent)
+            sent += period * (1 - drift_ppm * 1e-6)
+        assert jb.read_into(out) == BLOCK or now < 1.0
+        if now >= 10.0:
+            rebuffers = jb.rebuffers if rebuffers is None else rebuffers
+            errors.append(jb.depth - jb.target)
+    # no dropouts once running, depth kept within the arrival phase of the target
+    assert jb.rebuffers == rebuffers
+    assert np.abs(errors).max() <= BLOCK
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_simulation_fewer_dropouts_when_sender_clock_is_slow(seed):
+    # the fixed prefill queue keeps running dry, the adaptive buffer slows down instead
+    results, _ = _simulate(300, -200, 10, seed=seed)
+    fixed, adaptive = results['fixed prefill'], results['adaptive']
+    assert adaptive[0] < fixed[0]
+    assert adaptive[2] < 200
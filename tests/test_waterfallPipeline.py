@@ -0,0 +1,191 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "remoteControl"))
+from waterfallPipeline import (FRAME_TYPE_ROW, ROW_HEADER, ColumnMap, HistoryFile, RowRing, decode_row_frame,
+                               encode_row_frame, link_view, view_covers, zoom_range)
+
+
+def noise_row(n, seed=1):
+    return np.random.default_rng(seed).integers(20, 120, n, dtype=np.uint8)
+
+
+# ── ColumnMap ──
+
+@pytest.mark.parametrize("mode", ['max', 'mean', 'power'])
+def test_column_map_reduce_keeps_shape_and_range(mode):
+    row = noise_row(4096)
+    cmap = ColumnMap(mode)
+    cmap.update(len(row), 1.0, 0.5, 1000)
+    out = cmap.apply(row)
+    assert out.dtype == np.uint8 and out.shape == (1000,)
+    assert row.min() <= out.min() and out.max() <= row.max()
+
+
+def test_column_map_max_keeps_single_bin_peak():
+    row = np.full(4096, 30, dtype=np.uint8)
+    row[1234] = 200
+    for mode, keeps in (('max', True), ('mean', False)):
+        cmap = ColumnMap(mode)
+        cmap.update(len(row), 1.0, 0.5, 500)
+        assert bool(cmap.apply(row).max() == 200) is keeps
+
+
+def test_column_map_reduce_modes_agree_on_flat_row():
+    row = np.full(4096, 77, dtype=np.uint8)
+    for mode in ('max', 'mean', 'power'):
+        cmap = ColumnMap(mode)
+        cmap.update(len(row), 1.0, 0.5, 640)
+        assert np.all(cmap.apply(row) == 77), mode
+
+
+def test_column_map_interpolation_matches_np_interp():
+    row = noise_row(2048)
+    cmap = ColumnMap('max')
+    cmap.update(len(row), 0.25, 0.3, 1200)       # 512 visible bins onto 1200 columns
+    start, end = zoom_range(len(row), 0.25, 0.3)
+    assert cmap.span == (start, end)
+    visible = row[start:end]
+    expected = np.interp(np.linspace(0, len(visible) - 1, 1200), np.arange(len(visible)), visible)
+    got = cmap.apply(row)
+    assert got[0] == visible[0] and got[-1] == visible[-1]
+    # float32 weights, rounding may differ by one level
+    assert np.abs(got.astype(int) - np.round(expected).astype(int)).max() <= 1
+
+
+def test_column_map_applies_to_block_of_rows():
+    rows = np.stack([noise_row(2048, seed) for seed in range(5)])
+    for zoom, width in ((1.0, 700), (0.1, 700)):
+        cmap = ColumnMap('max')
+        cmap.update(2048, zoom, 0.5, width)
+        block = cmap.apply(rows)
+        assert block.shape == (5, width)
+        for k in range(5):
+            np.testing.assert_array_equal(block[k], cmap.apply(rows[k]))
+
+
+def test_column_map_rebuilds_only_on_view_change():
+    cmap = ColumnMap('max')
+    assert cmap.update(2048, 1.0, 0.5, 800)
+    assert not cmap.update(2048, 1.0, 0.5, 800)
+    assert cmap.update(2048, 0.5, 0.5, 800)
+
+
+def test_column_map_unknown_mode_falls_back_to_max():
+    assert ColumnMap('median').mode == 'max'
+
+
+# ── row frames (waterfallProxy -> client) ──
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_row_frame_round_trip_full_span(compress):
+    row = noise_row(1024)
+    frame = encode_row_frame(row, 0, 1024, 1024, compress)
+    np.testing.assert_array_equal(decode_row_frame(frame), row)
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_row_frame_partial_span_offset_and_fill(compress):
+    # bins 1024..2048 of 4096 sent as 256 columns: full span row is 1024 columns
+    levels = noise_row(256)
+    row = decode_row_frame(encode_row_frame(levels, 1024, 2048, 4096, compress))
+    assert len(row) == 1024
+    np.testing.assert_array_equal(row[256:512], levels)
+    fill = round(levels.mean())
+    assert np.all(row[:256] == fill) and np.all(row[512:] == fill)
+
+
+def test_row_frame_span_at_the_end_stays_in_row():
+    levels = noise_row(300)
+    row = decode_row_frame(encode_row_frame(levels, 3796, 4096, 4096))
+    np.testing.assert_array_equal(row[-300:], levels)
+
+
+def test_row_frame_without_levels():
+    assert decode_row_frame(ROW_HEADER.pack(FRAME_TYPE_ROW, 4096, 0, 4096)) is None
+    assert decode_row_frame(encode_row_frame(np.zeros(0, dtype=np.uint8), 0, 4096, 4096, True)) is None
+
+
+# ── view negotiation ──
+
+def test_link_view_covers_itself_and_small_pans():
+    view = link_view(0.2, 0.5, 1000)
+    assert view_covers(view, 0.2, 0.5, 1000)
+    assert view_covers(view, 0.2, 0.52, 1000)
+    assert view_covers(view, 0.2, 0.5, 1100)
+
+
+def test_view_covers_rejects_pan_zoom_and_width_changes():
+    view = link_view(0.2, 0.5, 1000)
+    assert not view_covers(view, 0.2, 0.7, 1000)        # panned outside the margin
+    assert not view_covers(view, 0.05, 0.5, 1000)       # zoomed in: too few columns
+    assert not view_covers(view, 0.2, 0.5, 2000)        # wider widget
+    full = link_view(1.0, 0.5, 1000)
+    assert full[0] == 1.0 and view_covers(full, 1.0, 0.5, 1000)
+
+
+# ── RowRing ──
+
+def test_row_ring_ordered_newest_first():
+    ring = RowRing(3, 4)
+    for k in range(5):
+        ring.push(np.full(4, k, dtype=np.uint8))
+    assert ring.ordered()[:, 0].tolist() == [4, 3, 2]
+
+
+# ── HistoryFile ──
+
+def test_history_read_after_wrap(tmp_path):
+    history = HistoryFile(str(tmp_path / "history.bin"), rows=10, bins=64)
+    for k in range(25):
+        history.append(np.full(64, k, dtype=np.uint8), t=float(k))
+    assert history.count == 25
+    times, rows = history.read(24, 5)
+    assert times.tolist() == [24.0, 23.0, 22.0, 21.0, 20.0]
+    assert rows[:, 0].tolist() == [24, 23, 22, 21, 20]
+    # one slot is kept spare for the row being written
+    times, rows = history.read(24, 100)
+    assert times.tolist() == [float(k) for k in range(24, 15, -1)]
+
+
+def test_history_resamples_rows_keeping_peaks(tmp_path):
+    history = HistoryFile(str(tmp_path / "history.bin"), rows=4, bins=256)
+    row = np.full(4096, 10, dtype=np.uint8)
+    row[777] = 250
+    history.append(row, t=1.0)
+    _, rows = history.read(0, 1)
+    assert rows.shape == (1, 256) and rows.max() == 250
+
+
+def test_history_survives_restart(tmp_path):
+    path = str(tmp_path / "history.bin")
+    history = HistoryFile(path, rows=10, bins=64)
+    for k in range(12):
+        history.append(np.full(64, k, dtype=np.uint8), t=float(k))
+    history.close()
+
+    history = HistoryFile(path, rows=10, bins=64)
+    assert history.count == 12
+    assert history.read(11, 1)[0].tolist() == [11.0]
+
+    # other geometry: the file starts over
+    history = HistoryFile(path, rows=20, bins=64)
+    assert history.count == 0
+
+
+def test_history_read_of_overwritten_rows_is_empty(tmp_path):
+    history = HistoryFile(str(tmp_path / "history.bin"), rows=10, bins=64)
+    for k in range(10):
+        history.append(np.full(64, k, dtype=np.uint8), t=float(k))
+    seq = history.oldest        # scrolled back as far as possible
+    for k in range(10, 15):
+        history.append(np.full(64, k, dtype=np.uint8), t=float(k))
+    assert seq < history.oldest == 6
+    times, rows = history.read(seq, 5)
+    assert len(times) == 0 and len(rows) == 0
+    # clamped to what is still kept, as the widget does
+    times, _ = history.read(max(seq, history.oldest), 5)
+    assert times.tolist() == [6.0]